@@ -10,6 +10,8 @@ from .models import (
     StudentData,
     BankAccount,
     Notification,
+    Faculty,
+    Department,
 )
 from .forms import CustomUserCreationForm, CustomUserChangeForm
 
@@ -81,3 +83,16 @@ class BankAccountAdmin(admin.ModelAdmin):
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ("title", "recipient", "created_at")
+
+
+@admin.register(Faculty)
+class FacultyAdmin(admin.ModelAdmin):
+    list_display = ("name",)
+    search_fields = ("name",)
+
+
+@admin.register(Department)
+class DepartmentAdmin(admin.ModelAdmin):
+    list_display = ("name", "faculty")
+    list_filter = ("faculty",)
+    search_fields = ("name",)
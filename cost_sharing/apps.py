@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.core.signals import got_request_exception, request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class CostSharingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cost_sharing'
+
+    def ready(self):
+        from .cache import connect_invalidation, ensure_cache_tables
+        from .database import analyze_database, configure_sqlite, optimize_sqlite
+        from .metrics import count_lock_errors
+        from .search import ensure_search_triggers
+        connection_created.connect(configure_sqlite)
+        post_migrate.connect(ensure_search_triggers, sender=self)
+        post_migrate.connect(ensure_cache_tables, sender=self)
+        post_migrate.connect(analyze_database, sender=self)
+        request_finished.connect(optimize_sqlite)
+        connect_invalidation()
+        got_request_exception.connect(count_lock_errors)
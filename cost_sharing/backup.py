@@ -0,0 +1,580 @@
+# cost_sharing/backup.py
+"""
+Online SQLite backups with point-in-time restore.
+
+A backup *generation* starts with a snapshot taken through SQLite's online
+backup API. The snapshot is read inside one read transaction, a few pages per
+step, so it is consistent and writers keep committing while it runs (WAL
+readers never block the writer). After that, the WAL shipper copies every
+newly committed WAL frame into a segment file next to the snapshot:
+
+    backups/<generation>/snapshot.sqlite3
+    backups/<generation>/wal/<epoch>/header
+    backups/<generation>/wal/<epoch>/<first>-<last>-<shipped at>.frames
+
+An *epoch* is one run of the WAL file between two restarts (SQLite rewinds the
+WAL after a full checkpoint). The shipper checkpoints the WAL itself once it
+grows past SQLITE_WAL_CHECKPOINT_BYTES, after shipping everything, so the next
+epoch continues the same generation. If frames could have been checkpointed
+without being shipped first (the shipper was not running, or another
+connection checkpointed), the chain is broken and a new generation is started
+with a fresh snapshot.
+
+Restoring copies a snapshot and replays its epochs in order, keeping only
+segments shipped before the requested time, so the database can be rebuilt as
+it was at any point covered by the shipping interval.
+
+`python manage.py sqlite_backup` drives all of this.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+
+WAL_HEADER_SIZE = 32
+WAL_FRAME_HEADER_SIZE = 24
+WAL_MAGIC = (0x377f0682, 0x377f0683)
+
+TIMESTAMP_FORMAT = '%Y%m%dT%H%M%S.%fZ'
+STATE_FILE = 'state.json'
+SNAPSHOT_FILE = 'snapshot.sqlite3'
+
+DEFAULT_PAGES_PER_STEP = 1024
+DEFAULT_CHECKPOINT_BYTES = 64 * 1024 * 1024
+
+# Frames read from the WAL file per chunk while shipping
+SHIP_CHUNK_FRAMES = 1024
+
+
+class BackupError(Exception):
+    pass
+
+
+def database_path(alias='default'):
+    """Path of the SQLite file behind a DATABASES alias."""
+    database = settings.DATABASES[alias]
+    if database['ENGINE'] != 'django.db.backends.sqlite3':
+        raise BackupError(f"Database '{alias}' is not SQLite; use the database server's own backup tools.")
+    return Path(database['NAME'])
+
+
+def backup_root():
+    return Path(getattr(settings, 'SQLITE_BACKUP_DIR', settings.BASE_DIR / 'backups'))
+
+
+def now():
+    return datetime.now(timezone.utc)
+
+
+def format_timestamp(moment):
+    return moment.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def parse_timestamp(text):
+    return datetime.strptime(text, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def _connect(path, timeout=None):
+    if timeout is None:
+        timeout = getattr(settings, 'SQLITE_PRAGMAS', {}).get('busy_timeout', 5000) / 1000
+    return sqlite3.connect(str(path), timeout=timeout, isolation_level=None)
+
+
+def _remove(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _sidecar(path, suffix):
+    return Path(f'{path}{suffix}')
+
+
+# ---------------------------------------------------------------------------
+# Snapshots
+# ---------------------------------------------------------------------------
+
+def snapshot(source, dest_path, pages=DEFAULT_PAGES_PER_STEP, pause=0.0, progress=None):
+    """
+    Copy the database open on `source` (a connection or a path) to
+    `dest_path` with the online backup API, `pages` pages per step and
+    `pause` seconds between steps. When `source` is a connection inside a
+    read transaction, the copy is exactly that transaction's view.
+    """
+    dest_path = Path(dest_path)
+    partial = _sidecar(dest_path, '.partial')
+    _remove(partial)
+
+    def step(status, remaining, total):
+        if progress:
+            progress(total - remaining, total)
+        if pause and remaining:
+            time.sleep(pause)
+
+    connection = _connect(source) if isinstance(source, (str, Path)) else source
+    target = sqlite3.connect(str(partial))
+    try:
+        connection.backup(target, pages=pages, progress=step)
+    finally:
+        target.close()
+        if connection is not source:
+            connection.close()
+    os.replace(partial, dest_path)
+    return dest_path
+
+
+def copy_database(db_path, dest_path):
+    """
+    Back up a database that may be damaged: a consistent online snapshot when
+    SQLite can still read it, otherwise a raw copy of the database file and
+    its -wal/-shm files.
+    """
+    db_path, dest_path = Path(db_path), Path(dest_path)
+    try:
+        return snapshot(db_path, dest_path)
+    except sqlite3.DatabaseError:
+        for suffix in ('', '-wal', '-shm'):
+            source = _sidecar(db_path, suffix)
+            if source.exists():
+                shutil.copy2(source, _sidecar(dest_path, suffix))
+        return dest_path
+
+
+# ---------------------------------------------------------------------------
+# WAL format
+# ---------------------------------------------------------------------------
+
+def wal_checksum(data, s0, s1, big_endian):
+    """SQLite's WAL checksum over `data`, continuing from (s0, s1)."""
+    words = struct.unpack(f"{'>' if big_endian else '<'}{len(data) // 4}I", data)
+    for i in range(0, len(words), 2):
+        s0 = (s0 + words[i] + s1) & 0xFFFFFFFF
+        s1 = (s1 + words[i + 1] + s0) & 0xFFFFFFFF
+    return s0, s1
+
+
+def read_wal_header(wal_path):
+    """
+    Parse the WAL header, or return None when there is no valid one yet (no
+    WAL file, an empty one, or a header still being written).
+    """
+    try:
+        with open(wal_path, 'rb') as fh:
+            raw = fh.read(WAL_HEADER_SIZE)
+    except FileNotFoundError:
+        return None
+    if len(raw) < WAL_HEADER_SIZE:
+        return None
+    magic, version, page_size, checkpoint_seq, salt1, salt2, c1, c2 = struct.unpack('>8I', raw)
+    if magic not in WAL_MAGIC:
+        return None
+    big_endian = bool(magic & 1)
+    if wal_checksum(raw[:24], 0, 0, big_endian) != (c1, c2):
+        return None
+    return {
+        'raw': raw,
+        'page_size': page_size,
+        'checkpoint_seq': checkpoint_seq,
+        'salt': [salt1, salt2],
+        'checksum': [c1, c2],
+        'big_endian': big_endian,
+    }
+
+
+def iter_valid_frames(wal_path, header, start_frame, checksum):
+    """
+    Yield (frame number, frame bytes, is_commit, checksum) for the valid frames
+    after `start_frame` (frames are numbered from 1). Stops at the first frame
+    with another salt or a bad checksum: the end of the live WAL, a frame
+    still being written, or leftovers from an earlier epoch.
+    """
+    frame_size = WAL_FRAME_HEADER_SIZE + header['page_size']
+    s0, s1 = checksum
+    salt = tuple(header['salt'])
+    number = start_frame
+    with open(wal_path, 'rb') as fh:
+        fh.seek(WAL_HEADER_SIZE + start_frame * frame_size)
+        while True:
+            chunk = fh.read(frame_size * SHIP_CHUNK_FRAMES)
+            for offset in range(0, len(chunk) - frame_size + 1, frame_size):
+                frame = chunk[offset:offset + frame_size]
+                _, commit_size, salt1, salt2, c1, c2 = struct.unpack('>6I', frame[:WAL_FRAME_HEADER_SIZE])
+                if (salt1, salt2) != salt:
+                    return
+                s0, s1 = wal_checksum(frame[:8] + frame[WAL_FRAME_HEADER_SIZE:], s0, s1, header['big_endian'])
+                if (s0, s1) != (c1, c2):
+                    return
+                number += 1
+                yield number, frame, commit_size != 0, [s0, s1]
+            if len(chunk) < frame_size * SHIP_CHUNK_FRAMES:
+                return
+
+
+# ---------------------------------------------------------------------------
+# Generations and segments on disk
+# ---------------------------------------------------------------------------
+
+def load_state(root):
+    try:
+        with open(Path(root) / STATE_FILE) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def save_state(root, state):
+    path = Path(root) / STATE_FILE
+    partial = _sidecar(path, '.partial')
+    with open(partial, 'w') as fh:
+        json.dump(state, fh, indent=2)
+    os.replace(partial, path)
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def list_generations(root=None):
+    """Generations in `root`, oldest first, with their epochs and segments."""
+    root = Path(root or backup_root())
+    generations = []
+    if not root.exists():
+        return generations
+    for directory in sorted(root.iterdir()):
+        if not (directory / SNAPSHOT_FILE).exists():
+            continue
+        epochs = []
+        wal_dir = directory / 'wal'
+        for epoch_dir in sorted(wal_dir.iterdir()) if wal_dir.exists() else []:
+            segments = []
+            for path in sorted(epoch_dir.glob('*.frames')):
+                first, last, shipped_at = path.stem.split('-')
+                segments.append({
+                    'path': path,
+                    'first': int(first),
+                    'last': int(last),
+                    'shipped_at': parse_timestamp(shipped_at),
+                })
+            epochs.append({'path': epoch_dir, 'number': int(epoch_dir.name), 'segments': segments})
+        generations.append({
+            'name': directory.name,
+            'path': directory,
+            'created_at': parse_timestamp(directory.name),
+            'epochs': epochs,
+        })
+    return generations
+
+
+def prune_generations(keep, root=None):
+    """Delete all but the `keep` newest generations; return the deleted names."""
+    generations = list_generations(root)
+    doomed = generations[:-keep] if keep > 0 else []
+    for generation in doomed:
+        shutil.rmtree(generation['path'])
+    return [generation['name'] for generation in doomed]
+
+
+# ---------------------------------------------------------------------------
+# Shipping
+# ---------------------------------------------------------------------------
+
+class WalShipper:
+    """
+    Ships committed WAL frames of one database into backup generations.
+
+    Keep one shipper running (`sqlite_backup ship-wal --loop`): its open
+    connection also stops SQLite from checkpointing and deleting the WAL when
+    the last application connection closes, which would break the chain.
+    """
+
+    def __init__(self, db_path=None, root=None, pages=DEFAULT_PAGES_PER_STEP, pause=0.0):
+        self.db_path = Path(db_path or database_path())
+        self.wal_path = _sidecar(self.db_path, '-wal')
+        self.root = Path(root or backup_root())
+        self.pages = pages
+        self.pause = pause
+        self.connection = None
+
+    def open(self):
+        if self.connection is None:
+            self.connection = _connect(self.db_path)
+        return self
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _pin(self, immediate=False):
+        # A read transaction keeps SQLite from rewinding the WAL under us;
+        # BEGIN IMMEDIATE additionally holds off writers
+        self.connection.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        self.connection.execute('SELECT count(*) FROM sqlite_master').fetchone()
+
+    def _unpin(self):
+        self.connection.execute('ROLLBACK')
+
+    def start_generation(self, progress=None):
+        """Take a snapshot and start a new generation; return the new state."""
+        self.open()
+        self._pin()
+        try:
+            state = self._new_generation(read_wal_header(self.wal_path), progress)
+            self._ship(state)
+        finally:
+            self._unpin()
+        save_state(self.root, state)
+        return state
+
+    def _new_generation(self, header, progress=None):
+        name = format_timestamp(now())
+        directory = self.root / name
+        directory.mkdir(parents=True, exist_ok=False)
+        snapshot(self.connection, directory / SNAPSHOT_FILE, self.pages, self.pause, progress)
+        state = {
+            'generation': name,
+            'epoch': 0,
+            'salt': None,
+            'frames': 0,
+            'checksum': None,
+            'checkpointed': False,
+            'db_signature': _file_signature(self.db_path),
+            'new_generation': True,
+        }
+        if header:
+            self._start_epoch(state, header)
+        return state
+
+    def _start_epoch(self, state, header):
+        state['epoch'] += 1
+        epoch_dir = self.root / state['generation'] / 'wal' / f"{state['epoch']:06d}"
+        epoch_dir.mkdir(parents=True, exist_ok=True)
+        (epoch_dir / 'header').write_bytes(header['raw'])
+        state.update(salt=header['salt'], frames=0, checksum=header['checksum'], checkpointed=False)
+
+    def _continues(self, state, header):
+        """Whether the WAL on disk still continues the chain recorded in `state`."""
+        if not state or not (self.root / state['generation'] / SNAPSHOT_FILE).exists():
+            return False
+        if header and header['salt'] == state['salt']:
+            return True
+        # The WAL was rewound, recreated or removed. That is only safe when
+        # nothing reached the database file since we last accounted for it:
+        # either it has not been touched at all, or our own checkpoint made
+        # it current and this is the very next epoch.
+        if _file_signature(self.db_path) == state['db_signature']:
+            return True
+        return bool(
+            header and state['salt'] and state['checkpointed']
+            and header['salt'][0] == (state['salt'][0] + 1) & 0xFFFFFFFF
+        )
+
+    def _ship(self, state):
+        """Copy the committed frames not shipped yet into a segment; return how many."""
+        header = read_wal_header(self.wal_path)
+        if header is None:
+            return 0
+        if header['salt'] != state['salt']:
+            self._start_epoch(state, header)
+
+        epoch_dir = self.root / state['generation'] / 'wal' / f"{state['epoch']:06d}"
+        partial = epoch_dir / 'segment.partial'
+        first = state['frames'] + 1
+        last, checksum, committed_bytes = None, None, 0
+        with open(partial, 'wb') as fh:
+            for number, frame, is_commit, running in iter_valid_frames(
+                    self.wal_path, header, state['frames'], state['checksum']):
+                fh.write(frame)
+                if is_commit:
+                    last, checksum, committed_bytes = number, running, fh.tell()
+            fh.truncate(committed_bytes)
+            fh.flush()
+            os.fsync(fh.fileno())
+        if last is None:
+            _remove(partial)
+            return 0
+        os.replace(partial, epoch_dir / f'{first:010d}-{last:010d}-{format_timestamp(now())}.frames')
+        state.update(frames=last, checksum=checksum, checkpointed=False)
+        return last - first + 1
+
+    def ship(self, checkpoint_bytes=None):
+        """
+        Ship new frames, starting a new generation first when the chain is
+        broken. With `checkpoint_bytes`, checkpoint the WAL once it is that
+        large. Return a summary dict.
+        """
+        self.open()
+        state = load_state(self.root)
+        state = dict(state, new_generation=False) if state else None
+        self._pin()
+        try:
+            header = read_wal_header(self.wal_path)
+            if not self._continues(state, header):
+                state = self._new_generation(header)
+            elif header is None:
+                # No WAL right now: the database file alone is current
+                state.update(salt=None, db_signature=_file_signature(self.db_path))
+            frames = self._ship(state)
+        finally:
+            self._unpin()
+
+        checkpointed = False
+        if checkpoint_bytes and os.path.exists(self.wal_path) and os.path.getsize(self.wal_path) >= checkpoint_bytes:
+            frames += self._checkpoint(state)
+            checkpointed = state['checkpointed']
+        save_state(self.root, state)
+        return {
+            'generation': state['generation'],
+            'new_generation': state['new_generation'],
+            'epoch': state['epoch'],
+            'frames': frames,
+            'checkpointed': checkpointed,
+        }
+
+    def _checkpoint(self, state):
+        """
+        With writers held off, ship the last frames and checkpoint the WAL, so
+        the epoch SQLite starts next continues this generation.
+        """
+        self._pin(immediate=True)
+        try:
+            header = read_wal_header(self.wal_path)
+            if header is None or header['salt'] != state['salt']:
+                return 0
+            frames = self._ship(state)
+            checkpointer = _connect(self.db_path)
+            try:
+                busy, wal_frames, done = checkpointer.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+            finally:
+                checkpointer.close()
+            if not busy and wal_frames == done == state['frames']:
+                state.update(checkpointed=True, db_signature=_file_signature(self.db_path))
+            return frames
+        finally:
+            self._unpin()
+
+    def run(self, interval=1.0, checkpoint_bytes=None, report=None):
+        """Ship forever, every `interval` seconds."""
+        with self:
+            while True:
+                summary = self.ship(checkpoint_bytes)
+                if report:
+                    report(summary)
+                time.sleep(interval)
+
+
+# ---------------------------------------------------------------------------
+# Restore
+# ---------------------------------------------------------------------------
+
+def _find_generation(generations, name=None, until=None):
+    if name:
+        for generation in generations:
+            if generation['name'] == name:
+                return generation
+        raise BackupError(f"No backup generation named {name}.")
+    candidates = [g for g in generations if until is None or g['created_at'] <= until]
+    if not candidates:
+        raise BackupError('No backup generation was taken before that time.' if until else 'No backups found.')
+    return candidates[-1]
+
+
+def _replay_epoch(db_path, epoch, segments):
+    """Attach the segments as the database's WAL and checkpoint them in."""
+    expected = 1
+    for segment in segments:
+        if segment['first'] != expected:
+            raise BackupError(f"Epoch {epoch['number']} is missing frames {expected}-{segment['first'] - 1}.")
+        expected = segment['last'] + 1
+
+    wal_path = _sidecar(db_path, '-wal')
+    with open(wal_path, 'wb') as out:
+        out.write((epoch['path'] / 'header').read_bytes())
+        for segment in segments:
+            with open(segment['path'], 'rb') as fh:
+                shutil.copyfileobj(fh, out)
+
+    _remove(_sidecar(db_path, '-shm'))
+
+    # TRUNCATE would report 0 frames once it has rewound the WAL; checkpoint
+    # passively to see the counts, closing the connection then removes the WAL
+    connection = _connect(db_path)
+    try:
+        busy, wal_frames, done = connection.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+    finally:
+        connection.close()
+    if busy or wal_frames != expected - 1 or done != wal_frames:
+        raise BackupError(
+            f"Epoch {epoch['number']}: replayed {done} of {expected - 1} frames; a segment is damaged."
+        )
+
+
+def restore(target, until=None, generation=None, root=None):
+    """
+    Rebuild the database into `target` as of `until` (latest when None) from
+    the newest generation taken before then. Return (generation name, time
+    the restored data is current to).
+    """
+    target = Path(target)
+    chosen = _find_generation(list_generations(root), generation, until)
+    if until and chosen['created_at'] > until:
+        raise BackupError(f"Generation {chosen['name']} starts after the requested time.")
+
+    partial = _sidecar(target, '.partial')
+    _remove(partial, _sidecar(partial, '-wal'), _sidecar(partial, '-shm'))
+    shutil.copyfile(chosen['path'] / SNAPSHOT_FILE, partial)
+
+    # The WAL file is only read when the database header says WAL mode
+    connection = _connect(partial)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.close()
+
+    restored_to = chosen['created_at']
+    for epoch in chosen['epochs']:
+        segments = [s for s in epoch['segments'] if until is None or s['shipped_at'] <= until]
+        if segments:
+            _replay_epoch(partial, epoch, segments)
+            restored_to = segments[-1]['shipped_at']
+        if len(segments) < len(epoch['segments']):
+            break
+
+    connection = _connect(partial)
+    try:
+        connection.execute('PRAGMA journal_mode=DELETE')
+        result = connection.execute('PRAGMA quick_check').fetchone()[0]
+    finally:
+        connection.close()
+    if result != 'ok':
+        raise BackupError(f'Restored database failed quick_check: {result}')
+    os.replace(partial, target)
+    return chosen['name'], restored_to
+
+
+def install_restored(restored, db_path=None):
+    """
+    Swap a restored file in as the live database. The current files are kept
+    as <name>.pre-restore-<timestamp>. Stop the application first.
+    """
+    db_path = Path(db_path or database_path())
+    suffix = f'.pre-restore-{format_timestamp(now())}'
+    for sidecar in ('', '-wal', '-shm'):
+        current = _sidecar(db_path, sidecar)
+        if current.exists():
+            os.replace(current, Path(f'{db_path}{suffix}{sidecar}'))
+    shutil.copyfile(restored, db_path)
+    return Path(f'{db_path}{suffix}')
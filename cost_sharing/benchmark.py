@@ -0,0 +1,312 @@
+# cost_sharing/benchmark.py
+"""
+Per-view benchmarks.
+
+run_benchmarks() requests every case in CASES through the Django test client,
+logged in as a user of the case's role, and records for each: wall time
+(first request and the median/min/max of `repeat` more), query count and
+database time (cost_sharing/query_budget.py), peak Python memory (tracemalloc,
+on a separate request so it does not slow the timed ones) and the response
+size. Streamed CSV responses are read to the end inside the measurement, so
+their queries and time count.
+
+The `benchmark` management command runs the cases against generated datasets
+(cost_sharing/dataset.py) at several scales, writes the results to JSON and
+compares them with a stored baseline:
+
+    python manage.py benchmark --scales 1,10,100 --save-baseline   # on main
+    python manage.py benchmark --scales 1,10,100                   # on a branch
+
+Each dataset lives in BENCHMARK_DIR (bench/, ignored by git) as
+scale-<scale>-seed-<seed>.sqlite3 and is generated once; every scale runs in
+its own process pointed at it with DATABASE_URL. Results of a run go to
+bench/ too; the baseline is kept in the repository, at BENCHMARK_BASELINE
+(benchmarks/baseline.json), so a branch compares against the one committed on main.
+"""
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import User, Payment
+from .query_budget import record_queries
+
+Case = namedtuple('Case', 'name role url_name query')
+
+CASES = [
+    Case('dashboard:student', 'student', 'dashboard', ''),
+    Case('dashboard:registrar_officer', 'registrar_officer', 'dashboard', ''),
+    Case('dashboard:cost_sharing_officer', 'cost_sharing_officer', 'dashboard', ''),
+    Case('dashboard:inland_revenue_officer', 'inland_revenue_officer', 'dashboard', ''),
+    Case('dashboard:admin', 'admin', 'dashboard', ''),
+    Case('payment_history', 'student', 'payment_history', ''),
+    Case('view_payment_status', 'inland_revenue_officer', 'view_payment_status', ''),
+    Case('students_without_agreements', 'registrar_officer', 'students_without_agreements', ''),
+    Case('view_students', 'cost_sharing_officer', 'view_students', ''),
+    Case('generate_payment_receipt', 'student', 'payment_receipt', ''),
+    # CSV exports
+    Case('csv:export_students_csv', 'admin', 'export_students_csv', ''),
+    Case('csv:export_paid_students_csv', 'admin', 'export_paid_students_csv', ''),
+    Case('csv:generate_report:cost_sharing', 'admin', 'generate_report', 'type=cost_sharing'),
+    Case('csv:generate_report:payments', 'admin', 'generate_report', 'type=payments'),
+    Case('csv:download_student_data', 'registrar_officer', 'download_student_data', ''),
+    Case('csv:download_students_without_agreements', 'registrar_officer',
+         'download_students_without_agreements', ''),
+    Case('csv:generate_student_report', 'cost_sharing_officer', 'generate_student_report', ''),
+    Case('csv:download_completed_student_data', 'cost_sharing_officer', 'download_completed_student_data', ''),
+    Case('csv:download_student_information', 'inland_revenue_officer', 'download_student_information', ''),
+]
+
+DEFAULT_REPEAT = 5
+# A case whose first request takes longer than this is not repeated (nor
+# measured for memory): at large scales an N+1 view can take minutes.
+SLOW_REQUEST_SECONDS = 20
+
+# Differences from the baseline smaller than these are noise: a time or
+# memory change counts only past both the relative and the absolute margin.
+# Any change in the number of queries counts.
+TIME_TOLERANCE = 0.2
+TIME_TOLERANCE_MS = 5
+MEMORY_TOLERANCE = 0.2
+MEMORY_TOLERANCE_KB = 256
+
+
+def benchmark_dir():
+    return Path(getattr(settings, 'BENCHMARK_DIR', Path(settings.BASE_DIR) / 'bench'))
+
+
+def baseline_file():
+    return Path(getattr(settings, 'BENCHMARK_BASELINE', Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'))
+
+
+def select_cases(patterns=None):
+    """Cases whose name starts with one of `patterns` (all cases if none)."""
+    if not patterns:
+        return list(CASES)
+    return [case for case in CASES if any(case.name.startswith(pattern) for pattern in patterns)]
+
+
+def benchmark_users():
+    """
+    The user each role is benchmarked as: the first of the role, except the
+    student, who is the one with the most payments (the heaviest history).
+    """
+    users = {}
+    for user in User.objects.filter(is_active=True).order_by('id'):
+        users.setdefault(user.role, user)
+    payer = (User.objects.filter(role='student', is_active=True)
+             .annotate(payment_count=Count('payments')).order_by('-payment_count', 'id').first())
+    if payer is not None:
+        users['student'] = payer
+    return users
+
+
+def case_url(case, user):
+    if case.url_name == 'payment_receipt':
+        payment = Payment.objects.filter(agreement__student=user).order_by('-date_paid').first()
+        if payment is None:
+            return None
+        url = reverse(case.url_name, args=[payment.pk])
+    else:
+        url = reverse(case.url_name)
+    return f'{url}?{case.query}' if case.query else url
+
+
+def _request(client, url):
+    with record_queries(shapes=False) as stats:
+        start = time.perf_counter()
+        response = client.get(url)
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        response.close()
+        ms = (time.perf_counter() - start) * 1000
+    return response.status_code, size, ms, stats
+
+
+def measure(client, url, repeat=DEFAULT_REPEAT, slow_seconds=SLOW_REQUEST_SECONDS):
+    """Time `url`: one cold request, one under tracemalloc, then `repeat` timed ones."""
+    status, size, cold_ms, stats = _request(client, url)
+    if cold_ms > slow_seconds * 1000:
+        return {
+            'status': status, 'bytes': size, 'queries': stats.count, 'cold_ms': round(cold_ms, 2),
+            'median_ms': round(cold_ms, 2), 'min_ms': round(cold_ms, 2), 'max_ms': round(cold_ms, 2),
+            'db_ms': round(stats.db_ms, 2), 'peak_memory_kb': None, 'slow': True,
+        }
+
+    tracemalloc.start()
+    try:
+        _request(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    times, db_times = [], []
+    for _ in range(repeat):
+        status, size, ms, stats = _request(client, url)
+        times.append(ms)
+        db_times.append(stats.db_ms)
+    return {
+        'status': status,
+        'bytes': size,
+        'queries': stats.count,
+        'cold_ms': round(cold_ms, 2),
+        'median_ms': round(statistics.median(times), 2),
+        'min_ms': round(min(times), 2),
+        'max_ms': round(max(times), 2),
+        'db_ms': round(statistics.median(db_times), 2),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(label, cases=None, repeat=DEFAULT_REPEAT, slow_seconds=SLOW_REQUEST_SECONDS, progress=None):
+    """Benchmark `cases` against the current database; returns one run for results['runs'][label]."""
+    progress = progress or (lambda case, result: None)
+    users = benchmark_users()
+    results = {}
+    # The middleware's own budget warnings would only repeat what is measured here
+    with override_settings(QUERY_BUDGET_ENABLED=False, PROFILER_ENABLED=False):
+        for case in cases or CASES:
+            user = users.get(case.role)
+            url = case_url(case, user) if user else None
+            if url is None:
+                result = {'skipped': f'no {case.role} with the data this case needs'}
+            else:
+                client = Client()
+                client.force_login(user)
+                try:
+                    result = {'url': url, 'user': user.username, **measure(client, url, repeat, slow_seconds)}
+                except Exception as e:
+                    result = {'url': url, 'user': user.username, 'error': f'{type(e).__name__}: {e}'}
+            results[case.name] = result
+            progress(case, result)
+    return {
+        'label': label,
+        'students': User.objects.filter(role='student').count(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'created_at': timezone.now().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'machine': platform.node(),
+    }
+
+
+# --- Datasets ----------------------------------------------------------------
+
+def scale_label(scale):
+    return f'scale-{scale:g}'
+
+
+def dataset_path(scale, seed):
+    return benchmark_dir() / f'{scale_label(scale)}-seed-{seed}.sqlite3'
+
+
+def manage_py(*args, database_path, **kwargs):
+    """Run a manage.py command in a subprocess against the SQLite file `database_path`."""
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{Path(database_path).resolve()}')
+    env.pop('DATABASE_REPLICA_URL', None)
+    return subprocess.run([sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), *args],
+                          env=env, check=True, **kwargs)
+
+
+def prepare_dataset(scale, seed):
+    """Path of the generated dataset for `scale`/`seed`, generating it on first use."""
+    path = dataset_path(scale, seed)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + '.partial')
+    for leftover in (partial, Path(f'{partial}-wal'), Path(f'{partial}-shm')):
+        leftover.unlink(missing_ok=True)
+    manage_py('migrate', '-v', '0', database_path=partial)
+    manage_py('generate_dataset', '--scale', str(scale), '--seed', str(seed), database_path=partial)
+    # Fold the WAL into the file before renaming it
+    connection = sqlite3.connect(partial)
+    try:
+        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        connection.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        connection.close()
+    partial.rename(path)
+    return path
+
+
+# --- Results and baselines ---------------------------------------------------
+
+def load_results(path):
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save_results(results, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=1))
+
+
+def _change(old, new, relative, absolute):
+    if old is None or new is None:
+        return None
+    difference = new - old
+    if abs(difference) <= absolute or abs(difference) <= relative * old:
+        return None
+    return 'regression' if difference > 0 else 'improvement'
+
+
+def compare(results, baseline):
+    """
+    Differences from the baseline beyond the tolerances, as dicts with run,
+    case, metric, baseline, current and verdict ('regression'/'improvement').
+    """
+    changes = []
+    for label, run in results['runs'].items():
+        baseline_run = baseline.get('runs', {}).get(label)
+        if not baseline_run:
+            continue
+        for case, current in run['results'].items():
+            before = baseline_run['results'].get(case)
+            if not before or 'median_ms' not in before or 'median_ms' not in current:
+                continue
+            metrics = [
+                ('median_ms', _change(before['median_ms'], current['median_ms'], TIME_TOLERANCE, TIME_TOLERANCE_MS)),
+                ('queries', _change(before['queries'], current['queries'], 0, 0)),
+                ('peak_memory_kb', _change(before['peak_memory_kb'], current['peak_memory_kb'],
+                                           MEMORY_TOLERANCE, MEMORY_TOLERANCE_KB)),
+            ]
+            for metric, verdict in metrics:
+                if verdict:
+                    changes.append({
+                        'run': label, 'case': case, 'metric': metric,
+                        'baseline': before[metric], 'current': current[metric], 'verdict': verdict,
+                    })
+    return changes
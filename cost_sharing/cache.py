@@ -0,0 +1,200 @@
+# cost_sharing/cache.py
+"""
+Namespaced, versioned caching shared by all workers.
+
+CACHES['default'] (CACHE_URL, see ocsms/cache_config.py) is a file, database
+or Redis cache, so every gunicorn worker - and with the database or Redis,
+every node - reads the same entries. Code caches through a Namespace tied to
+the models its values are computed from:
+
+    cost_cache = Namespace('costs', 'cost_sharing.CostStructure')
+
+    cost_cache.get_or_set(('structure', department_id, year), compute)
+    cost_cache.invalidate()
+
+Keys are '<database>:<namespace>:<version>:<parts>', <database> being a
+hash of the default database's settings, so servers (and test runs) on
+different databases never read each other's entries from a shared cache
+directory or server. The version is itself a cache entry: invalidating a namespace bumps it, so every worker stops reading the
+old entries at once (they expire on their own). Saving or deleting an
+instance of one of the namespace's models invalidates it through
+post_save/post_delete, connected in CostSharingConfig.ready(), once the
+write's transaction commits: a worker recomputing a value in between would
+otherwise cache what the transaction was about to change.
+QuerySet.update(), bulk_create() and raw SQL send no signals: call
+invalidate() after them, or rely on the entries' timeout.
+
+get_or_set() computes missing values on the primary database (use_primary()):
+views decorated with @replica_reads would otherwise cache what a lagging
+replica returned, which no invalidation would correct until the entry expired.
+
+Lookups are counted per namespace in ocsms_cache_requests_total
+(result="hit"/"miss") and invalidations in ocsms_cache_invalidations_total,
+both on /metrics.
+"""
+import hashlib
+import time
+from urllib.parse import quote
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_delete, post_save
+
+from .db_router import use_primary
+from .metrics import registry
+
+# Longer keys are hashed (memcached-compatible backends reject keys over 250 characters)
+MAX_KEY_LENGTH = 200
+# Saves that only touch these fields leave namespaces alone (every login
+# saves User.last_login)
+IGNORED_UPDATE_FIELDS = {'cost_sharing.User': {'last_login'}}
+
+registry.describe('ocsms_cache_requests_total', 'counter', 'Cache lookups by namespace and result (hit or miss).')
+registry.describe('ocsms_cache_invalidations_total', 'counter', 'Namespace invalidations by namespace.')
+
+_MISSING = object()
+namespaces = {}
+_database_prefixes = {}
+
+
+def database_prefix():
+    """Short hash identifying the default database (the test database during tests)."""
+    database = connections[DEFAULT_DB_ALIAS].settings_dict
+    identity = '|'.join(str(database.get(key) or '') for key in ('ENGINE', 'HOST', 'PORT', 'NAME'))
+    prefix = _database_prefixes.get(identity)
+    if prefix is None:
+        prefix = _database_prefixes[identity] = hashlib.sha1(identity.encode()).hexdigest()[:8]
+    return prefix
+
+
+class Namespace:
+    def __init__(self, name, *models, timeout=None):
+        """
+        `models` are 'app_label.ModelName' labels whose writes invalidate the
+        namespace; `timeout` (seconds) defaults to CACHES['default']['TIMEOUT'].
+        """
+        if name in namespaces:
+            raise ValueError(f"Cache namespace '{name}' is already defined.")
+        self.name = name
+        self.models = models
+        self.timeout = timeout
+        namespaces[name] = self
+
+    def __repr__(self):
+        return f'<Namespace {self.name}>'
+
+    @property
+    def version_key(self):
+        return f'{database_prefix()}:{self.name}:version'
+
+    def version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            # Start from the clock rather than 1: if the version entry was
+            # culled, entries stored under an earlier version stay unreachable
+            cache.add(self.version_key, time.time_ns() // 1000, timeout=None)
+            version = cache.get(self.version_key)
+        return version
+
+    def key(self, parts):
+        if not isinstance(parts, (tuple, list)):
+            parts = (parts,)
+        prefix = f'{database_prefix()}:{self.name}:{self.version()}:'
+        suffix = ':'.join(quote(str(part), safe='') for part in parts)
+        if len(prefix) + len(suffix) > MAX_KEY_LENGTH:
+            suffix = hashlib.sha1(suffix.encode()).hexdigest()
+        return prefix + suffix
+
+    def get(self, parts, default=None):
+        value = cache.get(self.key(parts), _MISSING)
+        registry.inc('ocsms_cache_requests_total',
+                     {'namespace': self.name, 'result': 'miss' if value is _MISSING else 'hit'})
+        return default if value is _MISSING else value
+
+    def set(self, parts, value, timeout=None):
+        cache.set(self.key(parts), value, self._timeout(timeout))
+
+    def get_or_set(self, parts, compute, timeout=None):
+        """
+        The cached value for `parts`, or compute() - run on the primary
+        database - stored for next time (None is cached too).
+        """
+        key = self.key(parts)
+        value = cache.get(key, _MISSING)
+        registry.inc('ocsms_cache_requests_total',
+                     {'namespace': self.name, 'result': 'miss' if value is _MISSING else 'hit'})
+        if value is _MISSING:
+            with use_primary():
+                value = compute()
+            cache.set(key, value, self._timeout(timeout))
+        return value
+
+    def invalidate(self):
+        """Make every entry of the namespace unreachable, for all workers."""
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            # No version yet: nothing can have been cached under one
+            pass
+        registry.inc('ocsms_cache_invalidations_total', {'namespace': self.name})
+
+    def _timeout(self, timeout):
+        if timeout is not None:
+            return timeout
+        if self.timeout is not None:
+            return self.timeout
+        return settings.CACHES['default'].get('TIMEOUT', 300)
+
+
+def invalidate_all():
+    for namespace in namespaces.values():
+        namespace.invalidate()
+
+
+def connect_invalidation():
+    """Invalidate each namespace on saves and deletes of its models (from AppConfig.ready())."""
+    for namespace in namespaces.values():
+        for label in namespace.models:
+            model = apps.get_model(label)
+            ignored = IGNORED_UPDATE_FIELDS.get(label, set())
+
+            def receiver(sender, namespace=namespace, ignored=ignored, update_fields=None, using=None, **kwargs):
+                if update_fields and ignored and set(update_fields) <= ignored:
+                    return
+                # Runs right away outside a transaction
+                transaction.on_commit(namespace.invalidate, using=using)
+
+            for action, signal in (('save', post_save), ('delete', post_delete)):
+                signal.connect(receiver, sender=model, weak=False,
+                               dispatch_uid=f'cache:{namespace.name}:{label}:{action}')
+
+
+def ensure_cache_tables(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver: create the table of a database cache (a no-op if it exists)."""
+    if any(entry['BACKEND'].endswith('.DatabaseCache') for entry in settings.CACHES.values()):
+        call_command('createcachetable', database=using, verbosity=0)
+
+
+# Namespaces of the app's cached values. The faculty/department name lists
+# change only when a new name first appears, so they are kept longer.
+reference_cache = Namespace('reference', 'cost_sharing.Faculty', 'cost_sharing.Department', timeout=60 * 60)
+cost_cache = Namespace('costs', 'cost_sharing.CostStructure')
+notice_cache = Namespace('notices', 'cost_sharing.Notice')
+
+# Dashboard fragments (cost_sharing/dashboard.py), keyed by role
+dashboard_counts_cache = Namespace(
+    'dashboard-counts',
+    'cost_sharing.User', 'cost_sharing.CostSharingAgreement', 'cost_sharing.Payment', 'cost_sharing.BankAccount',
+)
+dashboard_activity_cache = Namespace('dashboard-activity', 'cost_sharing.User', 'cost_sharing.Feedback')
+dashboard_students_cache = Namespace(
+    'dashboard-students', 'cost_sharing.StudentData', 'cost_sharing.CostSharingAgreement',
+)
+dashboard_payments_cache = Namespace(
+    'dashboard-payments',
+    'cost_sharing.StudentData', 'cost_sharing.CostSharingAgreement', 'cost_sharing.Payment',
+    'cost_sharing.CostStructure',
+)
@@ -0,0 +1,153 @@
+# cost_sharing/changes.py
+"""
+Incremental "changes since" feeds for downstream syncs.
+
+Each feed returns the rows of one table ordered by (updated_at, id), starting
+after a watermark the client got from the previous call. A nightly sync only
+reads the rows written since its last run instead of the whole history.
+
+Deleted rows are not reported; a periodic full export is still needed to pick
+those up.
+"""
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import CostSharingAgreement, Payment, StudentData, with_total_cost
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+
+
+def _payments():
+    return Payment.objects.all()
+
+
+def _agreements():
+    return with_total_cost(CostSharingAgreement.objects.all())
+
+
+def _students():
+    return StudentData.objects.all()
+
+
+FEEDS = {
+    'payments': {
+        'queryset': _payments,
+        'fields': {
+            'id': 'id',
+            'updated_at': 'updated_at',
+            'student_id': 'payer__username',
+            'agreement_id': 'agreement_id',
+            'amount_paid': 'amount_paid',
+            'date_paid': 'date_paid',
+            'payment_method': 'payment_method',
+            'transaction_code': 'transaction_code',
+            'status': 'status',
+            'verified_at': 'verified_at',
+        },
+        'roles': ['admin', 'cost_sharing_officer', 'inland_revenue_officer'],
+    },
+    'agreements': {
+        'queryset': _agreements,
+        'fields': {
+            'id': 'id',
+            'updated_at': 'updated_at',
+            'student_id': 'student__username',
+            'full_name': 'full_name',
+            'academic_year': 'academic_year',
+            'faculty': 'faculty',
+            'department': 'department',
+            'year': 'year',
+            'service_type': 'service_type',
+            'education_service': 'education_service',
+            'food_service': 'food_service',
+            'dormitory_service': 'dormitory_service',
+            'total_cost': 'annotated_total_cost',
+            'status': 'status',
+            'date_filled': 'date_filled',
+        },
+        'roles': ['admin', 'cost_sharing_officer', 'inland_revenue_officer'],
+    },
+    'students': {
+        'queryset': _students,
+        'fields': {
+            'id': 'id',
+            'updated_at': 'updated_at',
+            'student_id': 'student_id',
+            'full_name': 'full_name',
+            'sex': 'sex',
+            'faculty': 'faculty',
+            'department': 'department',
+            'year_of_entrance': 'year_of_entrance',
+            'year_of_study': 'year_of_study',
+            'academic_year': 'academic_year',
+            'is_graduate': 'is_graduate',
+            'status': 'status',
+            'assigned_to': 'assigned_to__username',
+        },
+        'roles': ['admin', 'registrar_officer', 'cost_sharing_officer', 'inland_revenue_officer'],
+    },
+}
+
+
+def parse_watermark(since, after_id):
+    """
+    Validate the `since` (ISO datetime) and `after_id` query parameters.
+
+    Returns (datetime or None, int). Raises ValueError on bad input.
+    """
+    since_dt = None
+    if since:
+        since_dt = parse_datetime(since)
+        if since_dt is None:
+            raise ValueError("'since' must be an ISO 8601 datetime")
+    try:
+        after_id = int(after_id or 0)
+    except ValueError:
+        raise ValueError("'after_id' must be an integer")
+    return since_dt, after_id
+
+
+def changes_since(feed_name, since=None, after_id=0, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return one page of the feed after the (since, after_id) watermark.
+
+    Result: {'results': [...], 'has_more': bool, 'next': {'since', 'after_id'}}.
+    'next' is the watermark to pass on the following call; it is the same as
+    the one given when the page is empty.
+    """
+    feed = FEEDS[feed_name]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    queryset = feed['queryset']()
+    if since is not None:
+        queryset = queryset.filter(
+            Q(updated_at__gt=since) | Q(updated_at=since, id__gt=after_id)
+        )
+    fields = feed['fields']
+    rows = list(
+        queryset.order_by('updated_at', 'id').values(*fields.values())[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if rows:
+        next_since, next_after_id = rows[-1]['updated_at'], rows[-1]['id']
+    else:
+        next_since, next_after_id = since, after_id
+
+    results = []
+    for row in rows:
+        result = {name: row[lookup] for name, lookup in fields.items()}
+        # Full microsecond precision so a row's own updated_at works as a watermark
+        result['updated_at'] = result['updated_at'].isoformat()
+        results.append(result)
+
+    return {
+        'results': results,
+        'has_more': has_more,
+        'next': {
+            'since': next_since.isoformat() if next_since else None,
+            'after_id': next_after_id,
+        },
+    }
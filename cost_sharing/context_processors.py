@@ -9,7 +9,7 @@ def accepted_agreement(request):
     ag_id = None
     user = getattr(request, 'user', None)
     if user and user.is_authenticated and getattr(user, 'role', None) == 'student':
-        ag = CostSharingAgreement.objects.filter(student=user, status__iexact='accepted').order_by('-id').first()
+        ag = CostSharingAgreement.objects.filter(student=user, status=CostSharingAgreement.Status.ACCEPTED).order_by('-id').first()
         if ag:
             has = True
             ag_id = ag.id
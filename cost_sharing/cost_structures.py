@@ -0,0 +1,47 @@
+# cost_sharing/cost_structures.py
+"""
+Duplicate cost structures.
+
+CostSharingAgreement.total_cost expects one CostStructure per department and
+year, departments being matched by reference_key() (case and spacing ignored). Migrations that add the uniqueness constraint refuse to run while
+duplicates exist and list them; merging them is an explicit step:
+
+    python manage.py dedupe_cost_structures            # report only
+    python manage.py dedupe_cost_structures --apply    # keep the newest of each group
+
+--apply keeps the most recently updated row of each group and writes the rows
+it deletes to a JSON fixture first (restore them with `manage.py loaddata`).
+"""
+from itertools import groupby
+
+from django.core import serializers
+from django.db import transaction
+
+from .models import CostStructure, reference_key
+
+
+def duplicate_key(structure):
+    return reference_key(structure.department), structure.year
+
+
+def duplicate_groups():
+    """Lists of structures sharing a department key and year, most recently updated first."""
+    # sorted() is stable: each group keeps the newest-first order
+    structures = sorted(CostStructure.objects.order_by('-updated_at', '-id'), key=duplicate_key)
+    groups = [list(rows) for _, rows in groupby(structures, key=duplicate_key)]
+    return [rows for rows in groups if len(rows) > 1]
+
+
+def remove_duplicates(groups, fixture_path):
+    """
+    Delete every structure of `groups` but the first of each, after writing
+    them to `fixture_path`. Returns the deleted structures.
+    """
+    doomed = [structure for rows in groups for structure in rows[1:]]
+    if not doomed:
+        return []
+    fixture_path.parent.mkdir(parents=True, exist_ok=True)
+    fixture_path.write_text(serializers.serialize('json', doomed, indent=1))
+    with transaction.atomic():
+        CostStructure.objects.filter(pk__in=[structure.pk for structure in doomed]).delete()
+    return doomed
@@ -0,0 +1,202 @@
+# cost_sharing/dashboard.py
+"""
+Cached dashboard fragments.
+
+The admin, registrar and officer dashboards show every user of a role the
+same aggregates: site-wide counts, recent activity, which students have an
+agreement, the graduates' payment totals. Each fragment is computed once,
+kept in the shared cache (cost_sharing/cache.py) under the role and the
+fragment's name, and recomputed after a write to one of the models it is
+built from - the models of its namespace. A team of officers reloading
+their dashboards then costs a few cache reads instead of the aggregate
+queries behind them.
+
+Like every cached value, fragments are computed on the primary database
+(Namespace.get_or_set()): the dashboards read from the replica, which may
+not have the write that invalidated the fragment yet.
+
+The dashboard views hand fragments and other costly values to their
+templates through lazy() and lazy_fragment(): nothing is read or queried
+unless the rendered template uses the value.
+
+The registrar and cost sharing officer dashboards load their sections as
+partials (views.dashboard_partial). Each partial's ETag, partial_etag(), is
+derived from the versions of the namespaces it is built from, so a browser
+revalidating an unchanged section gets a 304 without it being rendered.
+"""
+import functools
+import hashlib
+import time
+from collections import defaultdict
+
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.utils.http import quote_etag
+
+from .cache import (
+    dashboard_activity_cache, dashboard_counts_cache, dashboard_payments_cache, dashboard_students_cache,
+    database_prefix,
+)
+from .models import BankAccount, CostSharingAgreement, Feedback, Payment, StudentData, User, with_total_cost
+
+
+def fragment(namespace, role, name, compute):
+    return namespace.get_or_set((role, name), compute)
+
+
+def lazy(compute):
+    """
+    A context value computed by compute() the first time the template uses
+    it. Templates call the callables they resolve; the result is kept, so
+    later uses in the same render reuse it.
+    """
+    return functools.cache(compute)
+
+
+def lazy_fragment(fragment, role, *names):
+    """Lazy context values for the `names` entries of fragment(role), which is fetched once, on first use."""
+    values = lazy(lambda: fragment(role))
+    return {name: lazy(lambda name=name: values()[name]) for name in names}
+
+
+def overview_counts(role):
+    """total_users, total_agreements, total_payments and total_bank_accounts."""
+    return fragment(dashboard_counts_cache, role, 'counts', lambda: {
+        'total_users': User.objects.count(),
+        'total_agreements': CostSharingAgreement.objects.count(),
+        'total_payments': Payment.objects.count(),
+        'total_bank_accounts': BankAccount.objects.count(),
+    })
+
+
+def recent_activity(role):
+    """The five newest users and feedback messages."""
+    return fragment(dashboard_activity_cache, role, 'recent', lambda: {
+        'recent_users': list(User.objects.all().order_by('-date_joined')[:5]),
+        'recent_feedbacks': list(Feedback.objects.select_related('student').order_by('-date_submitted')[:5]),
+    })
+
+
+def _agreement_student_ids():
+    all_agreements = CostSharingAgreement.objects.all()
+    students_with_agreements_from_relations = all_agreements.exclude(
+        student__isnull=True
+    ).values_list('student__student_id', flat=True).distinct()
+
+    agreement_full_names = all_agreements.values_list('full_name', flat=True).distinct()
+    students_with_matching_names = StudentData.objects.filter(
+        full_name__in=agreement_full_names
+    ).values_list('student_id', flat=True)
+
+    return frozenset(filter(None, list(students_with_agreements_from_relations) + list(students_with_matching_names)))
+
+
+def agreement_student_ids(role):
+    """student_id of every student with an agreement, through their account or by full name."""
+    return fragment(dashboard_students_cache, role, 'agreement_student_ids', _agreement_student_ids)
+
+
+def registrar_statistics(role):
+    """Uploaded students, how many have an agreement and the compliance rate."""
+    def compute():
+        students_uploaded = StudentData.objects.count()
+        students_without_agreements_count = StudentData.objects.exclude(
+            student_id__in=agreement_student_ids(role)
+        ).count()
+        students_with_agreements = students_uploaded - students_without_agreements_count
+        return {
+            'students_uploaded': students_uploaded,
+            'students_without_agreements_count': students_without_agreements_count,
+            'students_with_agreements': students_with_agreements,
+            'compliance_rate': (students_with_agreements / students_uploaded) * 100 if students_uploaded > 0 else 0,
+        }
+    return fragment(dashboard_students_cache, role, 'registrar_statistics', compute)
+
+
+def _graduate_payment_totals():
+    # Get graduate students
+    graduates = StudentData.objects.filter(is_graduate=True)
+
+    # One query for every agreement of a graduate - through their account or
+    # by full name - with its cost and everything paid on it
+    paid = Payment.objects.filter(agreement=OuterRef('pk')).order_by().values('agreement').annotate(
+        total=Sum('amount_paid')).values('total')
+    agreements = with_total_cost(CostSharingAgreement.objects.filter(
+        Q(student__student_id__in=graduates.values('student_id')) | Q(full_name__in=graduates.values('full_name'))
+    )).annotate(total_paid=Subquery(paid)).values(
+        'pk', 'student__student_id', 'full_name', 'annotated_total_cost', 'total_paid',
+    )
+
+    # Group per student
+    by_student_id = defaultdict(list)
+    by_full_name = defaultdict(list)
+    for agreement in agreements:
+        if agreement['student__student_id']:
+            by_student_id[agreement['student__student_id']].append(agreement)
+        by_full_name[agreement['full_name']].append(agreement)
+
+    # Calculate totals for each graduate student
+    student_totals = []
+
+    for student_data in graduates:
+        # All agreements for this student, each once
+        student_agreements = {
+            agreement['pk']: agreement
+            for agreement in by_student_id[student_data.student_id] + by_full_name[student_data.full_name]
+        }.values()
+
+        # Calculate totals across ALL agreements
+        total_cost_all = sum(float(agreement['annotated_total_cost'] or 0) for agreement in student_agreements)
+        total_paid_all = sum(float(agreement['total_paid'] or 0) for agreement in student_agreements)
+
+        # Calculate remaining balance
+        remaining_balance_all = total_cost_all - total_paid_all
+
+        # Determine payment status
+        if total_cost_all > 0:
+            if remaining_balance_all <= 0:
+                payment_status = 'Paid'
+                status_class = 'bg-success'
+            elif total_paid_all > 0:
+                payment_status = 'Partial'
+                status_class = 'bg-warning'
+            else:
+                payment_status = 'Unpaid'
+                status_class = 'bg-danger'
+        else:
+            payment_status = 'No Agreement'
+            status_class = 'bg-secondary'
+
+        student_totals.append({
+            'student_id': student_data.student_id,
+            'full_name': student_data.full_name,
+            'department': student_data.department,
+            'total_cost_all': total_cost_all,
+            'total_paid_all': total_paid_all,
+            'remaining_balance_all': remaining_balance_all,
+            'payment_status': payment_status,
+            'status_class': status_class,
+            'agreement_count': len(student_agreements),
+            'has_agreement': bool(student_agreements),
+            'is_graduate': student_data.is_graduate,
+        })
+
+    total_collected = Payment.objects.filter(status__in=['partial', 'verified', 'completed']).aggregate(
+        total=Sum('amount_paid')
+    )['total'] or 0
+    return {'student_totals': student_totals, 'total_collected': total_collected}
+
+
+def graduate_payment_totals(role):
+    """Cost, paid and remaining per graduate student, and the total collected."""
+    return fragment(dashboard_payments_cache, role, 'graduate_totals', _graduate_payment_totals)
+
+
+def partial_etag(role, key, *namespaces):
+    """
+    ETag of a dashboard partial for `role` and `key` (its URL). It changes
+    when one of `namespaces` is invalidated, and every minute, for what
+    changes with time alone (notices expiring).
+    """
+    parts = [database_prefix(), role or '', key, str(int(time.time() // 60))]
+    parts += [f'{namespace.name}={namespace.version()}' for namespace in namespaces]
+    return quote_etag(hashlib.sha1('|'.join(parts).encode()).hexdigest())
@@ -0,0 +1,169 @@
+# cost_sharing/database.py
+"""
+SQLite connection tuning.
+
+Every new SQLite connection gets the PRAGMAs from settings.SQLITE_PRAGMAS
+(WAL journal, busy timeout, synchronous=NORMAL, page cache, mmap, foreign
+keys). With WAL, readers no longer block the writer, and busy_timeout makes a
+writer wait for the lock instead of failing at once with "database is locked".
+
+The settings are validated by a system check (cost_sharing.E001), and
+`manage.py check --database default` (also run by migrate) confirms the
+database actually runs with them (cost_sharing.W001).
+
+SQLite only picks the indexes the hot queries need (cost_sharing/query_plans.py)
+once it has table statistics, so migrate ends with ANALYZE and each process
+runs PRAGMA optimize after a request at most every SQLITE_OPTIMIZE_INTERVAL
+seconds to keep them current as the tables grow.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'foreign_keys': 'ON',
+    'analysis_limit': 1000,
+}
+
+# Accepted values per PRAGMA (None: any integer)
+PRAGMA_VALUES = {
+    'busy_timeout': None,
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA'},
+    'cache_size': None,
+    'mmap_size': None,
+    'foreign_keys': {'ON', 'OFF'},
+    'wal_autocheckpoint': None,
+    'analysis_limit': None,
+}
+
+# How PRAGMA <name> reports the value back
+SYNCHRONOUS_LEVELS = {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3}
+
+
+def sqlite_pragmas():
+    """Configured PRAGMAs, busy_timeout first so the journal mode switch waits for locks."""
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS))
+    ordered = {}
+    if 'busy_timeout' in pragmas:
+        ordered['busy_timeout'] = pragmas.pop('busy_timeout')
+    ordered.update(pragmas)
+    return ordered
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created handler: apply SQLITE_PRAGMAS to new SQLite connections."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+            if name == 'journal_mode':
+                mode = cursor.fetchone()[0]
+                if mode.upper() != str(value).upper():
+                    logger.warning("SQLite journal_mode is %s, not %s (in-memory database or unsupported filesystem?)", mode, value)
+
+
+def analyze_database(sender, using='default', **kwargs):
+    """post_migrate handler: refresh SQLite's planner statistics once the schema is in place."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+# alias -> time.monotonic() of the last PRAGMA optimize in this process
+_last_optimized = {}
+
+
+def optimize_sqlite(sender, **kwargs):
+    """request_finished handler: run PRAGMA optimize on open SQLite connections every SQLITE_OPTIMIZE_INTERVAL seconds."""
+    interval = getattr(settings, 'SQLITE_OPTIMIZE_INTERVAL', 3600)
+    if not interval:
+        return
+    now = time.monotonic()
+    for connection in connections.all(initialized_only=True):
+        # Closed connections (CONN_MAX_AGE reached) are left for a later request
+        if connection.vendor != 'sqlite' or connection.connection is None or connection.in_atomic_block:
+            continue
+        last = _last_optimized.get(connection.alias)
+        if last is not None and now - last < interval:
+            continue
+        _last_optimized[connection.alias] = now
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA optimize')
+
+
+def expected_pragma_value(name, value):
+    """Value PRAGMA <name> reports once <name> = <value> has been applied."""
+    if name == 'synchronous':
+        return SYNCHRONOUS_LEVELS[str(value).upper()]
+    if name == 'foreign_keys':
+        return 1 if str(value).upper() == 'ON' else 0
+    if name == 'journal_mode':
+        return str(value).lower()
+    return int(value)
+
+
+@checks.register()
+def check_sqlite_pragma_settings(app_configs, **kwargs):
+    errors = []
+    for name, value in sqlite_pragmas().items():
+        if name not in PRAGMA_VALUES:
+            errors.append(checks.Error(
+                f"Unsupported SQLite PRAGMA '{name}' in SQLITE_PRAGMAS.",
+                hint=f"Supported: {', '.join(sorted(PRAGMA_VALUES))}.",
+                id='cost_sharing.E001',
+            ))
+            continue
+        allowed = PRAGMA_VALUES[name]
+        if allowed is None:
+            valid = isinstance(value, int) and not isinstance(value, bool)
+        else:
+            valid = str(value).upper() in allowed
+        if not valid:
+            errors.append(checks.Error(
+                f"Invalid value {value!r} for SQLite PRAGMA '{name}' in SQLITE_PRAGMAS.",
+                hint='Expected an integer.' if allowed is None else f"Expected one of {', '.join(sorted(allowed))}.",
+                id='cost_sharing.E001',
+            ))
+    return errors
+
+
+@checks.register(checks.Tags.database)
+def check_sqlite_pragmas_applied(app_configs, databases=None, **kwargs):
+    from django.db import connections
+
+    warnings = []
+    for alias in databases or []:
+        connection = connections[alias]
+        # The in-memory test database has no journal file or mmap to set up
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            continue
+        with connection.cursor() as cursor:
+            for name, value in sqlite_pragmas().items():
+                if name not in PRAGMA_VALUES:
+                    continue
+                cursor.execute(f'PRAGMA {name}')
+                actual = cursor.fetchone()[0]
+                if name == 'journal_mode':
+                    actual = actual.lower()
+                if actual != expected_pragma_value(name, value):
+                    warnings.append(checks.Warning(
+                        f"Database '{alias}' runs with PRAGMA {name} = {actual}, not {value}.",
+                        hint='The connection_created hook in cost_sharing.database may not be connected, '
+                             'or the filesystem does not support this mode.',
+                        id='cost_sharing.W001',
+                    ))
+    return warnings
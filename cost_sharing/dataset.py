@@ -0,0 +1,461 @@
+# cost_sharing/dataset.py
+"""
+Synthetic data at production volumes, for benchmarks and load tests.
+
+generate_dataset() fills a migrated database with officers, students,
+registrar records, agreements, payments, notices and notifications drawn from
+the distributions below, reproducibly for a given seed.
+
+100k students come to about 1.5M rows, more than the ORM can save in a
+minute, so the high-volume tables are written by RowWriter: rows are plain
+tuples with ids assigned here, inserted with executemany in chunks of
+`chunk_size` students, one transaction per chunk, so memory stays flat at any
+scale. Every user shares one password hash, computed once. Nothing goes
+through Model.save() or signals, so the department/faculty references and
+timestamps that save() would fill in are written explicitly.
+"""
+import datetime
+import random
+import time
+from bisect import bisect
+from contextlib import contextmanager
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .cache import invalidate_all
+from .database import analyze_database
+from .models import (
+    User, Faculty, Department, CostStructure, CostSharingAgreement, Payment,
+    StudentData, Notice, Notification, BankAccount, reference_key,
+)
+from .search import FTS_TABLE, ensure_search_triggers
+
+# Students per unit of --scale
+STUDENTS_PER_SCALE = 1000
+DEFAULT_CHUNK_SIZE = 5000
+USERNAME_PREFIX = 'gen-'
+
+FACULTIES = {
+    'Engineering': ['Civil Engineering', 'Electrical Engineering', 'Mechanical Engineering', 'Software Engineering'],
+    'Natural Sciences': ['Biology', 'Chemistry', 'Physics', 'Mathematics'],
+    'Health Sciences': ['Medicine', 'Nursing', 'Pharmacy', 'Public Health'],
+    'Business and Economics': ['Accounting', 'Economics', 'Management'],
+    'Social Sciences': ['Sociology', 'Geography', 'History'],
+    'Agriculture': ['Plant Science', 'Animal Science', 'Agricultural Economics'],
+    'Law': ['Law'],
+    'Education': ['Educational Planning', 'English Language'],
+}
+# Programme length in years; everything not listed takes 4
+PROGRAMME_YEARS = {'Medicine': 6, 'Pharmacy': 5, 'Law': 5, 'Civil Engineering': 5,
+                   'Electrical Engineering': 5, 'Mechanical Engineering': 5, 'Software Engineering': 5}
+
+# Share of students by year of study: intake grows and some students drop out
+YEAR_WEIGHTS = [0.27, 0.23, 0.20, 0.17, 0.09, 0.04]
+# Agreement status for past years and for the current year of study
+PAST_STATUS_WEIGHTS = {'accepted': 0.94, 'rejected': 0.04, 'pending': 0.02}
+CURRENT_STATUS_WEIGHTS = {'accepted': 0.55, 'pending': 0.35, 'rejected': 0.10}
+# Students who have not filled this year's agreement yet
+MISSING_CURRENT_AGREEMENT = 0.08
+# Final-year students registered as graduates; only graduates make payments
+GRADUATE_SHARE = 0.6
+PAYMENT_STATUS_WEIGHTS = {'completed': 0.55, 'verified': 0.2, 'pending': 0.12, 'partial': 0.08,
+                          'failed': 0.03, 'cancelled': 0.02}
+PAYMENT_METHODS = ['bank_transfer', 'mobile_banking', 'online']
+NOTIFICATION_TYPE_WEIGHTS = {'system': 0.2, 'agreement': 0.35, 'payment': 0.2, 'notice': 0.2, 'feedback': 0.05}
+NOTIFICATIONS_PER_STUDENT = 10
+# Share of notifications read: most older ones, about half of the last month's
+READ_SHARE_RECENT = 0.5
+READ_SHARE_OLDER = 0.92
+NOTICES = 30
+
+# Officers per 1000 students (at least one of each role)
+OFFICERS_PER_1000 = {'cost_sharing_officer': 0.5, 'registrar_officer': 0.2, 'inland_revenue_officer': 0.2,
+                     'admin': 0.05}
+
+FIRST_NAMES = [
+    'Abebe', 'Almaz', 'Bekele', 'Birtukan', 'Dawit', 'Eleni', 'Fikru', 'Genet', 'Hana', 'Haile',
+    'Kebede', 'Lemlem', 'Meron', 'Mulugeta', 'Nardos', 'Rahel', 'Selam', 'Solomon', 'Tadesse', 'Tigist',
+    'Yared', 'Yonas', 'Zewdu', 'Mekdes', 'Samuel', 'Liya', 'Henok', 'Bethlehem', 'Kidus', 'Saron',
+]
+LAST_NAMES = [
+    'Alemu', 'Ayele', 'Bekele', 'Desta', 'Gebre', 'Girma', 'Hailu', 'Kassa', 'Mekonnen', 'Negash',
+    'Tesfaye', 'Tadesse', 'Wolde', 'Worku', 'Yilma', 'Zeleke', 'Abebe', 'Getachew', 'Mengistu', 'Asfaw',
+]
+REGIONS = ['Amhara', 'Oromia', 'Tigray', 'SNNPR', 'Afar', 'Somali', 'Sidama', 'Addis Ababa', 'Dire Dawa', 'Harari']
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+DAY = 24 * 3600
+
+
+class DatasetError(Exception):
+    pass
+
+
+@contextmanager
+def deferred_search_index(using):
+    """
+    Drop the SQLite search index's insert trigger for the duration of a bulk
+    load; ensure_search_triggers() puts it back and reindexes once at the end.
+    """
+    db = connections[using]
+    if db.vendor == 'sqlite':
+        with db.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai')
+    try:
+        yield
+    finally:
+        ensure_search_triggers(using)
+
+
+class Weighted:
+    """A weighted random choice with the cumulative weights computed once."""
+
+    def __init__(self, weights):
+        self.values = list(weights)
+        self.cum_weights = list(accumulate(weights.values()))
+        self.total = self.cum_weights[-1]
+
+    def pick(self, rng):
+        return self.values[bisect(self.cum_weights, rng.random() * self.total)]
+
+
+class RowWriter:
+    """
+    Inserts rows of one model with executemany. Rows are tuples in the order of
+    `fields`; every other column gets the field's default, with auto_now and
+    auto_now_add columns set to `now`. Ids continue from the table's highest.
+
+    Datetimes in rows are naive UTC, which SQLite stores as they are; they are
+    made aware for other databases.
+    """
+
+    def __init__(self, model, fields, using, now):
+        self.model = model
+        self.connection = connections[using]
+        opts = model._meta
+        given = [opts.get_field(name) for name in fields]
+        # Columns left out take their defaults; a left-out id is assigned by the database
+        rest = [field for field in opts.concrete_fields if field not in given and field is not opts.pk]
+        # (position, adapter) of the columns whose values need converting for the driver
+        self.adapters = [(i, adapt) for i, adapt in enumerate(map(self._adapter, given)) if adapt]
+        self.defaults = tuple(field.get_db_prep_save(self._default(field, now), self.connection) for field in rest)
+        quote = self.connection.ops.quote_name
+        columns = ', '.join(quote(field.column) for field in given + rest)
+        placeholders = ', '.join(['%s'] * (len(given) + len(rest)))
+        self.sql = f'INSERT INTO {quote(opts.db_table)} ({columns}) VALUES ({placeholders})'
+        self.next_id = (model.objects.using(using).aggregate(last=Max('pk'))['last'] or 0) + 1
+        self.count = 0
+
+    @staticmethod
+    def _default(field, now):
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            return now if field.get_internal_type() == 'DateTimeField' else now.date()
+        return field.get_default()
+
+    def _adapter(self, field):
+        ops = self.connection.ops
+        kind = field.get_internal_type()
+        if kind == 'DateTimeField':
+            if self.connection.vendor == 'sqlite':
+                return str
+            return lambda value: ops.adapt_datetimefield_value(value.replace(tzinfo=datetime.timezone.utc))
+        if kind == 'DateField':
+            return ops.adapt_datefield_value
+        if kind == 'DecimalField':
+            return lambda value: ops.adapt_decimalfield_value(value, field.max_digits, field.decimal_places)
+        return None
+
+    def take_id(self):
+        pk = self.next_id
+        self.next_id += 1
+        return pk
+
+    def write(self, rows):
+        if not rows:
+            return
+        adapters = self.adapters
+        defaults = self.defaults
+        prepared = []
+        for row in rows:
+            row = list(row)
+            for i, adapt in adapters:
+                if row[i] is not None:
+                    row[i] = adapt(row[i])
+            prepared.append((*row, *defaults))
+        with self.connection.cursor() as cursor:
+            cursor.executemany(self.sql, prepared)
+        self.count += len(rows)
+
+
+class Generator:
+    def __init__(self, students, seed, chunk_size, notifications_per_student, password, using, progress):
+        self.students = students
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.notifications_per_student = notifications_per_student
+        self.password_hash = make_password(password)
+        self.using = using
+        self.progress = progress or (lambda message: None)
+        self.aware_now = timezone.now()
+        # Naive UTC, see RowWriter
+        self.now = self.aware_now.replace(tzinfo=None)
+        self.current_year = self.now.year
+        self.counts = {}
+        # Year of study by programme length
+        self.year_of_study = {
+            years: Weighted(dict(zip(range(1, years + 1), YEAR_WEIGHTS))) for years in range(1, 7)
+        }
+        self.past_status = Weighted(PAST_STATUS_WEIGHTS)
+        self.current_status = Weighted(CURRENT_STATUS_WEIGHTS)
+        self.payment_status = Weighted(PAYMENT_STATUS_WEIGHTS)
+        self.notification_type = Weighted(NOTIFICATION_TYPE_WEIGHTS)
+
+    def writer(self, model, fields):
+        return RowWriter(model, fields, self.using, self.aware_now)
+
+    def count(self, model, number):
+        name = str(model._meta.verbose_name_plural)
+        self.counts[name] = self.counts.get(name, 0) + number
+
+    def moment_in_year(self, year):
+        start = datetime.datetime(year, 1, 1)
+        span = min(SECONDS_PER_YEAR, (self.now - start).total_seconds())
+        return start + datetime.timedelta(seconds=int(self.rng.random() * span))
+
+    def reference_data(self):
+        departments = []
+        for faculty_name, names in FACULTIES.items():
+            faculty, _ = Faculty.objects.using(self.using).get_or_create(
+                key=reference_key(faculty_name), defaults={'name': faculty_name})
+            for name in names:
+                department, _ = Department.objects.using(self.using).get_or_create(
+                    key=reference_key(name), defaults={'name': name, 'faculty': faculty})
+                departments.append((faculty, department, PROGRAMME_YEARS.get(name, 4)))
+        # Earlier departments are bigger: enrolment roughly follows a Zipf curve
+        self.departments = Weighted({
+            (faculty.name, faculty.pk, department.name, department.pk, years): 1 / (rank + 1) ** 0.8
+            for rank, (faculty, department, years) in enumerate(departments)
+        })
+
+        existing = set(CostStructure.objects.using(self.using).values_list('department_ref', 'year'))
+        structures = []
+        for _, department, years in departments:
+            for year in range(1, years + 1):
+                if (department.pk, year) in existing:
+                    continue
+                education = Decimal(self.rng.randrange(8000, 30000, 500))
+                food = Decimal(self.rng.randrange(6000, 12000, 250))
+                dormitory = Decimal(self.rng.randrange(1500, 4000, 100))
+                structures.append(CostStructure(
+                    department=department.name, department_ref=department, year=year,
+                    education_cost=education, food_cost=food, dormitory_cost=dormitory,
+                    total_cost=education + food + dormitory,
+                ))
+        CostStructure.objects.using(self.using).bulk_create(structures)
+        self.count(CostStructure, len(structures))
+        self.costs = {
+            (structure.department_ref_id, structure.year): structure.total_cost
+            for structure in CostStructure.objects.using(self.using).all()
+        }
+
+        accounts = []
+        for index, (bank, _) in enumerate(BankAccount.BANK_CHOICES[:4], start=1):
+            account, created = BankAccount.objects.using(self.using).get_or_create(
+                account_number=f'GEN{index:010d}',
+                defaults={'bank_name': bank, 'account_holder_name': 'University Finance', 'branch': 'Main'},
+            )
+            accounts.append(account.pk)
+            self.count(BankAccount, int(created))
+        self.bank_accounts = accounts
+
+    def officers(self):
+        self.users = self.writer(User, [
+            'id', 'username', 'password', 'first_name', 'last_name', 'email', 'role', 'is_staff', 'is_superuser',
+            'student_id', 'department', 'department_ref', 'year_of_study', 'date_joined',
+        ])
+        rows = []
+        self.by_role = {}
+        for role, per_1000 in OFFICERS_PER_1000.items():
+            for n in range(1, max(1, round(self.students * per_1000 / 1000)) + 1):
+                pk = self.users.take_id()
+                admin = role == 'admin'
+                rows.append((pk, f'{USERNAME_PREFIX}{role.split("_")[0]}{n:04d}', self.password_hash,
+                             self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES),
+                             f'{role}{n}@example.edu', role, admin, admin, None, None, None, None,
+                             self.moment_in_year(self.current_year - 3)))
+                self.by_role.setdefault(role, []).append(pk)
+        self.users.write(rows)
+
+        audiences = ['student', 'cost_sharing_officer', 'registrar_officer', 'inland_revenue_officer']
+        notices = [
+            Notice(
+                title=f'Notice {n}', content='Generated notice.',
+                audience=self.rng.sample(audiences, self.rng.randint(1, 3)),
+                is_active=self.rng.random() < 0.8,
+                expiry_date=self.aware_now + datetime.timedelta(days=self.rng.randint(-30, 60)),
+                posted_by_id=self.rng.choice(self.by_role['admin']),
+            )
+            for n in range(1, NOTICES + 1)
+        ]
+        Notice.objects.using(self.using).bulk_create(notices)
+        self.count(Notice, len(notices))
+
+    def student_writers(self):
+        self.student_data = self.writer(StudentData, [
+            'id', 'user', 'full_name', 'student_id', 'sex', 'region', 'woreda', 'phone_number',
+            'faculty', 'faculty_ref', 'department', 'department_ref', 'year_of_entrance', 'year_of_study',
+            'academic_year', 'mother_name', 'mother_phone', 'is_graduate', 'virtual_balance', 'assigned_to',
+            'status', 'created_at',
+        ])
+        self.agreements = self.writer(CostSharingAgreement, [
+            'id', 'student', 'academic_year', 'date_filled', 'full_name', 'sex', 'date_of_birth',
+            'place_of_birth', 'mother_name', 'mother_phone', 'mother_address', 'preparatory_school',
+            'high_school_completion_date', 'university_name', 'faculty', 'faculty_ref', 'department',
+            'department_ref', 'year', 'food_service', 'dormitory_service', 'service_type', 'is_graduate',
+            'status', 'receipt', 'updated_at',
+        ])
+        self.payments = self.writer(Payment, [
+            'id', 'agreement', 'payer', 'bank_account', 'transaction_code', 'amount_paid', 'payment_method',
+            'status', 'date_paid', 'created_at', 'updated_at',
+        ])
+        self.notifications = self.writer(Notification, [
+            'recipient', 'title', 'message', 'notification_type', 'is_read', 'created_at',
+        ])
+
+    def student_chunk(self, first, count):
+        rng = self.rng
+        random_ = rng.random
+        choice = rng.choice
+        cost_officers = self.by_role['cost_sharing_officer']
+        users, student_data, agreements, payments, notifications = [], [], [], [], []
+
+        for n in range(first, first + count):
+            faculty, faculty_id, department, department_id, programme_years = self.departments.pick(rng)
+            year_of_study = self.year_of_study[programme_years].pick(rng)
+            entrance = self.current_year - year_of_study + 1
+            graduate = year_of_study == programme_years and random_() < GRADUATE_SHARE
+            first_name, last_name = choice(FIRST_NAMES), choice(LAST_NAMES)
+            full_name = f'{first_name} {last_name}'
+            student_id = f'GEN-{n:07d}'
+            sex = choice('MF')
+            mother = f'{choice(FIRST_NAMES)} {choice(LAST_NAMES)}'
+            mother_phone = f'09{rng.randrange(10 ** 8):08d}'
+            joined = self.moment_in_year(entrance)
+
+            user_id = self.users.take_id()
+            users.append((user_id, f'{USERNAME_PREFIX}s{n:07d}', self.password_hash, first_name, last_name,
+                          f's{n:07d}@student.example.edu', 'student', False, False, student_id, department,
+                          department_id, year_of_study, joined))
+
+            assigned = choice(cost_officers) if random_() < 0.7 else None
+            student_data.append((
+                self.student_data.take_id(), user_id, full_name, student_id, sex, choice(REGIONS),
+                f'Woreda {rng.randint(1, 20)}', f'09{rng.randrange(10 ** 8):08d}',
+                faculty, faculty_id, department, department_id, entrance, year_of_study,
+                self.current_year, mother, mother_phone, graduate,
+                Decimal(rng.randrange(0, 60000, 500)) if graduate else Decimal(0), assigned,
+                StudentData.STATUS_ASSIGNED_TO_COST if assigned else StudentData.STATUS_UPLOADED, joined,
+            ))
+
+            birth = datetime.date(entrance - 19, rng.randint(1, 12), rng.randint(1, 28))
+            for year in range(1, year_of_study + 1):
+                current = year == year_of_study
+                if current and random_() < MISSING_CURRENT_AGREEMENT:
+                    continue
+                status = (self.current_status if current else self.past_status).pick(rng)
+                academic_year = entrance + year - 1
+                filled = self.moment_in_year(academic_year)
+                agreement_id = self.agreements.take_id()
+                agreements.append((
+                    agreement_id, user_id, academic_year, filled.date(), full_name, sex, birth, choice(REGIONS),
+                    mother, mother_phone, choice(REGIONS), 'Preparatory School', datetime.date(entrance - 1, 7, 1),
+                    'Generated University', faculty, faculty_id, department, department_id, year,
+                    random_() < 0.7, random_() < 0.6, 'in_cash' if random_() < 0.3 else 'in_kind',
+                    graduate and current, status, 'cost_sharing_receipts/generated.jpg', filled,
+                ))
+
+                # Graduates repay their accepted years in a few instalments
+                total_cost = self.costs.get((department_id, year))
+                if not graduate or status != 'accepted' or total_cost is None:
+                    continue
+                for _ in range(rng.randint(0, 4)):
+                    paid = self.moment_in_year(min(academic_year + rng.randint(0, 2), self.current_year))
+                    payment_id = self.payments.take_id()
+                    payments.append((
+                        payment_id, agreement_id, user_id, choice(self.bank_accounts), f'GEN{payment_id:012d}',
+                        Decimal(rng.randrange(500, int(total_cost) + 1, 100)), choice(PAYMENT_METHODS),
+                        self.payment_status.pick(rng), paid, paid, paid,
+                    ))
+
+            for _ in range(rng.randint(0, 2 * self.notifications_per_student)):
+                age = int(random_() * SECONDS_PER_YEAR)
+                notifications.append((
+                    user_id, 'Generated notification', 'Generated notification message.',
+                    self.notification_type.pick(rng),
+                    random_() < (READ_SHARE_RECENT if age < 30 * DAY else READ_SHARE_OLDER),
+                    self.now - datetime.timedelta(seconds=age),
+                ))
+
+        self.users.write(users)
+        self.student_data.write(student_data)
+        self.agreements.write(agreements)
+        self.payments.write(payments)
+        self.notifications.write(notifications)
+
+    def run(self):
+        start = time.perf_counter()
+        with transaction.atomic(using=self.using):
+            self.reference_data()
+            self.officers()
+        self.progress(f'Reference data and officers in {time.perf_counter() - start:.1f}s')
+
+        self.student_writers()
+        with deferred_search_index(self.using):
+            for first in range(1, self.students + 1, self.chunk_size):
+                count = min(self.chunk_size, self.students - first + 1)
+                with transaction.atomic(using=self.using):
+                    self.student_chunk(first, count)
+                self.progress(f'{first + count - 1}/{self.students} students ({time.perf_counter() - start:.1f}s)')
+        self.progress(f'Search index rebuilt ({time.perf_counter() - start:.1f}s)')
+
+        for writer in (self.users, self.student_data, self.agreements, self.payments, self.notifications):
+            self.count(writer.model, writer.count)
+        self.reset_sequences()
+        return self.counts
+
+    def reset_sequences(self):
+        """Move PostgreSQL's id sequences past the ids assigned here (a no-op on SQLite)."""
+        connection = connections[self.using]
+        models = [User, StudentData, CostSharingAgreement, Payment, Notification]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+
+def generate_dataset(scale=1.0, students=None, seed=0, chunk_size=DEFAULT_CHUNK_SIZE,
+                     notifications_per_student=NOTIFICATIONS_PER_STUDENT, password='password',
+                     using='default', progress=None):
+    """
+    Generate scale * STUDENTS_PER_SCALE students (or exactly `students`) and
+    everything that hangs off them. Returns the number of rows written per model.
+    """
+    if User.objects.using(using).filter(username__startswith=USERNAME_PREFIX).exists():
+        raise DatasetError('The database already has generated data; start from a freshly migrated database.')
+    students = students if students is not None else max(1, round(scale * STUDENTS_PER_SCALE))
+    generator = Generator(students, seed, chunk_size, notifications_per_student, password, using, progress)
+    counts = generator.run()
+    # Rows were inserted without save() or signals
+    for model in (User, CostStructure, CostSharingAgreement, StudentData):
+        model.resync_references(using)
+    # The statistics migrate left describe empty tables
+    analyze_database(None, using=using)
+    invalidate_all()
+    return counts
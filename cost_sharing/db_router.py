@@ -0,0 +1,123 @@
+# cost_sharing/db_router.py
+"""
+Read-replica routing.
+
+When DATABASES has a 'replica' alias (DATABASE_REPLICA_URL), reads made inside
+use_replica() - the views decorated with @replica_reads, streamed exports and
+export jobs - go to the replica. Everything else, and every write, uses the
+primary ('default').
+
+Read-your-writes: once a request writes anything, the rest of that request
+reads from the primary, and ReplicaStickinessMiddleware keeps the user's
+session on the primary for REPLICA_STICKY_SECONDS so pages rendered right
+after a payment or an approval never show replica lag.
+
+Without a replica alias all of this is a no-op.
+"""
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY_ALIAS = 'default'
+REPLICA_ALIAS = 'replica'
+# The database cache (CACHE_URL=db://...) always uses the primary: a replica
+# would serve invalidated versions until it caught up
+UNROUTED_APPS = ('django_cache',)
+
+_replica_reads = ContextVar('replica_reads', default=False)
+# Set for the whole request when the session wrote recently
+_sticky = ContextVar('replica_sticky', default=False)
+# Set by the first write in the current request / use_replica() block
+_wrote = ContextVar('replica_wrote', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def reads_from_replica():
+    """Whether a read made right now would go to the replica."""
+    return _replica_reads.get() and not _sticky.get() and not _wrote.get() and replica_configured()
+
+
+@contextmanager
+def use_replica():
+    """
+    Send reads in this block to the replica, until the block writes or the
+    request is pinned to the primary. Writes made before the block do not
+    count: callers decide up front (see reads_from_replica()).
+    """
+    reads = _replica_reads.set(True)
+    wrote = _wrote.set(False)
+    try:
+        yield
+    finally:
+        wrote_inside = _wrote.get()
+        _replica_reads.reset(reads)
+        _wrote.reset(wrote)
+        if wrote_inside:
+            _wrote.set(True)
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary in this block, even inside use_replica(): for
+    values that are cached once computed, which a lagging replica would
+    otherwise leave stale until they expire.
+    """
+    reads = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(reads)
+
+
+def replica_reads(view):
+    """View decorator: the view's queries read from the replica."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def on_replica(iterable):
+    """
+    Keep reading from the replica while a lazy iterable is consumed, e.g. the
+    rows of a streamed download that are fetched after the view returned.
+    """
+    with use_replica():
+        yield from iterable
+
+
+class ReplicaRouter:
+    """DATABASE_ROUTERS entry; see the module docstring."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in UNROUTED_APPS:
+            return PRIMARY_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from where their instance came from
+            return instance._state.db
+        return REPLICA_ALIAS if reads_from_replica() else PRIMARY_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Saving the session or a cache entry is not a data write worth pinning for
+        if model._meta.app_label not in ('sessions',) + UNROUTED_APPS:
+            _wrote.set(True)
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {PRIMARY_ALIAS, REPLICA_ALIAS, None}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives the schema from the primary
+        if db == REPLICA_ALIAS:
+            return False
+        return None
@@ -0,0 +1,175 @@
+# cost_sharing/export_jobs.py
+"""
+Background export jobs.
+
+Officers request a report from the Export Jobs page, a worker
+(`python manage.py process_export_jobs --loop`) writes it to media/exports/
+and the officer gets a notification with a download link. While a completed
+artifact for the same export is younger than EXPORT_ARTIFACT_MAX_AGE, new
+requests are answered with that stored file instead of a new job; requests
+made while the export is queued or running join that job and are notified
+with its requester.
+
+A job still running EXPORT_JOB_TIMEOUT seconds after it started belongs to a
+worker that died: it is not reused, and the next worker pass queues it again.
+"""
+import datetime
+import os
+import time
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from . import exports
+from .db_router import use_replica
+from .models import ExportJob
+
+
+def stale_cutoff():
+    """Jobs that started running before this moment are taken to be abandoned."""
+    return timezone.now() - datetime.timedelta(seconds=getattr(settings, 'EXPORT_JOB_TIMEOUT', 3600))
+
+
+def find_reusable_job(export_type, fmt='csv'):
+    """
+    Return a job that can answer a new request for `export_type` in `fmt`: a
+    fresh completed artifact, or one queued or running (and not stale). None otherwise.
+    """
+    latest_completed = ExportJob.objects.filter(
+        export_type=export_type,
+        format=fmt,
+        status=ExportJob.STATUS_COMPLETED,
+    ).order_by('-finished_at').first()
+    if latest_completed and latest_completed.is_fresh():
+        return latest_completed
+
+    return ExportJob.objects.filter(
+        Q(status=ExportJob.STATUS_QUEUED) | Q(status=ExportJob.STATUS_RUNNING, started_at__gte=stale_cutoff()),
+        export_type=export_type,
+        format=fmt,
+    ).order_by('-created_at').first()
+
+
+def request_export(user, export_type, fmt='csv'):
+    """
+    Queue an export for `user` in format `fmt`, or reuse an identical one.
+
+    Returns (job, reused). Raises ValueError for unknown export types or
+    formats and exports the user's role may not request.
+    """
+    export = exports.EXPORTS.get(export_type)
+    if export is None:
+        raise ValueError(f"Unknown export '{export_type}'")
+    if fmt not in exports.FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'")
+    if getattr(user, 'role', None) not in export['roles']:
+        raise ValueError("You don't have permission to request this export")
+
+    with transaction.atomic():
+        job = find_reusable_job(export_type, fmt)
+        if job is not None:
+            if job.status != ExportJob.STATUS_COMPLETED and job.requested_by_id != user.pk:
+                job.requesters.add(user)
+            return job, True
+        job = ExportJob.objects.create(export_type=export_type, format=fmt, requested_by=user)
+    return job, False
+
+
+def claim_job(job):
+    """Atomically move a queued job to running. Returns False if another worker got it first."""
+    claimed = ExportJob.objects.filter(pk=job.pk, status=ExportJob.STATUS_QUEUED).update(
+        status=ExportJob.STATUS_RUNNING,
+        started_at=timezone.now(),
+    )
+    return claimed == 1
+
+
+def requeue_stale_jobs():
+    """Queue again the running jobs whose worker died (see stale_cutoff()). Returns how many."""
+    return ExportJob.objects.filter(
+        status=ExportJob.STATUS_RUNNING, started_at__lt=stale_cutoff(),
+    ).update(status=ExportJob.STATUS_QUEUED, started_at=None)
+
+
+def run_export_job(job):
+    """Generate the artifact for a claimed job and notify the requester."""
+    export = exports.EXPORTS[job.export_type]
+    stamp = timezone.now().strftime('%Y%m%d%H%M%S')
+    base, ext = os.path.splitext(exports.filename_for(export['filename'], job.format))
+    file_name = f"{base}_{stamp}_{job.pk}{ext}"
+    final_path = os.path.join(exports.export_dir(), file_name)
+    tmp_path = final_path + '.part'
+
+    try:
+        with open(tmp_path, 'wb') as fh, use_replica():
+            row_count = exports.write_export(fh, job.format, export['columns'], export['rows']())
+        os.replace(tmp_path, final_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        finish_job(job, status=ExportJob.STATUS_FAILED, error=traceback.format_exc())
+        return job
+
+    if finish_job(job, status=ExportJob.STATUS_COMPLETED, file=f"exports/{file_name}", row_count=row_count):
+        notify_export_ready(job)
+    else:
+        # Requeued as stale while this worker was still writing it
+        os.remove(final_path)
+    return job
+
+
+def finish_job(job, **fields):
+    """
+    Record the outcome of a job this worker claimed, unless it was requeued
+    meanwhile (ran past EXPORT_JOB_TIMEOUT). Returns whether it was recorded.
+    """
+    fields['finished_at'] = timezone.now()
+    finished = ExportJob.objects.filter(
+        pk=job.pk, status=ExportJob.STATUS_RUNNING, started_at=job.started_at,
+    ).update(**fields)
+    if finished:
+        job.refresh_from_db()
+    return finished == 1
+
+
+def notify_export_ready(job):
+    """Notify the job's requester and everyone whose request joined it."""
+    # Imported here: views imports this module
+    from .views import create_notification
+
+    export = exports.EXPORTS[job.export_type]
+    link = f"{settings.SITE_URL}{reverse('download_export', args=[job.pk])}"
+    recipients = [job.requested_by] + [user for user in job.requesters.all() if user.pk != job.requested_by_id]
+    for recipient in recipients:
+        create_notification(
+            recipient=recipient,
+            title="Export Ready",
+            message=f"Your export '{export['label']}' ({exports.FORMATS[job.format]['label']}, {job.row_count} rows) is ready: {link}",
+            notification_type='export',
+            related_object_id=job.pk,
+            related_object_type='export_job',
+        )
+
+
+def process_pending_jobs(limit=None):
+    """Run queued jobs oldest first. Returns the number of jobs processed."""
+    requeue_stale_jobs()
+    processed = 0
+    queued = ExportJob.objects.filter(status=ExportJob.STATUS_QUEUED).order_by('created_at')
+    for job in queued[:limit] if limit else queued:
+        if claim_job(job):
+            job.refresh_from_db()
+            run_export_job(job)
+            processed += 1
+    return processed
+
+
+def run_worker(interval=5):
+    """Poll for queued jobs forever, sleeping `interval` seconds when the queue is empty."""
+    while True:
+        if not process_pending_jobs():
+            time.sleep(interval)
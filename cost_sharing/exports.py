@@ -0,0 +1,626 @@
+# cost_sharing/exports.py
+"""
+Report exports in CSV, XLSX and Parquet.
+
+Every export builds its rows from a queryset that joins what it needs up front
+(select_related / SQL annotations) and is read with .iterator(chunk_size=...).
+CSV is written out in batches through a StreamingHttpResponse, so memory stays
+flat and the first bytes reach the browser straight away. XLSX (constant-memory
+mode) and Parquet (one row group per block of rows) keep the column types -
+Decimal amounts, dates, integers - and are written to a temporary file before
+being sent.
+
+Exports are described once in EXPORTS and used by the download views
+(export_response) and by background export jobs (write_export).
+"""
+import csv
+import io
+import os
+import tempfile
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import DecimalField, Exists, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse, FileResponse
+
+from .db_router import on_replica, reads_from_replica
+from .models import (
+    User, CostSharingAgreement, Payment, StudentData, with_total_cost
+)
+
+# Rows fetched from the database per round trip
+EXPORT_CHUNK_SIZE = 2000
+# Rows written to the response per yielded block (CSV)
+ROWS_PER_BLOCK = 500
+# Rows per Parquet row group
+PARQUET_ROW_GROUP_SIZE = 50000
+
+FORMATS = {
+    'csv': {
+        'label': 'CSV',
+        'extension': '.csv',
+        'content_type': 'text/csv',
+    },
+    'xlsx': {
+        'label': 'Excel (XLSX)',
+        'extension': '.xlsx',
+        'content_type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    },
+    'parquet': {
+        'label': 'Parquet',
+        'extension': '.parquet',
+        'content_type': 'application/vnd.apache.parquet',
+    },
+}
+
+
+class ExportFormatUnavailable(ValueError):
+    """The library needed for an export format is not installed."""
+
+
+class Echo:
+    """File-like object whose write() just returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    """Yield the CSV text for header + rows in blocks of ROWS_PER_BLOCK lines."""
+    writer = csv.writer(Echo())
+    block = [writer.writerow(header)]
+    for row in rows:
+        block.append(writer.writerow(row))
+        if len(block) >= ROWS_PER_BLOCK:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+def stream_csv(filename, header, rows):
+    """Return a StreamingHttpResponse that downloads rows as a CSV file."""
+    response = StreamingHttpResponse(iter_csv(header, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+# =============================================================================
+# FILE WRITERS
+# `columns` is a list of (name, type) where type is one of
+# 'string', 'int', 'decimal', 'date', 'datetime'.
+# Each writer takes an open binary file and returns the number of data rows.
+# =============================================================================
+
+def write_csv(fh, columns, rows):
+    text = io.TextIOWrapper(fh, encoding='utf-8', newline='')
+    count = 0
+    try:
+        writer = csv.writer(text)
+        writer.writerow([name for name, _ in columns])
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        text.flush()
+    finally:
+        # Leave the underlying file open for the caller
+        text.detach()
+    return count
+
+
+def write_xlsx(fh, columns, rows):
+    try:
+        import xlsxwriter
+    except ImportError:
+        raise ExportFormatUnavailable('XLSX export requires the XlsxWriter package (pip install XlsxWriter).')
+
+    # constant_memory: each row is flushed to disk once the next one starts
+    workbook = xlsxwriter.Workbook(fh, {'constant_memory': True, 'remove_timezone': True})
+    worksheet = workbook.add_worksheet()
+    bold = workbook.add_format({'bold': True})
+    cell_formats = {
+        'decimal': workbook.add_format({'num_format': '#,##0.00'}),
+        'date': workbook.add_format({'num_format': 'yyyy-mm-dd'}),
+        'datetime': workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'}),
+    }
+    types = [column_type for _, column_type in columns]
+
+    for col, (name, _) in enumerate(columns):
+        worksheet.set_column(col, col, max(12, len(name) + 2))
+        worksheet.write_string(0, col, name, bold)
+
+    count = 0
+    for row_index, row in enumerate(rows, start=1):
+        for col, (value, column_type) in enumerate(zip(row, types)):
+            if value is None or value == '':
+                continue
+            if column_type in ('int', 'decimal'):
+                worksheet.write_number(row_index, col, float(value), cell_formats.get(column_type))
+            elif column_type in ('date', 'datetime'):
+                worksheet.write_datetime(row_index, col, value, cell_formats[column_type])
+            else:
+                worksheet.write_string(row_index, col, str(value))
+        count += 1
+
+    workbook.close()
+    return count
+
+
+def _arrow_type(pa, column_type):
+    return {
+        'string': pa.string(),
+        'int': pa.int64(),
+        'decimal': pa.decimal128(12, 2),
+        'date': pa.date32(),
+        'datetime': pa.timestamp('us', tz='UTC'),
+    }[column_type]
+
+
+def _arrow_value(value, column_type):
+    if value is None or (value == '' and column_type != 'string'):
+        return None
+    if column_type == 'decimal':
+        return Decimal(value).quantize(Decimal('0.01'))
+    if column_type == 'string':
+        return str(value)
+    return value
+
+
+def write_parquet(fh, columns, rows):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportFormatUnavailable('Parquet export requires the pyarrow package (pip install pyarrow).')
+
+    schema = pa.schema([(name, _arrow_type(pa, column_type)) for name, column_type in columns])
+    types = [column_type for _, column_type in columns]
+
+    def to_table(buffered):
+        arrays = [
+            pa.array([_arrow_value(row[i], column_type) for row in buffered], type=schema.field(i).type)
+            for i, column_type in enumerate(types)
+        ]
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    count = 0
+    with pq.ParquetWriter(fh, schema, compression='snappy') as writer:
+        buffered = []
+        for row in rows:
+            buffered.append(row)
+            count += 1
+            if len(buffered) >= PARQUET_ROW_GROUP_SIZE:
+                writer.write_table(to_table(buffered))
+                buffered = []
+        if buffered or count == 0:
+            writer.write_table(to_table(buffered))
+
+    return count
+
+
+WRITERS = {
+    'csv': write_csv,
+    'xlsx': write_xlsx,
+    'parquet': write_parquet,
+}
+
+
+def filename_for(filename, fmt):
+    """Swap the extension of an export's default file name for the chosen format."""
+    return os.path.splitext(filename)[0] + FORMATS[fmt]['extension']
+
+
+def write_export(fh, fmt, columns, rows):
+    """Write rows to an open binary file in the given format. Returns the row count."""
+    return WRITERS[fmt](fh, columns, rows)
+
+
+def export_response(request, export_type, rows=None, filename=None):
+    """
+    Download response for a registered export in the format asked for with
+    ?format= (csv by default). CSV is streamed; XLSX and Parquet are written to
+    a temporary file which is sent and then removed.
+
+    Raises ValueError for an unknown format and ExportFormatUnavailable (a
+    ValueError) when the format's library is missing; the calling view tells
+    the user.
+    """
+    export = EXPORTS[export_type]
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'")
+    rows = export['rows']() if rows is None else rows
+    if reads_from_replica():
+        # CSV rows are fetched while streaming, after the view has returned
+        rows = on_replica(rows)
+    filename = filename_for(filename or export['filename'], fmt)
+
+    if fmt == 'csv':
+        return stream_csv(filename, [name for name, _ in export['columns']], rows)
+
+    fh = tempfile.TemporaryFile()
+    try:
+        write_export(fh, fmt, export['columns'], rows)
+    except ExportFormatUnavailable:
+        fh.close()
+        raise
+    fh.seek(0)
+    return FileResponse(fh, as_attachment=True, filename=filename, content_type=FORMATS[fmt]['content_type'])
+
+
+def _full_name(user):
+    return user.get_full_name() if user else ''
+
+
+def _as_date(value):
+    """Date part of a date/datetime (or None)."""
+    if value is None:
+        return None
+    return value.date() if hasattr(value, 'date') else value
+
+
+# =============================================================================
+# EXPORT DEFINITIONS
+# Each export is a list of typed columns plus a generator of rows.
+# =============================================================================
+
+PAYMENT_DATA_COLUMNS = [
+    ('Student ID', 'string'),
+    ('Student Name', 'string'),
+    ('Agreement ID', 'int'),
+    ('Amount Paid', 'decimal'),
+    ('Date Paid', 'date'),
+    ('Payment Method', 'string'),
+    ('Status', 'string'),
+    ('Transaction Code', 'string'),
+]
+
+
+def payment_data_rows():
+    payments = Payment.objects.select_related('agreement__student')
+    for payment in payments.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        student = payment.agreement.student
+        yield [
+            student.student_id or '',
+            student.get_full_name() or student.username,
+            payment.agreement_id,
+            payment.amount_paid,
+            _as_date(payment.date_paid),
+            payment.get_payment_method_display() or payment.payment_method,
+            payment.status,
+            payment.transaction_code or '',
+        ]
+
+
+STUDENT_DATA_COLUMNS = [
+    ('Student ID', 'string'),
+    ('Full Name', 'string'),
+    ('Sex', 'string'),
+    ('Region', 'string'),
+    ('Woreda', 'string'),
+    ('Phone Number', 'string'),
+    ('Faculty', 'string'),
+    ('Department', 'string'),
+    ('Year of Entrance', 'int'),
+    ('Academic Year', 'int'),
+]
+
+
+def student_data_rows():
+    students = StudentData.objects.values_list(
+        'student_id', 'full_name', 'sex', 'region', 'woreda', 'phone_number',
+        'faculty', 'department', 'year_of_entrance', 'academic_year',
+    )
+    for student_id, *rest in students.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [student_id or '', *rest]
+
+
+STUDENT_REPORT_COLUMNS = [
+    ('Student ID', 'string'),
+    ('Student Name', 'string'),
+    ('Department', 'string'),
+    ('Academic Year', 'int'),
+    ('Total Cost', 'decimal'),
+    ('Service Type', 'string'),
+    ('Date Accepted', 'date'),
+]
+
+
+def student_report_rows():
+    """Accepted agreements for the cost sharing officer report."""
+    agreements = with_total_cost(
+        CostSharingAgreement.objects.filter(status=CostSharingAgreement.Status.ACCEPTED).select_related('student')
+    )
+    for agreement in agreements.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            agreement.student.student_id or '',
+            agreement.student.get_full_name() or agreement.student.username,
+            agreement.department,
+            agreement.academic_year,
+            agreement.total_cost,
+            agreement.get_service_type_display() or agreement.service_type,
+            _as_date(getattr(agreement, 'date_accepted', None)),
+        ]
+
+
+COMPLETED_STUDENT_DATA_COLUMNS = STUDENT_DATA_COLUMNS + [
+    ('Total Cost', 'decimal'),
+    ('Amount Paid', 'decimal'),
+    ('Status', 'string'),
+]
+
+# Payments that complete an agreement for the "after payment" export, and
+# those counted in its Amount Paid (as CostSharingAgreement.get_total_paid())
+COMPLETED_PAYMENT_STATUSES = ['verified', 'completed']
+PAID_PAYMENT_STATUSES = ['verified', 'completed', 'partial']
+
+
+def completed_student_data_rows():
+    """Uploaded data of students whose accepted agreement has a verified or completed payment."""
+    payments = Payment.objects.filter(agreement=OuterRef('pk'))
+    total_paid = payments.filter(status__in=PAID_PAYMENT_STATUSES).order_by().values('agreement').annotate(
+        total=Sum('amount_paid')
+    ).values('total')
+    agreements = with_total_cost(
+        CostSharingAgreement.objects.filter(status=CostSharingAgreement.Status.ACCEPTED)
+        .filter(Exists(payments.filter(status__in=COMPLETED_PAYMENT_STATUSES)))
+        .select_related('student')
+        .annotate(total_paid=Coalesce(Subquery(total_paid), Value(0),
+                                      output_field=DecimalField(max_digits=12, decimal_places=2)))
+        .order_by('pk')
+    )
+    chunk = []
+    for agreement in agreements.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        chunk.append(agreement)
+        if len(chunk) == EXPORT_CHUNK_SIZE:
+            yield from _completed_student_data_chunk(chunk)
+            chunk = []
+    yield from _completed_student_data_chunk(chunk)
+
+
+def _completed_student_data_chunk(agreements):
+    # One StudentData query per chunk of agreements, matched by student ID
+    student_ids = {agreement.student.student_id for agreement in agreements if agreement.student.student_id}
+    student_data = {data.student_id: data for data in StudentData.objects.filter(student_id__in=student_ids)}
+    for agreement in agreements:
+        data = student_data.get(agreement.student.student_id)
+        if data is None:
+            continue
+        yield [
+            agreement.student.student_id or '',
+            data.full_name,
+            data.sex,
+            data.region,
+            data.woreda,
+            data.phone_number,
+            data.faculty,
+            data.department,
+            data.year_of_entrance,
+            data.academic_year,
+            agreement.total_cost,
+            agreement.total_paid,
+            agreement.status,
+        ]
+
+
+STUDENT_INFORMATION_COLUMNS = [
+    ('Student ID', 'string'),
+    ('Full Name', 'string'),
+    ('Department', 'string'),
+    ('Academic Year', 'int'),
+    ('Total Cost', 'decimal'),
+    ('Service Type', 'string'),
+    ('Agreement Status', 'string'),
+]
+
+
+def student_information_rows():
+    agreements = with_total_cost(CostSharingAgreement.objects.select_related('student'))
+    for agreement in agreements.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            agreement.student.student_id if agreement.student.student_id else '',
+            agreement.full_name,
+            agreement.department,
+            agreement.academic_year,
+            agreement.total_cost,
+            agreement.get_service_type_display(),
+            agreement.status,
+        ]
+
+
+STUDENTS_COLUMNS = [
+    ('username', 'string'),
+    ('full_name', 'string'),
+    ('email', 'string'),
+    ('role', 'string'),
+]
+
+
+def students_rows():
+    users = User.objects.filter(role='student').only('username', 'first_name', 'last_name', 'email', 'role')
+    for user in users.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [user.username, user.get_full_name(), user.email, user.role]
+
+
+PAID_STUDENTS_COLUMNS = [
+    ('username', 'string'),
+    ('full_name', 'string'),
+    ('email', 'string'),
+    ('amount', 'decimal'),
+    ('tin', 'string'),
+    ('paid_at', 'datetime'),
+]
+
+
+def paid_students_rows():
+    payments = Payment.objects.select_related('payer')
+    for payment in payments.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        payer = payment.payer
+        yield [
+            payer.username if payer else '',
+            _full_name(payer),
+            payer.email if payer else '',
+            payment.amount_paid,
+            payment.tin or '',
+            payment.created_at,
+        ]
+
+
+COST_SHARING_REPORT_COLUMNS = [
+    ('Student ID', 'string'),
+    ('Name', 'string'),
+    ('Department', 'string'),
+    ('Year', 'int'),
+    ('Total Cost', 'decimal'),
+    ('Status', 'string'),
+]
+
+
+def cost_sharing_report_rows():
+    agreements = with_total_cost(CostSharingAgreement.objects.select_related('student'))
+    for agreement in agreements.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            agreement.student.student_id,
+            agreement.student.get_full_name(),
+            agreement.student.department,
+            agreement.academic_year,
+            agreement.total_cost,
+            agreement.status,
+        ]
+
+
+PAYMENTS_REPORT_COLUMNS = [
+    ('Student ID', 'string'),
+    ('Name', 'string'),
+    ('Amount Paid', 'decimal'),
+    ('Date Paid', 'datetime'),
+    ('Status', 'string'),
+]
+
+
+def payments_report_rows():
+    payments = Payment.objects.select_related('agreement__student')
+    for payment in payments.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            payment.agreement.student.student_id,
+            payment.agreement.student.get_full_name(),
+            payment.amount_paid,
+            payment.date_paid,
+            payment.status,
+        ]
+
+
+STUDENTS_WITHOUT_AGREEMENTS_COLUMNS = [
+    ('Student ID', 'string'),
+    ('Full Name', 'string'),
+    ('Department', 'string'),
+    ('Faculty', 'string'),
+    ('Academic Year', 'int'),
+    ('Phone Number', 'string'),
+    ('Region', 'string'),
+    ('Woreda', 'string'),
+]
+
+
+def students_without_agreements_rows(students):
+    """`students` is the already-filtered StudentData queryset from the view."""
+    students = students.values_list(
+        'student_id', 'full_name', 'department', 'faculty', 'academic_year',
+        'phone_number', 'region', 'woreda',
+    )
+    for row in students.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield list(row)
+
+
+# =============================================================================
+# EXPORT REGISTRY
+# Keyed by export type (also stored on ExportJob). `roles` are the roles that
+# may request the export as a background job from the Exports page; exports
+# with no roles are only available from their download views.
+# =============================================================================
+
+EXPORTS = {
+    'cost_sharing': {
+        'label': 'All agreements with totals',
+        'filename': 'cost_sharing_report.csv',
+        'columns': COST_SHARING_REPORT_COLUMNS,
+        'rows': cost_sharing_report_rows,
+        'roles': ['admin', 'cost_sharing_officer', 'inland_revenue_officer'],
+    },
+    'payments': {
+        'label': 'All payments',
+        'filename': 'payments_report.csv',
+        'columns': PAYMENTS_REPORT_COLUMNS,
+        'rows': payments_report_rows,
+        'roles': ['admin', 'cost_sharing_officer', 'inland_revenue_officer'],
+    },
+    'payment_data': {
+        'label': 'Payment data (detailed)',
+        'filename': 'payment_data.csv',
+        'columns': PAYMENT_DATA_COLUMNS,
+        'rows': payment_data_rows,
+        'roles': ['admin', 'inland_revenue_officer'],
+    },
+    'student_information': {
+        'label': 'Student information',
+        'filename': 'student_information.csv',
+        'columns': STUDENT_INFORMATION_COLUMNS,
+        'rows': student_information_rows,
+        'roles': ['admin', 'inland_revenue_officer'],
+    },
+    'student_report': {
+        'label': 'Accepted agreements report',
+        'filename': 'student_cost_sharing_report.csv',
+        'columns': STUDENT_REPORT_COLUMNS,
+        'rows': student_report_rows,
+        'roles': ['admin', 'cost_sharing_officer'],
+    },
+    'completed_student_data': {
+        'label': 'Students with completed payments',
+        'filename': 'completed_student_data.csv',
+        'columns': COMPLETED_STUDENT_DATA_COLUMNS,
+        'rows': completed_student_data_rows,
+        'roles': ['admin', 'cost_sharing_officer'],
+    },
+    'student_data': {
+        'label': 'Uploaded student data',
+        'filename': 'student_data.csv',
+        'columns': STUDENT_DATA_COLUMNS,
+        'rows': student_data_rows,
+        'roles': ['admin', 'registrar_officer'],
+    },
+    'students': {
+        'label': 'Student accounts',
+        'filename': 'students.csv',
+        'columns': STUDENTS_COLUMNS,
+        'rows': students_rows,
+        'roles': ['admin'],
+    },
+    'paid_students': {
+        'label': 'Students who made payments',
+        'filename': 'paid_students.csv',
+        'columns': PAID_STUDENTS_COLUMNS,
+        'rows': paid_students_rows,
+        'roles': ['admin'],
+    },
+    'students_without_agreements': {
+        'label': 'Students without agreements',
+        'filename': 'students_without_agreements.csv',
+        'columns': STUDENTS_WITHOUT_AGREEMENTS_COLUMNS,
+        'rows': None,  # needs the filtered queryset from the view
+        'roles': [],
+    },
+}
+
+
+def exports_for_role(role):
+    """Return [(export_type, definition)] the given role may request."""
+    return [(key, export) for key, export in EXPORTS.items() if role in export['roles']]
+
+
+def export_dir():
+    """Absolute path of the directory export artifacts are written to (MEDIA_ROOT/exports)."""
+    path = os.path.join(settings.MEDIA_ROOT, 'exports')
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -1,3 +1,4 @@
+import logging
 import os
 from django import forms
 import re
@@ -14,9 +15,12 @@ from .models import (
     Feedback,
     StudentData,
     BankAccount,
+    reference_key,
 )
+from .log import debug_enabled
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 class CustomUserCreationForm(UserCreationForm):
     class Meta:
@@ -488,15 +492,15 @@ class StudentPaymentForm(forms.ModelForm):
         self.user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         
-        print(f"=== DEBUG: Initializing form for user: {self.user.username if self.user else 'None'}")
-        
         if self.user:
             # Get accepted agreements for this user
             accepted_agreements = CostSharingAgreement.objects.filter(
                 student=self.user,
-                status='accepted'
+                status=CostSharingAgreement.Status.ACCEPTED
             )
-            print(f"=== DEBUG: Found {accepted_agreements.count()} accepted agreements")
+            if debug_enabled(logger):
+                logger.debug('Payment form for user %s: %s accepted agreements',
+                             self.user.username, accepted_agreements.count())
             
             self.fields['agreement'].queryset = accepted_agreements
             
@@ -508,13 +512,12 @@ class StudentPaymentForm(forms.ModelForm):
     
     def clean(self):
         cleaned_data = super().clean()
-        print("=== DEBUG: Form clean method called")
         
         # Check if user has accepted agreements
         if self.user:
             accepted_agreements = CostSharingAgreement.objects.filter(
                 student=self.user, 
-                status='accepted'
+                status=CostSharingAgreement.Status.ACCEPTED
             )
             if not accepted_agreements.exists():
                 raise forms.ValidationError(
@@ -788,4 +791,18 @@ class CostStructureForm(forms.ModelForm):
             'food_cost': 'Food Cost ($)',
             'dormitory_cost': 'Dormitory Cost ($)',
         }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # The unique constraint is on the department FK, which is not a form
+        # field: match departments by reference_key() like the lookups do
+        department = cleaned_data.get('department')
+        year = cleaned_data.get('year')
+        if department and year:
+            duplicates = CostStructure.objects.filter(
+                department_ref__key=reference_key(department), year=year
+            ).exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise forms.ValidationError(f'A cost structure for {department} year {year} already exists.')
+        return cleaned_data
         
\ No newline at end of file
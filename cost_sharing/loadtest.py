@@ -0,0 +1,605 @@
+# cost_sharing/loadtest.py
+"""
+Role-based load tests against a running server.
+
+run_load_test() starts virtual users (threads) that drive a server on
+localhost (runserver or gunicorn) over HTTP the way the four roles do at the
+start of a semester:
+
+    student     logs in, opens the dashboard, polls check_new_notifications,
+                files a cost sharing agreement (fill_cost_sharing, with a
+                receipt upload) or makes a payment (make_payment), looks at
+                the payment history and logs out; then the next student
+    registrar   dashboard (and its sections), notifications, students
+                without agreements
+    cost        dashboard (and its sections), assigned students, approves
+                pending agreements
+    inland      dashboard, payment status, verifies pending payments
+
+Every request is timed and recorded under its endpoint (method and URL name).
+The report gives, per endpoint: requests, errors, throughput and p50/p95/p99
+latency, plus lock errors: responses that failed with "database is locked"
+(or a deadlock/lock timeout) and, read from /metrics before and after the
+run, the ocsms_db_lock_errors_total counter of the server itself.
+
+The users and the agreements/payments to work on are read from the database
+before the run, so the command must use the same database as the server.
+The run writes to it (and uploads receipts to MEDIA_ROOT): run it against a
+generated dataset (cost_sharing/dataset.py), never against real data.
+"""
+import html
+import http.cookiejar
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Subquery, Sum
+from django.urls import Resolver404, resolve, reverse
+
+from .dataset import USERNAME_PREFIX
+from .metrics import LOCK_ERROR_MESSAGES
+from .models import CostSharingAgreement, Payment, User, with_total_cost
+
+DEFAULT_URL = 'http://127.0.0.1:8000'
+DEFAULT_DURATION = 60
+DEFAULT_RAMP_UP = 10
+DEFAULT_THINK_TIME = 1.0
+DEFAULT_TIMEOUT = 60
+PROGRESS_INTERVAL = 5
+DEFAULT_USERS = {
+    'student': 20,
+    'registrar_officer': 1,
+    'cost_sharing_officer': 2,
+    'inland_revenue_officer': 2,
+}
+
+# What a student session does (shares of sessions). Filing and paying fall
+# back to browsing once no student is left to file or pay.
+STUDENT_MIX = (('file', 0.45), ('pay', 0.35), ('browse', 0.2))
+STUDENT_POOLS = {'file': 'filers', 'pay': 'payers'}
+# check_new_notifications polls per student session (the notification bell)
+NOTIFICATION_POLLS = 3
+# Filers, payers, pending agreements and pending payments read per pool
+POOL_SIZE = 5000
+PAYMENT_AMOUNT = Decimal('500')
+PAID_STATUSES = ('partial', 'verified', 'completed')
+# Smallest file the receipt field accepts (it checks the extension only)
+RECEIPT = b'%PDF-1.4\n1 0 obj << >> endobj\ntrailer << >>\n%%EOF\n'
+
+CSRF_FIELD_PATTERN = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+# Sections the registrar and cost officer dashboards load after the page (views.dashboard_partial)
+PARTIAL_URL_PATTERN = re.compile(r'data-partial-url="([^"]+)"')
+
+
+class Stop(Exception):
+    """The run is over."""
+
+
+class LoginFailed(Exception):
+    pass
+
+
+# --- Targets -----------------------------------------------------------------
+
+def generated_users(role):
+    return (User.objects.filter(role=role, is_active=True, username__startswith=USERNAME_PREFIX)
+            .order_by('id'))
+
+
+def filers(limit=POOL_SIZE):
+    """Students allowed to file an agreement now: none pending or accepted for their year of study."""
+    blocking = (CostSharingAgreement.objects.filter(student=OuterRef('pk'), year=OuterRef('year_of_study'))
+                .exclude(status=CostSharingAgreement.Status.REJECTED))
+    students = (generated_users('student')
+                .filter(year_of_study__range=(1, 6), department__gt='')
+                .exclude(Exists(blocking)))
+    return list(students.values('username', 'first_name', 'last_name', 'department', 'year_of_study')[:limit])
+
+
+def payers(limit=POOL_SIZE):
+    """
+    Usernames of students make_payment accepts PAYMENT_AMOUNT from: their
+    latest accepted agreement is a graduate one with at least that much left
+    to pay, and their virtual balance covers it.
+    """
+    latest = (CostSharingAgreement.objects
+              .filter(student=OuterRef('pk'), status=CostSharingAgreement.Status.ACCEPTED)
+              .order_by('-date_filled', '-id').values('id')[:1])
+    candidates = dict(
+        generated_users('student')
+        .filter(studentdata__virtual_balance__gte=PAYMENT_AMOUNT)
+        .annotate(agreement_id=Subquery(latest)).filter(agreement_id__isnull=False)
+        .values_list('agreement_id', 'username')[:limit * 2]
+    )
+    agreements = with_total_cost(CostSharingAgreement.objects.filter(id__in=candidates, is_graduate=True))
+    paid = dict(
+        Payment.objects.filter(agreement__in=candidates, status__in=PAID_STATUSES)
+        .values('agreement').annotate(total=Sum('amount_paid')).order_by().values_list('agreement', 'total')
+    )
+    usernames = [
+        candidates[agreement.id] for agreement in agreements
+        if Decimal(agreement.total_cost or 0) - (paid.get(agreement.id) or 0) >= PAYMENT_AMOUNT
+    ]
+    return sorted(usernames)[:limit]
+
+
+def prepare_targets(limit=POOL_SIZE):
+    """Users per role and the work queues of the run."""
+    return {
+        'users': {role: list(generated_users(role).values_list('username', flat=True)[:limit])
+                  for role in DEFAULT_USERS},
+        'filers': filers(limit),
+        'payers': payers(limit),
+        'agreements': list(
+            CostSharingAgreement.objects.filter(status=CostSharingAgreement.Status.PENDING,
+                                                student__username__startswith=USERNAME_PREFIX)
+            .order_by('date_filled', 'id').values_list('id', flat=True)[:limit]
+        ),
+        'payments': list(
+            Payment.objects.filter(status='pending', payer__username__startswith=USERNAME_PREFIX)
+            .order_by('date_paid', 'id').values_list('id', flat=True)[:limit]
+        ),
+    }
+
+
+class Pool:
+    """Work items handed out once each, across threads."""
+
+    def __init__(self, items):
+        self._items = list(items)
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            return self._items.pop(0) if self._items else None
+
+    def __len__(self):
+        return len(self._items)
+
+
+# --- Recording ---------------------------------------------------------------
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Recorder:
+    """Latencies and outcomes per endpoint, shared by all virtual users."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = Counter()
+        self.lock_errors = Counter()
+        self.statuses = {}
+
+    def record(self, endpoint, seconds, status, ok, lock_error=False):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            self.statuses.setdefault(endpoint, Counter())[str(status)] += 1
+            if not ok:
+                self.errors[endpoint] += 1
+            if lock_error:
+                self.lock_errors[endpoint] += 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        with self._lock:
+            for endpoint, latencies in sorted(self.latencies.items()):
+                ordered = sorted(latencies)
+                endpoints[endpoint] = {
+                    'requests': len(ordered),
+                    'errors': self.errors[endpoint],
+                    'lock_errors': self.lock_errors[endpoint],
+                    'throughput': round(len(ordered) / elapsed, 2) if elapsed else None,
+                    'p50_ms': round(percentile(ordered, 0.50) * 1000, 1),
+                    'p95_ms': round(percentile(ordered, 0.95) * 1000, 1),
+                    'p99_ms': round(percentile(ordered, 0.99) * 1000, 1),
+                    'max_ms': round(ordered[-1] * 1000, 1),
+                    'statuses': dict(self.statuses[endpoint]),
+                }
+        return endpoints
+
+
+def is_lock_message(text):
+    text = text.lower()
+    return any(message in text for message in LOCK_ERROR_MESSAGES)
+
+
+# --- HTTP --------------------------------------------------------------------
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Hand redirects back to the caller, which times and follows them itself."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def endpoint_name(path):
+    try:
+        return resolve(urllib.parse.urlsplit(path).path).url_name or 'unnamed'
+    except Resolver404:
+        return 'unmatched'
+
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content, content_type) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {content_type}\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Response:
+    def __init__(self, endpoint, status, body, location, seconds, ok, lock_error):
+        self.endpoint = endpoint
+        self.status = status
+        self.body = body
+        self.location = location
+        self.seconds = seconds
+        self.ok = ok
+        self.lock_error = lock_error
+
+    def record(self, recorder):
+        recorder.record(self.endpoint, self.seconds, self.status, self.ok, self.lock_error)
+
+
+class Session:
+    """One browser: its own cookies (session and CSRF), no automatic redirects."""
+
+    def __init__(self, base_url, recorder, timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+        self.form_token = None
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        return self.form_token
+
+    def request(self, method, path, data=None, files=None, endpoint=None, expect=None, record=True):
+        """
+        Send one request and record it under `endpoint` (default: method and
+        URL name). A redirect counts as an error if `expect` is given and the
+        redirect goes elsewhere (the views redirect back to the form on failure).
+        """
+        endpoint = endpoint or f'{method} {endpoint_name(path)}'
+        headers = {'Referer': self.base_url + path}
+        body = None
+        if method == 'POST':
+            headers['X-CSRFToken'] = self.csrf_token() or ''
+            if files:
+                body, headers['Content-Type'] = multipart(data or {}, files)
+            else:
+                body = urllib.parse.urlencode(data or {}).encode()
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as raw:
+                status, location, content = raw.status, None, raw.read()
+        except urllib.error.HTTPError as e:
+            status, location, content = e.code, e.headers.get('Location'), e.read()
+        except (urllib.error.URLError, OSError) as e:
+            self.recorder.record(endpoint, time.perf_counter() - start, type(e).__name__, ok=False)
+            return None
+        seconds = time.perf_counter() - start
+
+        text = content.decode('utf-8', 'replace')
+        match = CSRF_FIELD_PATTERN.search(text)
+        if match:
+            self.form_token = match.group(1)
+        if location:
+            location = urllib.parse.urlsplit(location).path
+        ok = status < 400 and (expect is None or location == expect)
+        response = Response(endpoint, status, text, location, seconds, ok, status >= 500 and is_lock_message(text))
+        if record:
+            response.record(self.recorder)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, data=None, files=None, **kwargs):
+        response = self.request('POST', path, data, files, record=False, **kwargs)
+        if response is None:
+            return None
+        # Like a browser, load the page redirected to: views that catch a
+        # failed write report it there as a message, with the database error.
+        if response.location:
+            page = self.get(response.location)
+            if page and page.status < 500 and is_lock_message(page.body):
+                response.ok, response.lock_error = False, True
+        response.record(self.recorder)
+        return response
+
+
+# --- Virtual users -----------------------------------------------------------
+
+class VirtualUser:
+    def __init__(self, run, role, number):
+        self.run = run
+        self.role = role
+        self.rng = random.Random(f'{run.seed}-{role}-{number}')
+        self.session = None
+
+    def pause(self, factor=1.0):
+        """Think for a while; raises Stop once the run is over."""
+        delay = self.run.think_time * factor * self.rng.uniform(0.5, 1.5)
+        if self.run.stopping.wait(max(0.0, min(delay, self.run.deadline - time.monotonic()))):
+            raise Stop
+        if time.monotonic() >= self.run.deadline:
+            raise Stop
+
+    def login(self, username):
+        session = Session(self.run.base_url, self.run.recorder, self.run.timeout)
+        login = reverse('login')
+        session.get(login)
+        response = session.request('POST', login, {'username': username, 'password': self.run.password},
+                                   expect=reverse('dashboard'))
+        if response is None or response.location != reverse('dashboard'):
+            raise LoginFailed(username)
+        self.session = session
+
+    def logout(self):
+        self.session.get(reverse('logout'))
+
+    def loop(self):
+        script = SCRIPTS[self.role]
+        while not self.run.stopping.is_set() and time.monotonic() < self.run.deadline:
+            try:
+                script(self)
+            except Stop:
+                return
+            except LoginFailed:
+                self.run.failed_logins.append(self.role)
+                if self.run.stopping.wait(self.run.think_time):
+                    return
+
+
+def open_dashboard(session):
+    """The dashboard, then each section it loads afterwards, as the browser does."""
+    page = session.get(reverse('dashboard'))
+    if page is None:
+        return
+    for url in PARTIAL_URL_PATTERN.findall(page.body):
+        url = html.unescape(url)
+        section = resolve(urllib.parse.urlsplit(url).path).kwargs.get('section')
+        session.get(url, endpoint=f'GET dashboard_partial {section}')
+
+
+def student(vu):
+    """One student session: file, pay or just look around, then log out."""
+    kind = vu.rng.choices([kind for kind, _ in STUDENT_MIX], [share for _, share in STUDENT_MIX])[0]
+    target = vu.run.pools[STUDENT_POOLS[kind]].take() if kind in STUDENT_POOLS else None
+    if target is None:
+        kind, target = 'browse', vu.rng.choice(vu.run.targets['users']['student'])
+    vu.login(target['username'] if kind == 'file' else target)
+    session = vu.session
+
+    open_dashboard(session)
+    vu.pause()
+    session.get(reverse('check_new_notifications'))
+    vu.pause()
+    if kind == 'file':
+        session.get(reverse('fill_cost_sharing'))
+        vu.pause(3)
+        session.post(reverse('fill_cost_sharing'), filing_form(target, vu.rng),
+                     files={'receipt': ('loadtest-receipt.pdf', RECEIPT, 'application/pdf')}, expect=reverse('dashboard'))
+    elif kind == 'pay':
+        session.get(reverse('make_payment'))
+        vu.pause(2)
+        session.post(reverse('make_payment'), {'amount_paid': str(PAYMENT_AMOUNT)},
+                     expect=reverse('payment_history'))
+    else:
+        session.get(reverse('payment_history'))
+    for _ in range(NOTIFICATION_POLLS):
+        vu.pause()
+        session.get(reverse('check_new_notifications'))
+    vu.logout()
+
+
+def filing_form(student, rng):
+    today = date.today()
+    year_of_study = student['year_of_study']
+    name = f"{student['first_name']} {student['last_name']}".strip()
+    return {
+        'academic_year': today.year,
+        'full_name': name or student['username'],
+        'sex': rng.choice('MF'),
+        'date_of_birth': date(today.year - 18 - year_of_study, rng.randint(1, 12), rng.randint(1, 28)).isoformat(),
+        'place_of_birth': 'Addis Ababa',
+        'mother_name': 'Load Test',
+        'mother_phone': f'09{rng.randrange(10 ** 8):08d}',
+        'mother_address': 'Addis Ababa',
+        'preparatory_school': 'Load Test Preparatory',
+        'high_school_completion_date': date(today.year - year_of_study, 7, 1).isoformat(),
+        'university_name': 'Load Test University',
+        'faculty': 'Load Test',
+        'service_type': 'in_kind',
+        'food_service': 'on',
+        'dormitory_service': 'on',
+        'education_service': 'on',
+        'phone_number': f'09{rng.randrange(10 ** 8):08d}',
+        'year_of_entrance': today.year - year_of_study,
+    }
+
+
+class Officer:
+    """An officer logs in once, then goes through `steps` over and over."""
+
+    def __init__(self, *steps):
+        self.steps = steps
+
+    def __call__(self, vu):
+        if vu.session is None:
+            vu.login(vu.rng.choice(vu.run.targets['users'][vu.role]))
+        open_dashboard(vu.session)
+        for step in self.steps:
+            vu.pause()
+            step(vu)
+
+
+def registrar_students(vu):
+    vu.session.get(reverse('students_without_agreements'))
+
+
+def notifications(vu):
+    vu.session.get(reverse('check_new_notifications'))
+    vu.session.get(reverse('notifications'))
+
+
+def review_agreement(vu):
+    vu.session.get(reverse('cost_officer_assigned_list'))
+    pk = vu.run.pools['agreements'].take()
+    if pk is None:
+        return
+    vu.session.get(reverse('cost_officer_agreement_detail', args=[pk]), endpoint='GET cost_officer_agreement_detail')
+    vu.pause(2)
+    vu.session.post(reverse('agreement_set_status', args=[pk, 'accept']), endpoint='POST agreement_set_status',
+                    expect=reverse('dashboard'))
+
+
+def verify_payment(vu):
+    vu.session.get(reverse('view_payment_status'))
+    pk = vu.run.pools['payments'].take()
+    if pk is None:
+        return
+    vu.session.get(reverse('verify_payment', args=[pk]), endpoint='GET verify_payment')
+    vu.pause(2)
+    vu.session.post(reverse('verify_payment', args=[pk]), {'status': 'verified', 'notes': 'Load test'},
+                    endpoint='POST verify_payment', expect=reverse('manage_payments'))
+
+
+SCRIPTS = {
+    'student': student,
+    'registrar_officer': Officer(notifications, registrar_students),
+    'cost_sharing_officer': Officer(notifications, review_agreement),
+    'inland_revenue_officer': Officer(notifications, verify_payment),
+}
+
+
+# --- Runs --------------------------------------------------------------------
+
+def server_lock_errors(base_url, timeout=10):
+    """ocsms_db_lock_errors_total per view from the server's /metrics, or None if unreadable."""
+    headers = {}
+    if getattr(settings, 'METRICS_TOKEN', ''):
+        headers['Authorization'] = f'Bearer {settings.METRICS_TOKEN}'
+    request = urllib.request.Request(base_url.rstrip('/') + reverse('metrics'), headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            text = response.read().decode()
+    except (urllib.error.URLError, OSError):
+        return None
+    counts = {}
+    for match in re.finditer(r'^ocsms_db_lock_errors_total\{view="([^"]*)"\} (\d+)', text, re.MULTILINE):
+        counts[match.group(1)] = int(match.group(2))
+    return counts
+
+
+class LoadTest:
+    def __init__(self, base_url, users, duration, ramp_up, think_time, password, timeout, seed, targets):
+        self.base_url = base_url
+        self.users = users
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.think_time = think_time
+        self.password = password
+        self.timeout = timeout
+        self.seed = seed
+        self.targets = targets
+        self.recorder = Recorder()
+        self.stopping = threading.Event()
+        self.failed_logins = []
+        self.pools = {name: Pool(targets[name]) for name in ('filers', 'payers', 'agreements', 'payments')}
+        self.deadline = None
+
+    def run(self, progress=None):
+        virtual_users = [VirtualUser(self, role, n) for role, count in self.users.items()
+                         if self.targets['users'].get(role) for n in range(count)]
+        random.Random(self.seed).shuffle(virtual_users)
+        start = time.monotonic()
+        self.deadline = start + self.duration
+        threads = []
+        try:
+            for i, vu in enumerate(virtual_users):
+                # Users join evenly over the ramp-up
+                delay = start + self.ramp_up * i / len(virtual_users) - time.monotonic()
+                if delay > 0 and self.stopping.wait(delay):
+                    break
+                thread = threading.Thread(target=vu.loop, name=f'loadtest-{vu.role}-{i}', daemon=True)
+                thread.start()
+                threads.append(thread)
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(PROGRESS_INTERVAL)
+                if progress:
+                    progress(time.monotonic() - start, self.recorder)
+        except KeyboardInterrupt:
+            self.stopping.set()
+            for thread in threads:
+                thread.join(self.timeout)
+        return time.monotonic() - start
+
+
+def run_load_test(base_url=DEFAULT_URL, users=None, duration=DEFAULT_DURATION, ramp_up=DEFAULT_RAMP_UP,
+                  think_time=DEFAULT_THINK_TIME, password='password', timeout=DEFAULT_TIMEOUT, seed=0,
+                  targets=None, progress=None):
+    """Run the load test and return its report (see the module docstring)."""
+    users = {**DEFAULT_USERS, **(users or {})}
+    targets = targets or prepare_targets()
+    test = LoadTest(base_url, users, duration, ramp_up, think_time, password, timeout, seed, targets)
+
+    locks_before = server_lock_errors(base_url)
+    elapsed = test.run(progress)
+    locks_after = server_lock_errors(base_url)
+
+    server_locks = None
+    if locks_before is not None and locks_after is not None:
+        server_locks = {view: count - locks_before.get(view, 0) for view, count in locks_after.items()
+                        if count > locks_before.get(view, 0)}
+    endpoints = test.recorder.report(elapsed)
+    return {
+        'url': base_url,
+        'users': users,
+        'duration_s': round(elapsed, 1),
+        'think_time_s': think_time,
+        'requests': sum(e['requests'] for e in endpoints.values()),
+        'errors': sum(e['errors'] for e in endpoints.values()),
+        'failed_logins': dict(Counter(test.failed_logins)),
+        # Work left when the run ended: a pool that ran dry means later
+        # sessions only browsed
+        'left': {name: len(pool) for name, pool in test.pools.items()},
+        'endpoints': endpoints,
+        'server_lock_errors': server_locks,
+    }
+
+
+def save_report(report, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=1))
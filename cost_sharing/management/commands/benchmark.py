@@ -0,0 +1,120 @@
+import argparse
+import subprocess
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cost_sharing.benchmark import (
+    DEFAULT_REPEAT, SLOW_REQUEST_SECONDS, baseline_file, benchmark_dir, compare, dataset_path, environment,
+    load_results, manage_py, prepare_dataset, run_benchmarks, save_results, scale_label, select_cases,
+)
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the main views and CSV exports (time, queries, peak memory) against generated datasets "
+            "and compare the results with a stored baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default=None,
+                            help='Comma-separated dataset scales, e.g. 1,10,100 (1 = 1000 students). '
+                                 'Without it, the configured database is benchmarked as it is.')
+        parser.add_argument('--seed', type=int, default=1, help='Seed of the generated datasets.')
+        parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Timed requests per case.')
+        parser.add_argument('--slow', type=float, default=SLOW_REQUEST_SECONDS,
+                            help='Seconds after which a case is measured once instead of repeated.')
+        parser.add_argument('--case', action='append', dest='cases', default=None,
+                            help='Only cases whose name starts with this (repeatable), e.g. dashboard: or csv:')
+        parser.add_argument('--output', default=None, help='Results file (default: bench/results.json).')
+        parser.add_argument('--baseline', default=None, help='Baseline file (default: benchmarks/baseline.json).')
+        parser.add_argument('--save-baseline', action='store_true', help='Store these results as the baseline.')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error if any case regressed against the baseline.')
+        parser.add_argument('--label', default='current', help='Name of the run when benchmarking the configured database.')
+        parser.add_argument('--no-compare', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1.')
+        cases = select_cases(options['cases'])
+        if not cases:
+            raise CommandError(f"No case matches {', '.join(options['cases'])}.")
+        output = Path(options['output'] or benchmark_dir() / 'results.json')
+        baseline_path = Path(options['baseline'] or baseline_file())
+
+        results = {**environment(), 'runs': {}}
+        if options['scales']:
+            for scale in self._scales(options['scales']):
+                results['runs'][scale_label(scale)] = self._run_scale(scale, options)
+        else:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Benchmarking {options['label']}:"))
+            results['runs'][options['label']] = run_benchmarks(
+                options['label'], cases, options['repeat'], options['slow'], progress=self._progress)
+        save_results(results, output)
+        if options['no_compare']:
+            return
+        self.stdout.write(f"Results written to {output}")
+
+        baseline = load_results(baseline_path)
+        if options['save_baseline']:
+            save_results(results, baseline_path)
+            self.stdout.write(self.style.SUCCESS(f"Saved as the baseline ({baseline_path})"))
+        elif baseline is None:
+            self.stdout.write(f"No baseline at {baseline_path}; run with --save-baseline to store one.")
+        else:
+            self._report(compare(results, baseline), baseline, options['fail_on_regression'])
+
+    def _scales(self, value):
+        try:
+            return [float(scale) for scale in value.split(',') if scale.strip()]
+        except ValueError:
+            raise CommandError(f'--scales must be comma-separated numbers, not {value!r}.')
+
+    def _run_scale(self, scale, options):
+        """Benchmark one dataset in a subprocess pointed at it, and return its run."""
+        label = scale_label(scale)
+        if not dataset_path(scale, options['seed']).exists():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Generating the {label} dataset:"))
+        try:
+            path = prepare_dataset(scale, options['seed'])
+            with tempfile.TemporaryDirectory() as directory:
+                partial = Path(directory) / 'run.json'
+                arguments = ['benchmark', '--label', label, '--repeat', str(options['repeat']),
+                             '--slow', str(options['slow']), '--output', str(partial), '--no-compare']
+                for case in options['cases'] or []:
+                    arguments += ['--case', case]
+                manage_py(*arguments, database_path=path)
+                return load_results(partial)['runs'][label]
+        except subprocess.CalledProcessError as e:
+            raise CommandError(f"Benchmarking {label} failed (exit status {e.returncode}).")
+
+    def _progress(self, case, result):
+        if 'skipped' in result:
+            self.stdout.write(self.style.WARNING(f"  {case.name}: skipped, {result['skipped']}"))
+        elif 'error' in result:
+            self.stdout.write(self.style.ERROR(f"  {case.name}: {result['error']}"))
+        else:
+            line = f"  {case.name:<45} {result['median_ms']:>9.1f} ms {result['queries']:>7} queries "
+            if result.get('slow'):
+                line += ' (slow: measured once)'
+            else:
+                line += f"{result['peak_memory_kb']:>9.0f} KB peak"
+            if result['status'] != 200:
+                self.stdout.write(self.style.WARNING(f"{line}  HTTP {result['status']}"))
+            else:
+                self.stdout.write(line)
+
+    def _report(self, changes, baseline, fail):
+        self.stdout.write(f"Compared with the baseline from {baseline.get('created_at', '?')[:19]} "
+                          f"(commit {baseline.get('commit') or '?'}):")
+        if not changes:
+            self.stdout.write(self.style.SUCCESS('  No changes beyond the tolerances.'))
+            return
+        for change in changes:
+            line = (f"  {change['run']} {change['case']} {change['metric']}: "
+                    f"{change['baseline']} -> {change['current']}")
+            style = self.style.ERROR if change['verdict'] == 'regression' else self.style.SUCCESS
+            self.stdout.write(style(f"{line} ({change['verdict']})"))
+        regressions = sum(1 for change in changes if change['verdict'] == 'regression')
+        if regressions and fail:
+            raise CommandError(f'{regressions} regression(s) against the baseline.')
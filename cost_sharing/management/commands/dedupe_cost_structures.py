@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from cost_sharing.backup import backup_root, format_timestamp, now
+from cost_sharing.cost_structures import duplicate_groups, remove_duplicates
+
+
+class Command(BaseCommand):
+    help = ("List cost structures sharing a department (ignoring case and spacing) and year. With --apply, keep the most recently updated "
+            "of each group and delete the others, saving them to a fixture first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apply', action='store_true', help='Delete the duplicates (default: report only).')
+        parser.add_argument('--fixture', default=None,
+                            help='Where to save the deleted rows (default: backups/cost-structure-duplicates-<time>.json).')
+
+    def handle(self, *args, **options):
+        groups = duplicate_groups()
+        if not groups:
+            self.stdout.write(self.style.SUCCESS('No duplicate cost structures.'))
+            return
+
+        for rows in groups:
+            kept, *others = rows
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{kept.department!r} year {kept.year}"))
+            for structure in rows:
+                verdict = 'keep' if structure is kept else 'delete'
+                self.stdout.write(
+                    f"  {verdict:<6} id={structure.pk} department={structure.department!r} "
+                    f"total={structure.total_cost} updated={structure.updated_at:%Y-%m-%d %H:%M}"
+                )
+
+        if not options['apply']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(groups)} group(s) of duplicates. Review them and rerun with --apply to keep the rows marked 'keep'."
+            ))
+            return
+
+        fixture = Path(options['fixture'] or backup_root() / f"cost-structure-duplicates-{format_timestamp(now())}.json")
+        deleted = remove_duplicates(groups, fixture)
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {len(deleted)} duplicate(s); saved to {fixture} (restore with manage.py loaddata)."
+        ))
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from cost_sharing.query_plans import HOT_QUERIES, explain_hot_queries, unused_indexes
+
+
+def full_scan_lines(plan):
+    """Plan lines that read a whole table (SQLite 'SCAN t' without an index, PostgreSQL 'Seq Scan')."""
+    lines = []
+    for line in plan.splitlines():
+        if 'Seq Scan' in line:
+            lines.append(line.strip())
+        elif 'SCAN ' in line and 'USING' not in line and 'VIRTUAL TABLE' not in line:
+            lines.append(line.strip())
+    return lines
+
+
+class Command(BaseCommand):
+    help = "Print the query plan of every registered hot query and flag full table scans and unused expected indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Only explain these queries.')
+        parser.add_argument('--sql', action='store_true', help='Also print the SQL of each query.')
+        parser.add_argument('--analyze', action='store_true', help='Run ANALYZE first so the planner has table statistics.')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit with an error if any query scans a whole table or skips its expected index.')
+
+    def handle(self, *args, **options):
+        known = {entry['name'] for entry in HOT_QUERIES}
+        unknown = set(options['names']) - known
+        if unknown:
+            raise CommandError(f"Unknown queries: {', '.join(sorted(unknown))}. Known: {', '.join(sorted(known))}")
+
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        scanning = []
+        off_index = []
+        for entry, sql, plan in explain_hot_queries(options['names']):
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{entry['name']}  (expects index on {entry['expected_index']})"))
+            if entry['description']:
+                self.stdout.write(f"  {entry['description']}")
+            if options['sql']:
+                self.stdout.write(f"  SQL: {sql}")
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
+
+            scans = full_scan_lines(plan)
+            if scans:
+                scanning.append(entry['name'])
+                self.stdout.write(self.style.WARNING(f"  Full scan: {'; '.join(scans)}"))
+            missing = unused_indexes(entry, plan)
+            if missing:
+                off_index.append(entry['name'])
+                self.stdout.write(self.style.WARNING(f"  Does not use the expected index: {'; '.join(missing)}"))
+            if not scans and not missing:
+                self.stdout.write(self.style.SUCCESS("  Uses the expected indexes"))
+            self.stdout.write('')
+
+        problems = []
+        if scanning:
+            problems.append(f"{len(scanning)} query(ies) scan a whole table: {', '.join(scanning)}")
+        if off_index:
+            problems.append(f"{len(off_index)} query(ies) skip their expected index: {', '.join(off_index)}")
+        if problems:
+            if options['fail_on_scan']:
+                raise CommandError('; '.join(problems))
+            for message in problems:
+                self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("All hot queries use their expected indexes"))
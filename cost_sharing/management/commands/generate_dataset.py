@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cost_sharing.dataset import (
+    DEFAULT_CHUNK_SIZE, NOTIFICATIONS_PER_STUDENT, STUDENTS_PER_SCALE, DatasetError, generate_dataset,
+)
+
+
+class Command(BaseCommand):
+    help = ("Fill a freshly migrated database with a reproducible synthetic dataset "
+            f"({STUDENTS_PER_SCALE} students per unit of --scale) for benchmarks and load tests.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help=f'Dataset size; 1.0 is {STUDENTS_PER_SCALE} students, 100 is 100k.')
+        parser.add_argument('--students', type=int, default=None, help='Exact number of students (overrides --scale).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Students written per transaction.')
+        parser.add_argument('--notifications', type=int, default=NOTIFICATIONS_PER_STUDENT,
+                            help='Average notifications per student.')
+        parser.add_argument('--password', default='password', help='Password of every generated user.')
+        parser.add_argument('--database', default='default', help='DATABASES alias to fill.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        start = time.perf_counter()
+        try:
+            counts = generate_dataset(
+                scale=options['scale'], students=options['students'], seed=options['seed'],
+                chunk_size=options['chunk_size'], notifications_per_student=options['notifications'],
+                password=options['password'], using=options['database'], progress=self._progress,
+            )
+        except DatasetError as e:
+            raise CommandError(str(e))
+        for name, count in counts.items():
+            self.stdout.write(f"  {name}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {sum(counts.values())} row(s) in {time.perf_counter() - start:.1f}s "
+            f"(log in as gen-s0000001, gen-cost0001, gen-registrar0001, gen-inland0001 or gen-admin0001)"
+        ))
+
+    def _progress(self, message):
+        self.stdout.write(f"  {message}")
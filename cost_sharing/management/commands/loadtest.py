@@ -0,0 +1,96 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cost_sharing.loadtest import (
+    DEFAULT_DURATION, DEFAULT_RAMP_UP, DEFAULT_THINK_TIME, DEFAULT_TIMEOUT, DEFAULT_URL, DEFAULT_USERS,
+    prepare_targets, run_load_test, save_report,
+)
+
+
+class Command(BaseCommand):
+    help = ("Load-test a running server with scripted student, registrar, cost officer and inland officer "
+            "sessions, and report throughput, latency percentiles and lock errors per endpoint.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=DEFAULT_URL, help='Server to test.')
+        parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help='Seconds to run.')
+        parser.add_argument('--ramp-up', type=float, default=DEFAULT_RAMP_UP,
+                            help='Seconds over which the virtual users start.')
+        parser.add_argument('--students', type=int, default=DEFAULT_USERS['student'],
+                            help='Concurrent student sessions.')
+        parser.add_argument('--registrars', type=int, default=DEFAULT_USERS['registrar_officer'])
+        parser.add_argument('--cost-officers', type=int, default=DEFAULT_USERS['cost_sharing_officer'])
+        parser.add_argument('--inland-officers', type=int, default=DEFAULT_USERS['inland_revenue_officer'])
+        parser.add_argument('--think-time', type=float, default=DEFAULT_THINK_TIME,
+                            help='Average seconds a user waits between requests (0 for none).')
+        parser.add_argument('--password', default='password', help='Password of the generated users.')
+        parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds before a request fails.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=None, help='Also write the report to this JSON file.')
+
+    def handle(self, *args, **options):
+        if options['duration'] <= 0:
+            raise CommandError('--duration must be positive.')
+        users = {
+            'student': options['students'],
+            'registrar_officer': options['registrars'],
+            'cost_sharing_officer': options['cost_officers'],
+            'inland_revenue_officer': options['inland_officers'],
+        }
+        if any(count < 0 for count in users.values()) or not any(users.values()):
+            raise CommandError('Give at least one virtual user, and no negative counts.')
+
+        targets = prepare_targets()
+        missing = [role for role, count in users.items() if count and not targets['users'][role]]
+        if missing:
+            raise CommandError(f"No generated users with role {', '.join(missing)}; "
+                               f"run generate_dataset on the server's database first.")
+        self.stdout.write(
+            f"{len(targets['filers'])} students can file, {len(targets['payers'])} can pay; "
+            f"{len(targets['agreements'])} agreements and {len(targets['payments'])} payments pending."
+        )
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Load-testing {options['url']} for {options['duration']:g}s with "
+            + ', '.join(f'{count} {role}' for role, count in users.items() if count) + ':'
+        ))
+
+        report = run_load_test(
+            options['url'], users, options['duration'], options['ramp_up'], options['think_time'],
+            options['password'], options['timeout'], options['seed'], targets, progress=self._progress,
+        )
+        self._report(report)
+        if options['output']:
+            save_report(report, options['output'])
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def _progress(self, elapsed, recorder):
+        requests = sum(len(latencies) for latencies in recorder.latencies.values())
+        self.stdout.write(f'  {elapsed:5.0f}s  {requests} requests, {sum(recorder.errors.values())} errors')
+
+    def _report(self, report):
+        self.stdout.write(f"\n{report['requests']} requests in {report['duration_s']}s, {report['errors']} errors")
+        self.stdout.write(f"{'endpoint':<42} {'requests':>8} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+                          f"{'p99 ms':>8} {'errors':>6} {'locks':>5}")
+        for endpoint, row in report['endpoints'].items():
+            line = (f"{endpoint:<42} {row['requests']:>8} {row['throughput']:>7} {row['p50_ms']:>8} "
+                    f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['errors']:>6} {row['lock_errors']:>5}")
+            if row['lock_errors']:
+                line = self.style.ERROR(line)
+            elif row['errors']:
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
+
+        empty = [name for name, left in report['left'].items() if not left]
+        if empty:
+            self.stdout.write(self.style.WARNING(
+                f"Ran out of {', '.join(empty)} to work on; generate a larger dataset for longer runs."))
+        if report['failed_logins']:
+            self.stdout.write(self.style.WARNING(
+                'Failed logins: ' + ', '.join(f'{n} {role}' for role, n in report['failed_logins'].items())))
+        server_locks = report['server_lock_errors']
+        if server_locks is None:
+            self.stdout.write(self.style.WARNING("Could not read /metrics: server-side lock errors not counted."))
+        elif server_locks:
+            self.stdout.write(self.style.ERROR(
+                'Lock errors on the server: ' + ', '.join(f'{view} {n}' for view, n in server_locks.items())))
+        else:
+            self.stdout.write(self.style.SUCCESS('No lock errors on the server.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from cost_sharing.export_jobs import process_pending_jobs, run_worker
+
+
+class Command(BaseCommand):
+    help = "Generate queued export jobs into media/exports/ and notify the officers who requested them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new jobs.')
+        parser.add_argument('--interval', type=int, default=5, help='Seconds to sleep between polls when idle (with --loop).')
+        parser.add_argument('--limit', type=int, default=None, help='Process at most this many jobs (without --loop).')
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            self.stdout.write(f"Export worker started (polling every {options['interval']}s)")
+            run_worker(interval=options['interval'])
+            return
+
+        processed = process_pending_jobs(limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} export job(s)"))
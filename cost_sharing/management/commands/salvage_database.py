@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cost_sharing.backup import backup_root, format_timestamp, install_restored, now
+from cost_sharing.salvage import SalvageError, integrity_problems, open_damaged, salvage_database
+
+
+class Command(BaseCommand):
+    help = ("Copy every readable row of a damaged SQLite database into a fresh file and report what was lost. "
+            "The damaged file is only read.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='DATABASES alias to salvage.')
+        parser.add_argument('--source', default=None, help='Damaged file to read (default: the database file).')
+        parser.add_argument('--output', default=None, help='File to write (default: <database>.salvaged-<time>).')
+        parser.add_argument('--schema-from', default=None,
+                            help='Database to copy the schema from when the damaged schema is unreadable '
+                                 '(default: the newest sqlite_backup snapshot).')
+        parser.add_argument('--force', action='store_true', help='Salvage even if integrity_check passes.')
+        parser.add_argument('--replace', action='store_true',
+                            help='Install the salvaged file as the live database. Stop the app first.')
+
+    def handle(self, *args, **options):
+        database = settings.DATABASES[options['database']]
+        if database['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError(f"Database '{options['database']}' is not SQLite.")
+        source = options['source'] or database['NAME']
+        output = options['output'] or f"{database['NAME']}.salvaged-{format_timestamp(now())}"
+
+        if not options['force']:
+            connection = open_damaged(source)
+            try:
+                problems = integrity_problems(connection)
+            finally:
+                connection.close()
+            if not problems:
+                self.stdout.write(self.style.SUCCESS(f"{source} passes integrity_check; nothing to salvage (use --force)."))
+                return
+
+        try:
+            report = salvage_database(source, output, schema_from=options['schema_from'],
+                                      backup_dir=backup_root(), progress=self._progress)
+        except SalvageError as e:
+            raise CommandError(str(e))
+        self._summary(report)
+
+        if options['replace']:
+            previous = install_restored(output, database['NAME'])
+            self.stdout.write(self.style.SUCCESS(f"Installed as {database['NAME']}; damaged file kept as {previous}"))
+
+    def _progress(self, table, report):
+        line = f"  {table}: {report['rows']} row(s)"
+        if report['rejected']:
+            line += f", {report['rejected']} rejected by constraints"
+        if report['errors']:
+            self.stdout.write(self.style.WARNING(line + f", {report['errors']} unreadable stretch(es)"))
+        else:
+            self.stdout.write(line)
+
+    def _summary(self, report):
+        if report['integrity']:
+            self.stdout.write(self.style.MIGRATE_HEADING('integrity_check of the damaged file:'))
+            for message in report['integrity'][:20]:
+                self.stdout.write(f"  {message}")
+            if len(report['integrity']) > 20:
+                self.stdout.write(f"  ... {len(report['integrity']) - 20} more")
+        self.stdout.write(f"Schema taken from {report['schema_source']}")
+
+        lost = [t for t in report['tables'] if t['errors'] or t['rejected'] or t['missing'] or t['index_errors']]
+        if lost:
+            self.stdout.write(self.style.MIGRATE_HEADING('Possibly lost:'))
+        for table in lost:
+            if table.get('failure'):
+                self.stdout.write(self.style.ERROR(f"  {table['table']}: unreadable ({table['failure']})"))
+            for first, last in table['gaps']:
+                if first is None:
+                    continue
+                ids = f"ids {first}-{last}" if last else f"ids from {first} on"
+                self.stdout.write(self.style.WARNING(f"  {table['table']}: {ids}"))
+            if table['missing']:
+                ranges = ', '.join(f'{a}-{b}' if a != b else f'{a}' for a, b in table['missing_ranges'][:10])
+                more = ' ...' if len(table['missing_ranges']) > 10 else ''
+                self.stdout.write(self.style.WARNING(
+                    f"  {table['table']}: {table['missing']} indexed row(s) unreadable (ids {ranges}{more})"
+                ))
+            if table['rejected']:
+                self.stdout.write(self.style.WARNING(
+                    f"  {table['table']}: {table['rejected']} row(s) rejected (duplicate or invalid values)"
+                ))
+            if table['index_errors']:
+                self.stdout.write(self.style.WARNING(
+                    f"  {table['table']}: {table['index_errors']} damaged index(es), losses may be undercounted"
+                ))
+        for kind, name, error in report['skipped_objects']:
+            self.stdout.write(self.style.WARNING(f"  {kind} {name} not recreated: {error}"))
+
+        if report['orphans']:
+            orphans = {}
+            for table, _, parent, _ in report['orphans']:
+                orphans.setdefault((table, parent), 0)
+                orphans[(table, parent)] += 1
+            self.stdout.write(self.style.MIGRATE_HEADING('Rows whose parent row was lost (kept):'))
+            for (table, parent), count in sorted(orphans.items()):
+                self.stdout.write(self.style.WARNING(f"  {table}: {count} row(s) point to missing {parent} rows"))
+
+        total = sum(t['rows'] for t in report['tables'])
+        self.stdout.write(self.style.SUCCESS(f"Salvaged {total} row(s) into {report['output']}"))
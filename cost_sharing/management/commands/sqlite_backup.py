@@ -0,0 +1,120 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cost_sharing.backup import (
+    DEFAULT_CHECKPOINT_BYTES, DEFAULT_PAGES_PER_STEP, BackupError, WalShipper,
+    backup_root, format_timestamp, install_restored, list_generations, now,
+    prune_generations, restore,
+)
+
+
+def parse_until(value):
+    """Accept '2026-10-19 14:05:00', '2026-10-19T14:05:00+03:00', ... (naive = local time)."""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid --until time {value!r}; use ISO format, e.g. 2026-10-19T14:05:00")
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    return moment.astimezone(timezone.utc)
+
+
+class Command(BaseCommand):
+    help = ("Online SQLite backups: take a snapshot, ship WAL segments (continuously with --loop), "
+            "list backups, or restore to a point in time.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['snapshot', 'ship-wal', 'list', 'restore'])
+        parser.add_argument('--database', default='default', help='DATABASES alias to back up.')
+        parser.add_argument('--dir', default=None, help='Backup directory (default: SQLITE_BACKUP_DIR).')
+        parser.add_argument('--pages', type=int, default=DEFAULT_PAGES_PER_STEP,
+                            help='Pages copied per snapshot step.')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between snapshot steps.')
+        parser.add_argument('--keep', type=int, default=None,
+                            help='After a snapshot, keep only this many generations.')
+        parser.add_argument('--loop', action='store_true', help='ship-wal: keep shipping.')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='ship-wal: seconds between shipments with --loop (the restore granularity).')
+        parser.add_argument('--checkpoint-bytes', type=int, default=None,
+                            help='ship-wal: checkpoint the WAL once it reaches this size '
+                                 '(default: SQLITE_WAL_CHECKPOINT_BYTES, 0 to never).')
+        parser.add_argument('--until', default=None, help='restore: point in time to restore to (default: latest).')
+        parser.add_argument('--generation', default=None, help='restore: restore this generation.')
+        parser.add_argument('--output', default=None,
+                            help='restore: file to write (default: <backup dir>/restored-<time>.sqlite3).')
+        parser.add_argument('--replace', action='store_true',
+                            help='restore: install the restored file as the live database. Stop the app first.')
+
+    def handle(self, *args, **options):
+        root = options['dir'] or backup_root()
+        try:
+            getattr(self, f"handle_{options['action'].replace('-', '_')}")(root, options)
+        except BackupError as e:
+            raise CommandError(str(e))
+
+    def _shipper(self, root, options):
+        db_path = settings.DATABASES[options['database']]['NAME']
+        if settings.DATABASES[options['database']]['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError(f"Database '{options['database']}' is not SQLite.")
+        return WalShipper(db_path, root, pages=options['pages'], pause=options['pause'])
+
+    def handle_snapshot(self, root, options):
+        with self._shipper(root, options) as shipper:
+            state = shipper.start_generation()
+        self.stdout.write(self.style.SUCCESS(f"Snapshot taken: generation {state['generation']} in {root}"))
+        if options['keep']:
+            for name in prune_generations(options['keep'], root):
+                self.stdout.write(f"  Removed old generation {name}")
+
+    def handle_ship_wal(self, root, options):
+        checkpoint_bytes = options['checkpoint_bytes']
+        if checkpoint_bytes is None:
+            checkpoint_bytes = getattr(settings, 'SQLITE_WAL_CHECKPOINT_BYTES', DEFAULT_CHECKPOINT_BYTES)
+        shipper = self._shipper(root, options)
+
+        if options['loop']:
+            self.stdout.write(f"WAL shipper started (every {options['interval']}s) into {root}")
+            shipper.run(options['interval'], checkpoint_bytes, report=self._report)
+            return
+        with shipper:
+            self._report(shipper.ship(checkpoint_bytes), quiet=False)
+
+    def _report(self, summary, quiet=True):
+        if summary['new_generation']:
+            self.stdout.write(self.style.WARNING(
+                f"WAL chain broken or missing: started generation {summary['generation']} with a new snapshot"
+            ))
+        if summary['frames'] or not quiet:
+            self.stdout.write(
+                f"{format_timestamp(now())} shipped {summary['frames']} frame(s) "
+                f"(generation {summary['generation']}, epoch {summary['epoch']})"
+                + (', WAL checkpointed' if summary['checkpointed'] else '')
+            )
+
+    def handle_list(self, root, options):
+        generations = list_generations(root)
+        if not generations:
+            self.stdout.write(f"No backups in {root}")
+            return
+        for generation in generations:
+            segments = [s for epoch in generation['epochs'] for s in epoch['segments']]
+            latest = segments[-1]['shipped_at'] if segments else generation['created_at']
+            self.stdout.write(self.style.MIGRATE_HEADING(generation['name']))
+            self.stdout.write(f"  restorable from {generation['created_at']:%Y-%m-%d %H:%M:%S} "
+                              f"to {latest:%Y-%m-%d %H:%M:%S} UTC")
+            self.stdout.write(f"  {len(generation['epochs'])} WAL epoch(s), {len(segments)} segment(s)")
+
+    def handle_restore(self, root, options):
+        until = parse_until(options['until']) if options['until'] else None
+        output = options['output'] or f"{root}/restored-{format_timestamp(now())}.sqlite3"
+        generation, restored_to = restore(output, until=until, generation=options['generation'], root=root)
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored generation {generation} as of {restored_to:%Y-%m-%d %H:%M:%S.%f} UTC into {output}"
+        ))
+        if options['replace']:
+            db_path = settings.DATABASES[options['database']]['NAME']
+            previous = install_restored(output, db_path)
+            self.stdout.write(self.style.SUCCESS(f"Installed as {db_path}; previous database kept as {previous}"))
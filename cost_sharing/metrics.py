@@ -0,0 +1,241 @@
+# cost_sharing/metrics.py
+"""
+Request timing and in-process metrics.
+
+MetricsMiddleware (cost_sharing/middleware.py) times every request: total
+time, time in the database and time rendering templates (through
+TimedDjangoTemplates, the template backend). Each response gets a
+Server-Timing header, and the timings feed latency histograms labelled by
+URL name and the user's role, so every role's dashboard can have its own SLO.
+
+`/metrics` renders the histograms, request counters and the export job queue
+in the Prometheus text format. The numbers live in the process: with several
+gunicorn workers, each worker reports its own, and they reset on restart.
+
+Requests that fail because the database stayed locked (SQLite's busy
+timeout, PostgreSQL lock timeouts and deadlocks) are counted per view in
+ocsms_db_lock_errors_total; the load-test harness (cost_sharing/loadtest.py)
+reads it to report lock errors per endpoint.
+"""
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.db import DatabaseError
+from django.db.models import Count, Min
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.utils import timezone
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# What the database says when a statement gave up waiting for a lock
+LOCK_ERROR_MESSAGES = (
+    'database is locked',           # SQLite, after busy_timeout
+    'database table is locked',     # SQLite, shared cache
+    'deadlock detected',            # PostgreSQL
+    'could not obtain lock',        # PostgreSQL, NOWAIT / lock_timeout
+    'lock wait timeout exceeded',   # MySQL
+)
+
+_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Time spent by the current request, filled in by the middleware and the template backend."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.template_seconds = 0.0
+
+    @property
+    def total_seconds(self):
+        return time.perf_counter() - self.start
+
+
+def start_request():
+    timings = RequestTimings()
+    return timings, _timings.set(timings)
+
+
+def end_request(token):
+    _timings.reset(token)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _timings.get()
+        if timings is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_seconds += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend that adds render time to the current request's timings."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def server_timing(db_seconds, db_queries, template_seconds, total_seconds):
+    """Server-Timing header value (durations in milliseconds)."""
+    return (
+        f'db;dur={db_seconds * 1000:.1f};desc="{db_queries} queries", '
+        f'tpl;dur={template_seconds * 1000:.1f}, '
+        f'total;dur={total_seconds * 1000:.1f}'
+    )
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """Counters and histograms keyed by metric name and label values."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.help = {}
+
+    def describe(self, name, kind, text):
+        self.help[name] = (kind, text)
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, list(h.cumulative()), h.sum) for key, h in self.histograms.items()
+            )
+        described = set()
+
+        def header(name):
+            if name not in described and name in self.help:
+                kind, text = self.help[name]
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+                described.add(name)
+
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), buckets, total in histograms:
+            header(name)
+            for bound, count in buckets:
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", str(bound)),))} {count}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total:.6f}')
+            lines.append(f'{name}_count{format_labels(labels)} {buckets[-1][1]}')
+        return lines
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels
+    )
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+registry = Registry()
+registry.describe('ocsms_requests_total', 'counter', 'Requests by view, role, method and status.')
+registry.describe('ocsms_request_queries_total', 'counter', 'Database queries by view and role.')
+registry.describe('ocsms_request_duration_seconds', 'histogram', 'Request latency by view and role.')
+registry.describe('ocsms_request_db_seconds', 'histogram', 'Time in the database per request, by view and role.')
+registry.describe('ocsms_request_template_seconds', 'histogram', 'Template rendering time per request, by view and role.')
+registry.describe('ocsms_db_lock_errors_total', 'counter', 'Requests that failed waiting for a database lock, by view.')
+
+
+def record_request(view, role, method, status, total_seconds, db_seconds, db_queries, template_seconds):
+    labels = {'view': view, 'role': role}
+    registry.inc('ocsms_requests_total', {**labels, 'method': method, 'status': str(status)})
+    registry.inc('ocsms_request_queries_total', labels, db_queries)
+    registry.observe('ocsms_request_duration_seconds', labels, total_seconds)
+    registry.observe('ocsms_request_db_seconds', labels, db_seconds)
+    registry.observe('ocsms_request_template_seconds', labels, template_seconds)
+
+
+def is_lock_error(exc):
+    return isinstance(exc, DatabaseError) and any(message in str(exc).lower() for message in LOCK_ERROR_MESSAGES)
+
+
+def record_lock_error(request):
+    match = getattr(request, 'resolver_match', None)
+    registry.inc('ocsms_db_lock_errors_total', {'view': (match.url_name or 'unnamed') if match else 'unmatched'})
+
+
+def count_lock_errors(sender, request=None, **kwargs):
+    """got_request_exception receiver: count requests that failed on a database lock."""
+    if request is not None and is_lock_error(sys.exc_info()[1]):
+        record_lock_error(request)
+
+
+def queue_metrics():
+    """Export job queue depth and age of the oldest queued job, read at scrape time."""
+    from .models import ExportJob
+
+    rows = dict(
+        ExportJob.objects.filter(status__in=[ExportJob.STATUS_QUEUED, ExportJob.STATUS_RUNNING])
+        .values('status').annotate(n=Count('id')).order_by().values_list('status', 'n')
+    )
+    oldest = ExportJob.objects.filter(status=ExportJob.STATUS_QUEUED).aggregate(t=Min('created_at'))['t']
+    age = (timezone.now() - oldest).total_seconds() if oldest else 0
+
+    lines = [
+        '# HELP ocsms_export_jobs Export jobs waiting for or held by a worker.',
+        '# TYPE ocsms_export_jobs gauge',
+    ]
+    for status in (ExportJob.STATUS_QUEUED, ExportJob.STATUS_RUNNING):
+        lines.append(f'ocsms_export_jobs{format_labels((("status", status),))} {rows.get(status, 0)}')
+    lines += [
+        '# HELP ocsms_export_oldest_queued_seconds Age of the oldest queued export job.',
+        '# TYPE ocsms_export_oldest_queued_seconds gauge',
+        f'ocsms_export_oldest_queued_seconds {age:.0f}',
+    ]
+    return lines
+
+
+def render_metrics():
+    return '\n'.join(registry.render() + queue_metrics()) + '\n'
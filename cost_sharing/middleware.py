@@ -0,0 +1,175 @@
+# cost_sharing/middleware.py
+import logging
+import re
+import time
+
+from django.conf import settings
+
+from . import db_router, log, metrics, profiling
+from .query_budget import QueryBudgetExceeded, budget_for, record_queries
+
+logger = logging.getLogger(__name__)
+
+STICKY_SESSION_KEY = '_primary_db_until'
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Read-your-writes for the replica router: a request that wrote to the
+    database keeps the session on the primary for REPLICA_STICKY_SECONDS, and
+    requests within that window skip the replica. Goes after
+    SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = getattr(request, 'session', None)
+        sticky_until = session.get(STICKY_SESSION_KEY, 0) if session is not None else 0
+        sticky = db_router._sticky.set(sticky_until > time.time())
+        wrote = db_router._wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if db_router._wrote.get() and session is not None and db_router.replica_configured():
+                session[STICKY_SESSION_KEY] = time.time() + getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+        finally:
+            db_router._sticky.reset(sticky)
+            db_router._wrote.reset(wrote)
+        return response
+
+
+class QueryBudgetMiddleware:
+    """
+    Logs (or with QUERY_BUDGET_STRICT, raises for) requests over their view's
+    query budget (see cost_sharing/query_budget.py). With DEBUG, every
+    response also carries X-Query-Count and X-Query-Time headers. Goes first
+    so session and authentication queries are counted too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_BUDGET_ENABLED', True)
+        self.strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        with record_queries() as stats:
+            response = self.get_response(request)
+        request.query_stats = stats
+
+        match = request.resolver_match
+        url_name = match.url_name if match else None
+        problems = stats.violations(budget_for(url_name))
+        if problems:
+            message = f"{request.method} {request.path} ({url_name or 'unnamed'}) over query budget: " + '; '.join(problems)
+            if self.strict:
+                raise QueryBudgetExceeded(message + '\n' + stats.report())
+            logger.warning('%s\n%s', message, stats.report())
+
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(stats.count)
+            response['X-Query-Time'] = f'{stats.db_ms:.1f}ms'
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Adds a Server-Timing header (db, tpl, total) to every response and feeds
+    the per-view latency histograms behind /metrics (see
+    cost_sharing/metrics.py). Goes first so it times the whole request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'METRICS_ENABLED', True)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        timings, token = metrics.start_request()
+        try:
+            with record_queries(shapes=False) as queries:
+                response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        total = timings.total_seconds
+
+        match = request.resolver_match
+        view = (match.url_name or 'unnamed') if match else 'unmatched'
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            role = user.role or 'none'
+        else:
+            role = 'anonymous'
+        metrics.record_request(
+            view, role, request.method, response.status_code,
+            total, queries.seconds, queries.count, timings.template_seconds,
+        )
+        response['Server-Timing'] = metrics.server_timing(
+            queries.seconds, queries.count, timings.template_seconds, total
+        )
+        return response
+
+
+class RequestLogMiddleware:
+    """
+    Tags the request's log records with a request ID, the user and the view,
+    and makes the per-request sampling decision (see cost_sharing/log.py).
+    The ID comes from an incoming X-Request-ID header (e.g. set by the proxy)
+    or is generated, and is returned in the X-Request-ID response header.
+    Goes first.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'LOG_SAMPLE_RATE', 1.0)
+
+    def __call__(self, request):
+        request_id = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = log.new_request_id()
+        request.request_id = request_id
+
+        context, token = log.start_request(request_id, self.sample_rate)
+        request.log_context = context
+        try:
+            response = self.get_response(request)
+        finally:
+            log.end_request(token)
+        response['X-Request-ID'] = request_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        context = request.log_context
+        if request.resolver_match:
+            context.view = request.resolver_match.url_name or '-'
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            context.user = user.username
+
+
+class ProfilerMiddleware:
+    """
+    Profiles a request when an admin asks for it with ?_profile=1 or an
+    X-Profile: 1 header (see cost_sharing/profiling.py) and returns the
+    stored profile's ID in X-Profile-ID. Goes after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling.wants_profile(request):
+            return self.get_response(request)
+        response, profile_id = profiling.profile_request(request, self.get_response)
+        if profile_id is None:
+            logger.warning('Profiling skipped for %s: another profiler is active', request.path)
+            return response
+        logger.info('Profiled %s as %s', request.path, profile_id)
+        response['X-Profile-ID'] = profile_id
+        return response
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cost_sharing', '0005_exportjob'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='exportjob',
+            name='cost_sharin_export__ba17ad_idx',
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='format',
+            field=models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel (XLSX)'), ('parquet', 'Parquet')], default='csv', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='exportjob',
+            index=models.Index(fields=['export_type', 'format', 'status', 'finished_at'], name='cost_sharin_export__f6c67d_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:40
+
+from django.db import migrations, models
+
+
+def backfill_student_data_updated_at(apps, schema_editor):
+    # Existing rows were last written when they were uploaded
+    StudentData = apps.get_model('cost_sharing', 'StudentData')
+    StudentData.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cost_sharing', '0006_exportjob_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='costsharingagreement',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='studentdata',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_student_data_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='costsharingagreement',
+            index=models.Index(fields=['updated_at', 'id'], name='cost_sharin_updated_a5080e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['updated_at', 'id'], name='cost_sharin_updated_495037_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentdata',
+            index=models.Index(fields=['updated_at', 'id'], name='cost_sharin_updated_8a46f0_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations
+
+FTS_TABLE = 'cost_sharing_studentdata_fts'
+TABLE = 'cost_sharing_studentdata'
+FIELDS = ['full_name', 'student_id', 'department', 'faculty']
+
+
+def _columns(prefix=''):
+    return ', '.join(f'{prefix}{field}' for field in FIELDS)
+
+
+SQLITE_FORWARD = [
+    # External-content FTS5 table: stores only the index, reads rows from StudentData
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        {_columns()},
+        content='{TABLE}', content_rowid='id',
+        tokenize='unicode61', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_columns()}) VALUES (new.id, {_columns('new.')});
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns()}) VALUES ('delete', old.id, {_columns('old.')});
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF {_columns()} ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns()}) VALUES ('delete', old.id, {_columns('old.')});
+        INSERT INTO {FTS_TABLE}(rowid, {_columns()}) VALUES (new.id, {_columns('new.')});
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+# Matches the UPPER("col"::text) LIKE UPPER(...) that icontains produces
+POSTGRESQL_FORWARD = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+    f'CREATE INDEX IF NOT EXISTS {TABLE}_{field}_trgm ON {TABLE} '
+    f'USING gin (UPPER("{field}"::text) gin_trgm_ops)'
+    for field in FIELDS
+]
+
+POSTGRESQL_BACKWARD = [
+    f'DROP INDEX IF EXISTS {TABLE}_{field}_trgm' for field in FIELDS
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cost_sharing', '0007_changes_feed_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            _run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRESQL_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import Counter
+
+
+# (model, free-text field, FK field)
+REFERENCE_COLUMNS = [
+    ('StudentData', 'faculty', 'faculty_ref'),
+    ('StudentData', 'department', 'department_ref'),
+    ('CostSharingAgreement', 'faculty', 'faculty_ref'),
+    ('CostSharingAgreement', 'department', 'department_ref'),
+    ('CostStructure', 'department', 'department_ref'),
+    ('User', 'department', 'department_ref'),
+]
+
+
+def backfill_references(apps, schema_editor):
+    Faculty = apps.get_model('cost_sharing', 'Faculty')
+    Department = apps.get_model('cost_sharing', 'Department')
+
+    # Distinct raw values per column; names that differ only in case or
+    # surrounding spaces share one row
+    raw_values = {}
+    for model_name, field, _ in REFERENCE_COLUMNS:
+        model = apps.get_model('cost_sharing', model_name)
+        raw_values[model_name, field] = set(
+            model.objects.exclude(**{f'{field}__isnull': True}).values_list(field, flat=True).distinct()
+        )
+
+    def create_rows(model, field_name):
+        rows = {}
+        for (_, field), values in raw_values.items():
+            if field != field_name:
+                continue
+            for value in sorted(values):
+                name = value.strip()
+                if name and name.lower() not in rows:
+                    rows[name.lower()] = model.objects.create(name=name)
+        return rows
+
+    faculties = create_rows(Faculty, 'faculty')
+    departments = create_rows(Department, 'department')
+
+    # A department's faculty is the one it is most often paired with
+    StudentData = apps.get_model('cost_sharing', 'StudentData')
+    CostSharingAgreement = apps.get_model('cost_sharing', 'CostSharingAgreement')
+    pairs = Counter()
+    for model in (StudentData, CostSharingAgreement):
+        for department, faculty in model.objects.values_list('department', 'faculty').distinct():
+            pairs[department.strip().lower(), faculty.strip().lower()] += 1
+    for (department, faculty), _ in pairs.most_common():
+        row = departments.get(department)
+        if row and row.faculty_id is None and faculty in faculties:
+            row.faculty = faculties[faculty]
+            row.save(update_fields=['faculty'])
+
+    # One UPDATE per distinct value
+    for model_name, field, fk_field in REFERENCE_COLUMNS:
+        model = apps.get_model('cost_sharing', model_name)
+        rows = faculties if field == 'faculty' else departments
+        for value in raw_values[model_name, field]:
+            row = rows.get(value.strip().lower())
+            if row:
+                model.objects.filter(**{field: value}).update(**{fk_field: row})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cost_sharing', '0008_student_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Faculty',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Faculties',
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Department',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('faculty', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='departments', to='cost_sharing.faculty')),
+            ],
+            options={
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='costsharingagreement',
+            name='department_ref',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='cost_sharing.department'),
+        ),
+        migrations.AddField(
+            model_name='costsharingagreement',
+            name='faculty_ref',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='cost_sharing.faculty'),
+        ),
+        migrations.AddField(
+            model_name='coststructure',
+            name='department_ref',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='cost_sharing.department'),
+        ),
+        migrations.AddField(
+            model_name='studentdata',
+            name='department_ref',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='cost_sharing.department'),
+        ),
+        migrations.AddField(
+            model_name='studentdata',
+            name='faculty_ref',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='cost_sharing.faculty'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='department_ref',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='cost_sharing.department'),
+        ),
+        migrations.RunPython(backfill_references, migrations.RunPython.noop),
+    ]
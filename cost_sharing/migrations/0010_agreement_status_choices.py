@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:48
+
+from django.db import migrations, models
+
+# Older code wrote these for an agreement the cost officer had accepted
+STATUS_ALIASES = {
+    'approved': 'accepted',
+    'completed': 'accepted',
+}
+
+
+def normalize_statuses(apps, schema_editor):
+    CostSharingAgreement = apps.get_model('cost_sharing', 'CostSharingAgreement')
+    for value in list(CostSharingAgreement.objects.values_list('status', flat=True).distinct()):
+        canonical = (value or '').strip().lower() or 'pending'
+        canonical = STATUS_ALIASES.get(canonical, canonical)
+        if canonical != value:
+            CostSharingAgreement.objects.filter(status=value).update(status=canonical)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cost_sharing', '0009_department_faculty'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_statuses, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='costsharingagreement',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('rejected', 'Rejected')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='costsharingagreement',
+            index=models.Index(fields=['student', 'status'], name='cost_sharin_student_b6c825_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='costsharingagreement',
+            index=models.Index(fields=['status', 'date_filled'], name='cost_sharin_status_542f2e_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:51
+
+from django.db import migrations, models
+
+
+def check_duplicate_cost_structures(apps, schema_editor):
+    # Duplicates made CostSharingAgreement.total_cost raise
+    # MultipleObjectsReturned. Which row holds the right prices is for an
+    # operator to decide (manage.py dedupe_cost_structures), not a migration
+    CostStructure = apps.get_model('cost_sharing', 'CostStructure')
+    rows = {}
+    for pk, department, year in CostStructure.objects.order_by('id').values_list('id', 'department', 'year'):
+        rows.setdefault((department, year), []).append(pk)
+    duplicates = [f'{department!r} year {year}: ids {ids}' for (department, year), ids in rows.items() if len(ids) > 1]
+    if duplicates:
+        raise RuntimeError(
+            'Duplicate cost structures must be merged before the unique constraint can be added:\n  '
+            + '\n  '.join(duplicates)
+            + '\nReview them with `python manage.py dedupe_cost_structures`, merge them with --apply, then migrate again.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cost_sharing', '0010_agreement_status_choices'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_cost_structures, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='costsharingagreement',
+            index=models.Index(fields=['student', 'year'], name='cost_sharin_student_a50f2f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coststructure',
+            index=models.Index(fields=['department_ref', 'year'], name='cost_sharin_departm_a0ccc6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['recipient', '-created_at'], name='notification_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['agreement', 'status'], name='cost_sharin_agreeme_dd0e89_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentdata',
+            index=models.Index(fields=['assigned_to', 'created_at'], name='cost_sharin_assigne_92c148_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='coststructure',
+            constraint=models.UniqueConstraint(fields=('department', 'year'), name='unique_cost_structure_department_year'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+# Notice visibility filters with audience @> '["<role>"]' (audience__contains),
+# which a jsonb_path_ops GIN index answers directly
+NOTICE_AUDIENCE_INDEX = (
+    'CREATE INDEX IF NOT EXISTS cost_sharing_notice_audience_gin '
+    'ON cost_sharing_notice USING gin (audience jsonb_path_ops)'
+)
+
+# Name lookups (admin search, officer screens) use icontains, i.e.
+# UPPER("col"::text) LIKE UPPER('%...%'); trigram indexes serve those
+TRIGRAM_COLUMNS = [
+    ('cost_sharing_user', 'username'),
+    ('cost_sharing_user', 'first_name'),
+    ('cost_sharing_user', 'last_name'),
+    ('cost_sharing_user', 'email'),
+    ('cost_sharing_costsharingagreement', 'full_name'),
+]
+
+POSTGRESQL_FORWARD = ["CREATE EXTENSION IF NOT EXISTS pg_trgm", NOTICE_AUDIENCE_INDEX] + [
+    f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} '
+    f'USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+    for table, column in TRIGRAM_COLUMNS
+]
+
+POSTGRESQL_BACKWARD = ['DROP INDEX IF EXISTS cost_sharing_notice_audience_gin'] + [
+    f'DROP INDEX IF EXISTS {table}_{column}_trgm' for table, column in TRIGRAM_COLUMNS
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cost_sharing', '0011_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'postgresql': POSTGRESQL_FORWARD}),
+            _run({'postgresql': POSTGRESQL_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:25
+
+from django.db import migrations, models
+
+
+def backfill_keys(apps, schema_editor):
+    # Same normalization as models.reference_key(); 0009 already created one
+    # row per lowercased, stripped name, so the keys are unique
+    for model_name in ('Faculty', 'Department'):
+        model = apps.get_model('cost_sharing', model_name)
+        for row in model.objects.all():
+            row.key = row.name.strip().lower()
+            row.save(update_fields=['key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cost_sharing', '0012_postgresql_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='key',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='faculty',
+            name='key',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(backfill_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='department',
+            name='key',
+            field=models.CharField(editable=False, max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='faculty',
+            name='key',
+            field=models.CharField(editable=False, max_length=100, unique=True),
+        ),
+    ]
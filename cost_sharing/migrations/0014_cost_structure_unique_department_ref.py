@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:27
+
+from django.db import migrations, models
+
+
+def check_department_ref_conflicts(apps, schema_editor):
+    # Names differing only in case or spacing ('Law', 'law ') share a
+    # department_ref. Which of their structures holds the right prices is for
+    # an operator to decide (manage.py dedupe_cost_structures)
+    CostStructure = apps.get_model('cost_sharing', 'CostStructure')
+    rows = {}
+    structures = CostStructure.objects.exclude(department_ref=None).order_by('id')
+    for pk, department_id, department, year in structures.values_list('id', 'department_ref_id', 'department', 'year'):
+        rows.setdefault((department_id, year), []).append(f'id {pk} {department!r}')
+    conflicts = [f'year {year}: ' + ', '.join(found) for (_, year), found in rows.items() if len(found) > 1]
+    if conflicts:
+        raise RuntimeError(
+            'Cost structures whose departments differ only in case or spacing must be merged before '
+            'the (department_ref, year) constraint can be added:\n  '
+            + '\n  '.join(conflicts)
+            + '\nReview them with `python manage.py dedupe_cost_structures`, merge them with --apply, then migrate again.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cost_sharing', '0013_reference_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_department_ref_conflicts, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='coststructure',
+            name='unique_cost_structure_department_year',
+        ),
+        # Covered by the unique constraint's index
+        migrations.RemoveIndex(
+            model_name='coststructure',
+            name='cost_sharin_departm_a0ccc6_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='coststructure',
+            constraint=models.UniqueConstraint(fields=('department_ref', 'year'), name='unique_cost_structure_department_ref_year'),
+        ),
+    ]
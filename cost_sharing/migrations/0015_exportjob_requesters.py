@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cost_sharing', '0014_cost_structure_unique_department_ref'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='requesters',
+            field=models.ManyToManyField(blank=True, related_name='joined_export_jobs', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
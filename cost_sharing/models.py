@@ -6,10 +6,135 @@ import uuid
 import random  # ADD THIS IMPORT
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError 
-from django.db.models import Sum
+from django.db.models import Sum, Case, When, Value, F, OuterRef, Subquery, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce, Greatest, Lower, Trim
 from django.conf import settings
 
-class User(AbstractUser):
+from .cache import cost_cache, reference_cache
+
+
+def reference_key(name):
+    """Lookup key of a free-text faculty/department name: names differing only in case or spacing share it."""
+    return (name or '').strip().lower()
+
+
+class ReferenceName(models.Model):
+    """Base for small lookup tables (faculties, departments) keyed by a unique name."""
+    name = models.CharField(max_length=100, unique=True)
+    key = models.CharField(max_length=100, unique=True, editable=False)
+
+    class Meta:
+        abstract = True
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        self.key = reference_key(self.name)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def cached_names(cls):
+        """All names, sorted, for filter dropdowns (cleared on every save or delete)."""
+        return reference_cache.get_or_set(
+            (cls._meta.model_name, 'names'),
+            lambda: list(cls.objects.order_by('name').values_list('name', flat=True)),
+        )
+
+    @classmethod
+    def for_name(cls, name, **defaults):
+        """Row for a free-text name (matched by reference_key()), created if new. None for blank names."""
+        key = reference_key(name)
+        if not key:
+            return None
+        # get_or_create() retries the lookup if a concurrent save created the row first
+        row, _ = cls.objects.get_or_create(key=key, defaults={'name': name.strip(), **defaults})
+        return row
+
+
+class Faculty(ReferenceName):
+    class Meta(ReferenceName.Meta):
+        verbose_name_plural = 'Faculties'
+
+
+class Department(ReferenceName):
+    faculty = models.ForeignKey(Faculty, on_delete=models.SET_NULL, null=True, blank=True, related_name='departments')
+
+
+# Free-text fields mirrored by a <field>_ref FK, and the model it points at
+REFERENCE_MODELS = {'faculty': Faculty, 'department': Department}
+
+
+def reference_field(model):
+    """Nullable indexed FK mirroring one of the free-text department/faculty fields."""
+    return models.ForeignKey(model, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+
+
+class ReferenceFieldsMixin:
+    """
+    Keeps the <field>_ref FK of each free-text field in REFERENCE_FIELDS
+    ('faculty', 'department') pointing at the row for its name.
+
+    save() only resolves a field that changed since the instance was loaded
+    (or that is listed in update_fields), so saves that leave the names alone
+    - a login's update_fields=['last_login'] - run no lookup.
+    QuerySet.update(), bulk_create() and raw SQL bypass save(): call
+    resync_references() after them.
+    """
+    REFERENCE_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_references = {
+            field: getattr(instance, field) for field in cls.REFERENCE_FIELDS if field in field_names
+        }
+        return instance
+
+    def sync_references(self, update_fields=None):
+        """Resolve the changed reference fields; returns update_fields with the FKs it set added."""
+        loaded = getattr(self, '_loaded_references', {})
+        changed = []
+        for field in self.REFERENCE_FIELDS:
+            if update_fields is not None:
+                if field not in update_fields:
+                    continue
+            elif field in loaded and loaded[field] == getattr(self, field):
+                continue
+            value = getattr(self, field)
+            defaults = {}
+            if field == 'department' and 'faculty' in self.REFERENCE_FIELDS:
+                defaults['faculty_id'] = self.faculty_ref_id
+            setattr(self, f'{field}_ref', REFERENCE_MODELS[field].for_name(value, **defaults))
+            loaded[field] = value
+            changed.append(f'{field}_ref')
+        self._loaded_references = loaded
+        if update_fields is not None and changed:
+            update_fields = list(update_fields) + changed
+        return update_fields
+
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = self.sync_references(kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def resync_references(cls, using='default'):
+        """Repoint every <field>_ref FK of the table at the row for its name: one UPDATE per field."""
+        for field in cls.REFERENCE_FIELDS:
+            reference_model = REFERENCE_MODELS[field]
+            known = set(reference_model.objects.using(using).values_list('key', flat=True))
+            for name in cls.objects.using(using).values_list(field, flat=True).distinct():
+                key = reference_key(name)
+                if key and key not in known:
+                    reference_model.objects.using(using).get_or_create(key=key, defaults={'name': name.strip()})
+                    known.add(key)
+            cls.objects.using(using).update(**{f'{field}_ref': Subquery(
+                reference_model.objects.filter(key=Lower(Trim(OuterRef(field)))).values('pk')[:1]
+            )})
+
+
+class User(ReferenceFieldsMixin, AbstractUser):
     ROLE_CHOICES = (
         ('admin', 'Admin'),
         ('student', 'Student'),
@@ -22,7 +147,10 @@ class User(AbstractUser):
     phone = models.CharField(max_length=20, blank=True, null=True)
     student_id = models.CharField(max_length=20, blank=True, null=True)
     department = models.CharField(max_length=100, blank=True, null=True)
+    department_ref = reference_field(Department)
     year_of_study = models.IntegerField(blank=True, null=True)
+
+    REFERENCE_FIELDS = ('department',)
     
     class Meta:
         permissions = [
@@ -42,8 +170,9 @@ class User(AbstractUser):
         """Return unread notifications for this user"""
         return self.notifications.filter(is_read=False)
 
-class CostStructure(models.Model):
+class CostStructure(ReferenceFieldsMixin, models.Model):
     department = models.CharField(max_length=100)
+    department_ref = reference_field(Department)
     year = models.IntegerField()
     education_cost = models.DecimalField(max_digits=10, decimal_places=2)
     food_cost = models.DecimalField(max_digits=10, decimal_places=2)
@@ -51,15 +180,38 @@ class CostStructure(models.Model):
     total_cost = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    REFERENCE_FIELDS = ('department',)
     
     def save(self, *args, **kwargs):
         # Auto-calculate total cost before saving
         self.total_cost = self.education_cost + self.food_cost + self.dormitory_cost
         super().save(*args, **kwargs)
     
+    class Meta:
+        constraints = [
+            # One structure per department (by reference_key(), like the
+            # lookups) and year; its index serves agreement_total_cost_expression()
+            models.UniqueConstraint(fields=['department_ref', 'year'], name='unique_cost_structure_department_ref_year'),
+        ]
+    
     def __str__(self):
         return f"{self.department} - Year {self.year}"
 
+    @classmethod
+    def cached(cls, **lookup):
+        """
+        The structure matching `lookup` (e.g. department_ref_id and year) from
+        the shared cache; raises DoesNotExist like get().
+        """
+        structure = cost_cache.get_or_set(
+            ('structure',) + tuple(f'{field}={value}' for field, value in sorted(lookup.items())),
+            lambda: cls.objects.filter(**lookup).first(),
+        )
+        if structure is None:
+            raise cls.DoesNotExist(f'No cost structure for {lookup}')
+        return structure
+
 class BankAccount(models.Model):
     BANK_CHOICES = [
         ('cbe', 'Commercial Bank of Ethiopia'),
@@ -89,7 +241,7 @@ class BankAccount(models.Model):
     def __str__(self):
         return f"{self.bank_name} - {self.account_number} ({self.account_holder_name})"
 
-class CostSharingAgreement(models.Model):
+class CostSharingAgreement(ReferenceFieldsMixin, models.Model):
     SERVICE_TYPE_CHOICES = [
         ('in_kind', 'In Kind'),
         ('in_cash', 'In Cash'),
@@ -100,6 +252,11 @@ class CostSharingAgreement(models.Model):
         ('income', 'To Be Paid by Income'),
     ]
     
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        ACCEPTED = 'accepted', 'Accepted'
+        REJECTED = 'rejected', 'Rejected'
+    
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cost_sharing_agreements')
     academic_year = models.IntegerField()
     date_filled = models.DateField(auto_now_add=True)
@@ -119,7 +276,11 @@ class CostSharingAgreement(models.Model):
     university_name = models.CharField(max_length=100)
     faculty = models.CharField(max_length=100)
     department = models.CharField(max_length=100)
+    faculty_ref = reference_field(Faculty)
+    department_ref = reference_field(Department)
     year = models.IntegerField()
+
+    REFERENCE_FIELDS = ('faculty', 'department')
     
     # Withdrawal Information - All optional with proper defaults
     has_withdrawn = models.BooleanField(default=False)
@@ -147,24 +308,44 @@ class CostSharingAgreement(models.Model):
     is_graduate = models.BooleanField(default=False)
     payment_type = models.CharField(max_length=20, blank=True, null=True, choices=PAYMENT_TYPE_CHOICES)
     duration = models.IntegerField(blank=True, null=True)
-    status = models.CharField(max_length=20, default='pending')
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
     
     receipt = models.FileField(
         upload_to='cost_sharing_receipts/',
         help_text="Photo/receipt is required"
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            # Cursor for the incremental changes feed
+            models.Index(fields=['updated_at', 'id']),
+            # A student's accepted agreement; pending/accepted lists by date
+            models.Index(fields=['student', 'status']),
+            models.Index(fields=['status', 'date_filled']),
+            # Existing agreement for the student's year of study (fill_cost_sharing)
+            models.Index(fields=['student', 'year']),
+        ]
     
     @property
     def total_cost(self):
         """Calculate total cost automatically based on selected services and cost structure"""
+        # Use the value computed in SQL when the queryset was annotated with
+        # with_total_cost() (avoids one CostStructure query per agreement)
+        if 'annotated_total_cost' in self.__dict__:
+            return self.__dict__['annotated_total_cost']
+        
         total = 0
         
         try:
-            # Get the cost structure for this department and year
-            cost_structure = CostStructure.objects.get(
-                department=self.department,
-                year=self.year
-            )
+            # Get the cost structure for this department and year (by the
+            # department FK once the agreement has been saved, by the
+            # department's key before; agreement_total_cost_expression() matches)
+            if self.department_ref_id:
+                department_lookup = {'department_ref_id': self.department_ref_id}
+            else:
+                department_lookup = {'department_ref__key': reference_key(self.department)}
+            cost_structure = CostStructure.cached(year=self.year, **department_lookup)
             
             # Add costs for selected services
             if self.education_service:
@@ -180,8 +361,12 @@ class CostSharingAgreement(models.Model):
             
         return total
     
+    
     def get_total_paid(self):
         """Calculate total amount paid for this agreement - EXCLUDE cancelled/failed payments"""
+        # Annotated by with_payment_totals()
+        if 'total_paid' in self.__dict__:
+            return self.__dict__['total_paid']
         valid_statuses = ['verified', 'completed', 'partial']  # EXCLUDES 'cancelled', 'failed', 'pending'
         
         try:
@@ -207,10 +392,73 @@ class CostSharingAgreement(models.Model):
     
     def get_remaining_balance(self):
         """Calculate remaining balance - EXCLUDE cancelled/failed payments"""
+        if 'remaining_balance' in self.__dict__:
+            return self.__dict__['remaining_balance']
         return max(0, self.total_cost - self.get_total_paid())
     
     def __str__(self):
         return f"{self.student.username} - {self.academic_year}"
+
+
+def agreement_total_cost_expression(prefix=''):
+    """
+    SQL version of CostSharingAgreement.total_cost.
+
+    `prefix` is the lookup path to the agreement from the queryset's model,
+    e.g. 'agreement__' when annotating payments.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    # The department FK, or the department row for the text field's key while
+    # the FK is unset (rows written by bulk paths), as in total_cost
+    department = Coalesce(
+        OuterRef(f'{prefix}department_ref'),
+        Subquery(Department.objects.filter(
+            key=Lower(Trim(OuterRef(OuterRef(f'{prefix}department'))))
+        ).values('pk')[:1]),
+    )
+    cost_structure = CostStructure.objects.filter(department_ref=department, year=OuterRef(f'{prefix}year'))
+
+    def service_cost(service_field, cost_field):
+        cost = Coalesce(Subquery(cost_structure.values(cost_field)[:1]), Value(0), output_field=money)
+        return Case(
+            When(**{f'{prefix}{service_field}': True}, then=cost),
+            default=Value(0),
+            output_field=money,
+        )
+
+    return ExpressionWrapper(
+        service_cost('education_service', 'education_cost')
+        + service_cost('food_service', 'food_cost')
+        + service_cost('dormitory_service', 'dormitory_cost'),
+        output_field=money,
+    )
+
+
+def with_total_cost(queryset):
+    """Annotate a CostSharingAgreement queryset so total_cost needs no extra query."""
+    return queryset.annotate(annotated_total_cost=agreement_total_cost_expression())
+
+
+def with_payment_totals(queryset):
+    """
+    Annotate a CostSharingAgreement queryset with total_cost (as with_total_cost()),
+    total_paid and remaining_balance - get_total_paid() and get_remaining_balance()
+    in SQL, so listing agreements with their balances needs no query per row.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    paid = Payment.objects.filter(
+        agreement=OuterRef('pk'), status__in=['verified', 'completed', 'partial'],
+    ).order_by().values('agreement').annotate(total=Sum('amount_paid')).values('total')
+    return with_total_cost(queryset).annotate(
+        total_paid=Coalesce(Subquery(paid), Value(0), output_field=money),
+    ).annotate(
+        remaining_balance=Greatest(
+            ExpressionWrapper(F('annotated_total_cost') - F('total_paid'), output_field=money),
+            Value(0), output_field=money,
+        ),
+    )
+
+
 class Payment(models.Model):
     PAYMENT_STATUS_CHOICES = [
         ('pending', 'Pending Verification'),
@@ -284,6 +532,8 @@ class Payment(models.Model):
             models.Index(fields=['transaction_code']),
             models.Index(fields=['status']),
             models.Index(fields=['date_paid']),
+            models.Index(fields=['updated_at', 'id']),
+            models.Index(fields=['agreement', 'status']),
         ]
 
     def __str__(self):
@@ -384,7 +634,7 @@ class Feedback(models.Model):
     def __str__(self):
         return f"{self.student.username} - {self.subject}"
 
-class StudentData(models.Model):
+class StudentData(ReferenceFieldsMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     full_name = models.CharField(max_length=100)
     student_id = models.CharField(max_length=20, unique=True)
@@ -409,6 +659,8 @@ class StudentData(models.Model):
         verbose_name='Year of Study'
     )
     department = models.CharField(max_length=100)
+    faculty_ref = reference_field(Faculty)
+    department_ref = reference_field(Department)
     academic_year = models.IntegerField()
     mother_name = models.CharField(max_length=100)
     mother_phone = models.CharField(max_length=20)
@@ -428,6 +680,16 @@ class StudentData(models.Model):
     ]
     status = models.CharField(max_length=40, choices=STATUS_CHOICES, default=STATUS_UPLOADED)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    REFERENCE_FIELDS = ('faculty', 'department')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+            # An officer's assigned students, newest first
+            models.Index(fields=['assigned_to', 'created_at']),
+        ]
 
     def assign_to_cost_officer(self, user):
         self.assigned_to = user
@@ -467,6 +729,7 @@ class Notification(models.Model):
         ('payment', 'Payment'),
         ('notice', 'Notice'),
         ('feedback', 'Feedback'),
+        ('export', 'Export'),
     ]
     
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
@@ -480,6 +743,65 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unread badge and latest unread notifications for a user.
+            # Partial rather than (recipient, is_read, created_at): Django
+            # writes is_read=False as NOT is_read, which SQLite cannot match
+            # against an index column but does match against this condition.
+            models.Index(
+                fields=['recipient', '-created_at'],
+                condition=models.Q(is_read=False),
+                name='notification_unread_idx',
+            ),
+        ]
     
     def __str__(self):
-        return f"{self.title} - {self.recipient.username}"
\ No newline at end of file
+        return f"{self.title} - {self.recipient.username}"
+
+class ExportJob(models.Model):
+    """A report requested by an officer and generated in the background into media/exports/."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)'),
+        ('parquet', 'Parquet'),
+    ]
+
+    export_type = models.CharField(max_length=50)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    # Users whose later requests were answered by this job while it was queued or running
+    requesters = models.ManyToManyField(User, blank=True, related_name='joined_export_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    file = models.FileField(upload_to='exports/', blank=True, null=True)
+    row_count = models.PositiveIntegerField(blank=True, null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['export_type', 'format', 'status', 'finished_at']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.export_type}.{self.format} ({self.status}) by {self.requested_by.username}"
+
+    def is_fresh(self):
+        """True if this is a completed artifact younger than EXPORT_ARTIFACT_MAX_AGE seconds."""
+        if self.status != self.STATUS_COMPLETED or not self.finished_at or not self.file:
+            return False
+        max_age = getattr(settings, 'EXPORT_ARTIFACT_MAX_AGE', 900)
+        return (timezone.now() - self.finished_at).total_seconds() < max_age
@@ -0,0 +1,176 @@
+# cost_sharing/profiling.py
+"""
+On-demand request profiling for administrators.
+
+An admin adds `?_profile=1` to a URL (or sends an `X-Profile: 1` header) and
+ProfilerMiddleware (cost_sharing/middleware.py) runs that one request under
+cProfile while recording every SQL statement. The result is stored in
+PROFILE_DIR as two files:
+
+    <id>.prof   cProfile stats (pstats / snakeviz / gprof2dot)
+    <id>.json   request details, top functions and the SQL log
+
+The Profiles page (/profiles/) lists recent profiles with their top
+functions and links to both files. Only the newest PROFILE_KEEP are kept.
+Nothing is profiled for other users, whatever they send.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+TOP_FUNCTIONS = 30
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILE_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def wants_profile(request):
+    if not getattr(settings, 'PROFILER_ENABLED', True):
+        return False
+    if request.GET.get('_profile') != '1' and request.headers.get('X-Profile') != '1':
+        return False
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_authenticated and (user.role == 'admin' or user.is_superuser))
+
+
+class SqlLog:
+    """Execute wrapper keeping every statement with its parameters and duration."""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.entries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.entries.append({
+                'database': self.alias,
+                'sql': sql,
+                'params': None if many else [str(p) for p in params or ()],
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+            })
+
+
+def profile_request(request, get_response):
+    """
+    Run get_response(request) under cProfile; returns (response, profile_id).
+    The profile_id is None if another profiler was already active.
+    """
+    profiler = cProfile.Profile()
+    logs = [SqlLog(alias) for alias in connections]
+    with ExitStack() as stack:
+        for log in logs:
+            stack.enter_context(connections[log.alias].execute_wrapper(log))
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            return get_response(request), None
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+        seconds = time.perf_counter() - start
+
+    sql = sorted((entry for log in logs for entry in log.entries), key=lambda e: -e['ms'])
+    profile_id = save_profile(request, response, profiler, seconds, sql)
+    return response, profile_id
+
+
+def _location(filename, line):
+    base = str(settings.BASE_DIR)
+    if filename.startswith(base):
+        filename = os.path.relpath(filename, base)
+    return f'{filename}:{line}'
+
+
+def top_functions(stats, limit=TOP_FUNCTIONS):
+    """The `limit` functions with the most cumulative time, with call counts and own time."""
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': f'{name} ({_location(filename, line)})',
+            'calls': calls,
+            'own_ms': round(own * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda row: -row['cumulative_ms'])
+    return rows[:limit]
+
+
+def save_profile(request, response, profiler, seconds, sql):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    now = timezone.now()
+    profile_id = f"{now:%Y%m%d-%H%M%S}-{os.urandom(4).hex()}"
+
+    profiler.dump_stats(directory / f'{profile_id}.prof')
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    match = request.resolver_match
+    details = {
+        'id': profile_id,
+        'created_at': now.isoformat(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': match.url_name if match else None,
+        'user': request.user.username,
+        'request_id': getattr(request, 'request_id', None),
+        'status': response.status_code,
+        'total_ms': round(seconds * 1000, 3),
+        'sql_count': len(sql),
+        'sql_ms': round(sum(entry['ms'] for entry in sql), 3),
+        'top_functions': top_functions(stats),
+        'sql': sql,
+    }
+    (directory / f'{profile_id}.json').write_text(json.dumps(details, indent=1))
+    prune_profiles()
+    return profile_id
+
+
+def _newest_first(directory):
+    return sorted(directory.glob('*.json'), key=lambda path: path.stat().st_mtime, reverse=True)
+
+
+def list_profiles(limit=None):
+    """Details of stored profiles, newest first (without the SQL log)."""
+    directory = profile_dir()
+    if not directory.exists():
+        return []
+    profiles = []
+    for path in _newest_first(directory)[:limit]:
+        try:
+            details = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        details.pop('sql', None)
+        profiles.append(details)
+    return profiles
+
+
+def profile_file(profile_id, kind):
+    """Path of a stored profile's .prof or .json file, or None."""
+    if kind not in ('prof', 'json') or not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = profile_dir() / f'{profile_id}.{kind}'
+    return path if path.exists() else None
+
+
+def prune_profiles():
+    keep = getattr(settings, 'PROFILE_KEEP', 50)
+    for path in _newest_first(profile_dir())[keep:]:
+        path.unlink(missing_ok=True)
+        path.with_suffix('.prof').unlink(missing_ok=True)
@@ -0,0 +1,142 @@
+# cost_sharing/query_budget.py
+"""
+Per-request query budgets.
+
+QueryBudgetMiddleware (cost_sharing/middleware.py) records every query a view
+runs: the count, the time spent in the database and a fingerprint of each
+query's shape (literals and parameter lists collapsed). The same shape running many times in one request
+is the signature of an N+1 loop - e.g. one `get_total_paid()` per agreement
+in a template.
+
+A request over its view's budget (QUERY_BUDGETS, by URL name, on top of
+QUERY_BUDGET_DEFAULT) is logged with its most repeated shapes. With
+QUERY_BUDGET_STRICT it raises QueryBudgetExceeded instead, so a test or a dev
+server fails loudly.
+
+Tests can assert budgets directly:
+
+    with assert_query_budget(queries=15, repeats=3):
+        client.get(reverse('view_students'))
+
+    assert_view_budget(client, 'view_payment_status')   # budget from settings
+
+Queries made while a streamed response is consumed (CSV downloads) happen
+after the view returned and are not counted.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+
+# Limits per request: number of queries, milliseconds in the database, and
+# executions of any single query shape. None disables a limit.
+DEFAULT_QUERY_BUDGET = {
+    'queries': 50,
+    'db_ms': 500,
+    'repeats': 10,
+}
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"%s|\?")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """Shape of a query: the same statement with any values gives the same fingerprint."""
+    sql = _STRINGS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    sql = _PLACEHOLDERS.sub('?', sql)
+    sql = _LISTS.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class QueryStats:
+    """Execute wrapper collecting counts, time and (optionally) shapes of the queries it sees."""
+
+    def __init__(self, shapes=True):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.track_shapes = shapes
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            if self.track_shapes:
+                self.shapes[fingerprint(sql)] += 1
+
+    @property
+    def db_ms(self):
+        return self.seconds * 1000
+
+    def repeated(self, at_least=2):
+        """(shape, executions) for shapes run at least `at_least` times, most frequent first."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= at_least]
+
+    def violations(self, budget):
+        """Human-readable list of the limits in `budget` this request exceeded."""
+        found = []
+        if budget.get('queries') is not None and self.count > budget['queries']:
+            found.append(f"{self.count} queries (budget {budget['queries']})")
+        if budget.get('db_ms') is not None and self.db_ms > budget['db_ms']:
+            found.append(f"{self.db_ms:.0f} ms in the database (budget {budget['db_ms']})")
+        if budget.get('repeats') is not None:
+            for shape, n in self.repeated(budget['repeats'] + 1):
+                found.append(f"{n}x {shape[:200]} (budget {budget['repeats']})")
+        return found
+
+    def report(self, top=5):
+        lines = [f"{self.count} queries, {self.db_ms:.1f} ms"]
+        for shape, n in self.repeated()[:top]:
+            lines.append(f"  {n:>4}x {shape[:200]}")
+        return '\n'.join(lines)
+
+
+@contextmanager
+def record_queries(shapes=True):
+    """Collect QueryStats for every query run in this block, on all databases."""
+    stats = QueryStats(shapes)
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+        yield stats
+
+
+def budget_for(url_name):
+    """QUERY_BUDGET_DEFAULT overridden by QUERY_BUDGETS[url_name]."""
+    budget = dict(getattr(settings, 'QUERY_BUDGET_DEFAULT', DEFAULT_QUERY_BUDGET))
+    budget.update(getattr(settings, 'QUERY_BUDGETS', {}).get(url_name, {}))
+    return budget
+
+
+@contextmanager
+def assert_query_budget(queries=None, db_ms=None, repeats=None):
+    """Fail with a report of the repeated shapes if the block exceeds the given limits."""
+    with record_queries() as stats:
+        yield stats
+    problems = stats.violations({'queries': queries, 'db_ms': db_ms, 'repeats': repeats})
+    if problems:
+        raise QueryBudgetExceeded('Query budget exceeded: ' + '; '.join(problems) + '\n' + stats.report())
+
+
+def assert_view_budget(client, url_name, *args, method='get', data=None, **kwargs):
+    """Request the view named `url_name` with a test client and hold it to its configured budget."""
+    budget = budget_for(url_name)
+    with assert_query_budget(**budget):
+        response = getattr(client, method)(reverse(url_name, args=args, kwargs=kwargs), data)
+    return response
+
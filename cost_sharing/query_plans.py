@@ -0,0 +1,166 @@
+# cost_sharing/query_plans.py
+"""
+Registry of hot queries and the index each one is expected to use.
+
+Each entry builds the queryset a view runs on a busy path, with sample values
+taken from the database (or placeholders on an empty one - the plan does not
+depend on them). `python manage.py explain_hot_queries` prints the database's
+plan for every entry and checks that it names the entry's expected indexes,
+so a missing or unused index shows up straight away.
+"""
+from django.db import connection
+
+from .models import (
+    User, CostSharingAgreement, CostStructure, Department, Payment, StudentData, Notification, reference_key,
+)
+from .search import search_students
+
+HOT_QUERIES = []
+
+
+def hot_query(name, expected_index, uses=()):
+    """
+    Register a function returning the queryset for a hot lookup path.
+    `expected_index` describes the index for people; `uses` lists the
+    (model, field names) of the indexes the plan must use - an index whose
+    leading columns are those fields.
+    """
+    def register(build):
+        HOT_QUERIES.append({
+            'name': name,
+            'expected_index': expected_index,
+            'uses': list(uses),
+            'description': (build.__doc__ or '').strip(),
+            'build': build,
+        })
+        return build
+    return register
+
+
+def index_names(model, fields):
+    """Names of the indexes (unique constraints included) of `model` whose leading columns are `fields`."""
+    table = model._meta.db_table
+    columns = [model._meta.get_field(field).column for field in fields]
+    names = []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # Django's introspection leaves out the implicit sqlite_autoindex_* names
+            cursor.execute(f'PRAGMA index_list("{table}")')
+            for index in [row[1] for row in cursor.fetchall()]:
+                cursor.execute(f'PRAGMA index_info("{index}")')
+                indexed = [row[2] for row in sorted(cursor.fetchall())]
+                if indexed[:len(columns)] == columns:
+                    names.append(index)
+        else:
+            for index, details in connection.introspection.get_constraints(cursor, table).items():
+                if (details['index'] or details['unique']) and details['columns'][:len(columns)] == columns:
+                    names.append(index)
+    return names
+
+
+def unused_indexes(entry, plan):
+    """The expected indexes of `entry` (described as 'table(columns)') that `plan` does not name."""
+    missing = []
+    for model, fields in entry['uses']:
+        if not any(name in plan for name in index_names(model, fields)):
+            missing.append(f"{model._meta.db_table}({', '.join(fields)})")
+    return missing
+
+
+def _sample(queryset, field, default):
+    value = queryset.values_list(field, flat=True).first()
+    return default if value is None else value
+
+
+def _student_id():
+    return _sample(User.objects.filter(role='student'), 'id', 0)
+
+
+@hot_query('agreements_for_student_year', 'student, year', uses=[(CostSharingAgreement, ['student', 'year'])])
+def agreements_for_student_year():
+    """fill_cost_sharing: the student's agreements for their year of study."""
+    return CostSharingAgreement.objects.filter(student_id=_student_id(), year=1)
+
+
+@hot_query('accepted_agreement_for_student', 'student, status', uses=[(CostSharingAgreement, ['student', 'status'])])
+def accepted_agreement_for_student():
+    """make_payment / context processor: the student's accepted agreement."""
+    return CostSharingAgreement.objects.filter(
+        student_id=_student_id(), status=CostSharingAgreement.Status.ACCEPTED
+    ).order_by('-date_filled', '-id')
+
+
+@hot_query('pending_agreements', 'status, date_filled', uses=[(CostSharingAgreement, ['status', 'date_filled'])])
+def pending_agreements():
+    """Cost officer dashboard: pending agreements, newest first."""
+    return CostSharingAgreement.objects.filter(
+        status=CostSharingAgreement.Status.PENDING
+    ).order_by('-date_filled')[:10]
+
+
+@hot_query('assigned_students', 'assigned_to, created_at', uses=[(StudentData, ['assigned_to', 'created_at'])])
+def assigned_students():
+    """Cost officer assigned list: the officer's students, newest first."""
+    officer_id = _sample(User.objects.filter(role='cost_sharing_officer'), 'id', 0)
+    return StudentData.objects.filter(assigned_to_id=officer_id).order_by('-created_at')
+
+
+@hot_query('unread_notifications', 'recipient, created_at where unread',
+           uses=[(Notification, ['recipient', 'created_at'])])
+def unread_notifications():
+    """Navbar badge / dashboards: a user's latest unread notifications."""
+    user_id = _sample(User.objects.all(), 'id', 0)
+    return Notification.objects.filter(recipient_id=user_id, is_read=False).order_by('-created_at')[:5]
+
+
+@hot_query('agreement_payments', 'agreement, status', uses=[(Payment, ['agreement', 'status'])])
+def agreement_payments():
+    """get_total_paid(): valid payments of one agreement."""
+    agreement_id = _sample(CostSharingAgreement.objects.all(), 'id', 0)
+    return Payment.objects.filter(
+        agreement_id=agreement_id, status__in=['verified', 'completed', 'partial']
+    )
+
+
+@hot_query('cost_structure_lookup', 'department key (unique), then department_ref, year (unique)',
+           uses=[(Department, ['key']), (CostStructure, ['department_ref', 'year'])])
+def cost_structure_lookup():
+    """CostSharingAgreement.total_cost before the agreement is saved, and the cost structure API."""
+    department = _sample(CostStructure.objects.all(), 'department', '')
+    return CostStructure.objects.filter(department_ref__key=reference_key(department), year=1)
+
+
+@hot_query('cost_structure_by_department_ref', 'department_ref, year (unique)',
+           uses=[(CostStructure, ['department_ref', 'year'])])
+def cost_structure_by_department_ref():
+    """total_cost of saved agreements and the with_total_cost() subqueries."""
+    department_id = _sample(CostStructure.objects.all(), 'department_ref_id', 0)
+    return CostStructure.objects.filter(department_ref_id=department_id, year=1)
+
+
+@hot_query('payments_changes_feed', 'updated_at, id', uses=[(Payment, ['updated_at', 'id'])])
+def payments_changes_feed():
+    """Incremental payments feed page after a watermark."""
+    since = _sample(Payment.objects.order_by('updated_at'), 'updated_at', None)
+    queryset = Payment.objects.order_by('updated_at', 'id')
+    if since is not None:
+        queryset = queryset.filter(updated_at__gt=since)
+    return queryset[:1000]
+
+
+@hot_query('student_search', 'full-text index')
+def student_search():
+    """Student search API and the cost officer list search box."""
+    return search_students('abe')[:20]
+
+
+def explain_hot_queries(names=None):
+    """
+    Yield (entry, sql, plan) for each registered query, or only those in
+    `names`.
+    """
+    for entry in HOT_QUERIES:
+        if names and entry['name'] not in names:
+            continue
+        queryset = entry['build']()
+        yield entry, str(queryset.query), queryset.explain()
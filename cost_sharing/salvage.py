@@ -0,0 +1,362 @@
+# cost_sharing/salvage.py
+"""
+Salvage a damaged SQLite database into a fresh file.
+
+Unlike repair_database.py, which throws the data away, salvage_database()
+keeps every row SQLite can still read:
+
+1. `PRAGMA integrity_check` on the damaged file (opened read-only) says what
+   is wrong.
+2. The schema is recreated in a new file from the damaged file's
+   sqlite_master, or from the newest backup snapshot when that is unreadable.
+3. Each table is streamed in rowid order and bulk-inserted. When a read fails,
+   the reader skips ahead to the next rowid it can read (like the sqlite3
+   shell's `.recover`, it keeps going instead of stopping at the first bad
+   page) and records the skipped range. Rows that vanish from the scan
+   without an error are found by comparing the copied ids with the rowids
+   stored in the table's indexes.
+4. Indexes and triggers are created after the load, the full-text index is
+   rebuilt, AUTOINCREMENT counters are kept above every id ever handed out
+   (lost ids are not reused), and `PRAGMA foreign_key_check` lists rows whose
+   parent was lost.
+
+`python manage.py salvage_database` prints the resulting report.
+"""
+import os
+import sqlite3
+from pathlib import Path
+
+from .backup import SNAPSHOT_FILE, _remove, _sidecar, list_generations
+
+BATCH_SIZE = 5000
+MAX_ROWID = 2 ** 63 - 1
+INTEGRITY_MESSAGES = 100
+
+
+class SalvageError(Exception):
+    pass
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def open_damaged(path):
+    """Open the damaged file read-only, so salvaging never makes it worse."""
+    return sqlite3.connect(f'file:{Path(path).resolve()}?mode=ro', uri=True)
+
+
+def integrity_problems(connection, limit=INTEGRITY_MESSAGES):
+    """Messages from PRAGMA integrity_check; empty when the file is sound."""
+    try:
+        rows = connection.execute(f'PRAGMA integrity_check({limit})').fetchall()
+    except sqlite3.DatabaseError as e:
+        return [f'integrity_check failed: {e}']
+    messages = [line for row in rows for line in row[0].splitlines()]
+    return [] if messages == ['ok'] else messages
+
+
+def read_schema(connection):
+    """sqlite_master rows as (type, name, tbl_name, sql), tables first."""
+    rows = connection.execute(
+        "SELECT type, name, tbl_name, sql FROM sqlite_master WHERE sql IS NOT NULL"
+    ).fetchall()
+    order = {'table': 0, 'index': 1, 'view': 2, 'trigger': 3}
+    return sorted(rows, key=lambda row: order.get(row[0], 4))
+
+
+def _schema_with_fallback(damaged, schema_from, backup_dir):
+    try:
+        return read_schema(damaged), 'damaged database'
+    except sqlite3.DatabaseError:
+        pass
+    candidates = [Path(schema_from)] if schema_from else [
+        generation['path'] / SNAPSHOT_FILE for generation in reversed(list_generations(backup_dir))
+    ]
+    for candidate in candidates:
+        try:
+            source = open_damaged(candidate)
+            try:
+                return read_schema(source), str(candidate)
+            finally:
+                source.close()
+        except sqlite3.DatabaseError:
+            continue
+    raise SalvageError(
+        'The schema of the damaged database is unreadable and no usable backup snapshot was found; '
+        'pass --schema-from with a database that has the same schema.'
+    )
+
+
+def _virtual_tables(schema):
+    return {name: sql for kind, name, _, sql in schema
+            if kind == 'table' and sql.upper().startswith('CREATE VIRTUAL TABLE')}
+
+
+def _is_shadow(name, virtual_tables):
+    # fts5 keeps its data in <table>_data, <table>_idx, ... created with the virtual table
+    return any(name.startswith(f'{virtual}_') for virtual in virtual_tables)
+
+
+def _read_batch(source, table, after, limit):
+    return source.execute(
+        f'SELECT rowid, * FROM {_quote(table)} WHERE rowid > ? ORDER BY rowid LIMIT ?', (after, limit)
+    ).fetchall()
+
+
+def _readable_from(source, table, after):
+    """
+    First rowid after `after` that can be read again, found by probing further
+    and further ahead and then narrowing down. Returns (rowid or None when
+    nothing after `after` is readable, rows read at that point).
+    """
+    def probe(start):
+        try:
+            return _read_batch(source, table, start, 1)
+        except sqlite3.DatabaseError:
+            return None
+
+    step = 1
+    while after + step < MAX_ROWID and probe(after + step) is None:
+        step *= 2
+    if after + step >= MAX_ROWID:
+        return None, []
+    low, high = after + step // 2, after + step  # probe(low) failed (or low == after), probe(high) works
+    while high - low > 1:
+        middle = (low + high) // 2
+        if probe(middle) is None:
+            low = middle
+        else:
+            high = middle
+    rows = probe(high)
+    return (rows[0][0] if rows else None), rows
+
+
+def _read_until_error(source, table, after):
+    """Read row by row after a failed batch; return (rows, whether a read failed)."""
+    rows = []
+    while len(rows) < BATCH_SIZE:
+        try:
+            row = _read_batch(source, table, after, 1)
+        except sqlite3.DatabaseError:
+            return rows, True
+        if not row:
+            break
+        rows.extend(row)
+        after = row[0][0]
+    return rows, False
+
+
+def stream_rows(source, table, report):
+    """
+    Yield readable rows of `table` (rowid first) in batches, skipping damaged
+    stretches and recording them in report['gaps'] as (first, last) rowids;
+    last is None when nothing after first could be read.
+    """
+    after = 0
+    try:
+        first = source.execute(f'SELECT min(rowid) FROM {_quote(table)}').fetchone()[0]
+        after = (first or 1) - 1
+    except sqlite3.DatabaseError:
+        pass
+    while True:
+        try:
+            rows, failed = _read_batch(source, table, after, BATCH_SIZE), False
+        except sqlite3.DatabaseError:
+            rows, failed = _read_until_error(source, table, after)
+        if rows:
+            yield rows
+            after = rows[-1][0]
+        if not failed:
+            if len(rows) < BATCH_SIZE:
+                return
+            continue
+
+        report['errors'] += 1
+        resume, tail = _readable_from(source, table, after)
+        report['gaps'].append((after + 1, resume - 1 if resume else None))
+        if resume is None:
+            return
+        yield tail
+        after = resume
+
+
+def _copy_table(source, target, table, report):
+    columns = [row[1] for row in target.execute(f'PRAGMA table_info({_quote(table)})')]
+    try:
+        source_columns = [row[1] for row in source.execute(f'PRAGMA table_info({_quote(table)})')]
+    except sqlite3.DatabaseError:
+        source_columns = columns
+    shared = [column for column in source_columns if column in columns]
+    positions = [source_columns.index(column) + 1 for column in shared]  # +1: rowid comes first
+    placeholders = ', '.join('?' for _ in shared)
+    insert = (f'INSERT OR IGNORE INTO {_quote(table)} ({", ".join(_quote(c) for c in shared)}) '
+              f'VALUES ({placeholders})')
+
+    target.execute('BEGIN')
+    for rows in stream_rows(source, table, report):
+        if not rows:
+            continue
+        cursor = target.executemany(insert, [[row[i] for i in positions] for row in rows])
+        report['rows'] += cursor.rowcount
+        report['rejected'] += len(rows) - cursor.rowcount
+        report['max_rowid'] = max(report['max_rowid'], rows[-1][0])
+    target.execute('COMMIT')
+
+
+def _collapse(ids):
+    """[1, 2, 3, 7, 9, 10] -> [(1, 3), (7, 7), (9, 10)]"""
+    ranges = []
+    for value in ids:
+        if ranges and ranges[-1][1] == value - 1:
+            ranges[-1][1] = value
+        else:
+            ranges.append([value, value])
+    return [tuple(r) for r in ranges]
+
+
+def _check_against_indexes(source, target, table, report):
+    """
+    Rows can also drop out of a scan silently (a damaged page that still
+    parses). Every index on the table holds the rowids that existed, so
+    compare those with what was copied. Only for tables whose rowid is their
+    INTEGER PRIMARY KEY, since other rowids are not kept.
+    """
+    try:
+        indexes = [row[1] for row in source.execute(f'PRAGMA index_list({_quote(table)})')]
+    except sqlite3.DatabaseError:
+        return
+    target.execute('CREATE TEMP TABLE salvage_seen (id INTEGER PRIMARY KEY)')
+    try:
+        for index in indexes:
+            cursor = source.execute(f'SELECT rowid FROM {_quote(table)} INDEXED BY {_quote(index)}')
+            while True:
+                try:
+                    batch = cursor.fetchmany(BATCH_SIZE)
+                except sqlite3.DatabaseError:
+                    report['index_errors'] += 1
+                    break
+                if not batch:
+                    break
+                target.executemany('INSERT OR IGNORE INTO temp.salvage_seen (id) VALUES (?)', batch)
+        missing = [row[0] for row in target.execute(
+            f'SELECT id FROM temp.salvage_seen WHERE id NOT IN (SELECT rowid FROM main.{_quote(table)}) ORDER BY id'
+        )]
+    except sqlite3.DatabaseError:
+        missing = []
+    finally:
+        target.execute('DROP TABLE temp.salvage_seen')
+    report['missing'] = len(missing)
+    report['missing_ranges'] = _collapse(missing)
+    if missing:
+        report['max_rowid'] = max(report['max_rowid'], missing[-1])
+
+
+def _has_rowid_primary_key(connection, table):
+    columns = connection.execute(f'PRAGMA table_info({_quote(table)})').fetchall()
+    primary = [column for column in columns if column[5]]
+    return len(primary) == 1 and primary[0][2].upper() == 'INTEGER'
+
+
+def _raise_sequence(target, table, value):
+    cursor = target.execute('UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?', (value, table))
+    if not cursor.rowcount:
+        target.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table, value))
+
+
+def _old_sequences(source):
+    try:
+        return dict(source.execute('SELECT name, seq FROM sqlite_sequence').fetchall())
+    except sqlite3.DatabaseError:
+        return {}
+
+
+def salvage_database(damaged_path, output_path, schema_from=None, backup_dir=None, progress=None):
+    """
+    Copy every readable row of `damaged_path` into a new database at
+    `output_path`. Returns a report dict; `progress(table, report)` is called
+    after each table.
+    """
+    damaged_path, output_path = Path(damaged_path), Path(output_path)
+    if not damaged_path.exists():
+        raise SalvageError(f'{damaged_path} does not exist.')
+
+    source = open_damaged(damaged_path)
+    report = {
+        'integrity': integrity_problems(source),
+        'schema_source': None,
+        'tables': [],
+        'orphans': [],
+        'skipped_objects': [],
+        'output': output_path,
+    }
+    schema, report['schema_source'] = _schema_with_fallback(source, schema_from, backup_dir)
+    virtual_tables = _virtual_tables(schema)
+
+    partial = _sidecar(output_path, '.partial')
+    _remove(partial, _sidecar(partial, '-journal'))
+    target = sqlite3.connect(str(partial), isolation_level=None)
+    try:
+        target.execute('PRAGMA journal_mode = OFF')
+        target.execute('PRAGMA synchronous = OFF')
+        target.execute('PRAGMA foreign_keys = OFF')
+
+        tables = []
+        for kind, name, _, sql in schema:
+            if kind != 'table' or name.startswith('sqlite_') or _is_shadow(name, virtual_tables):
+                continue
+            target.execute(sql)
+            if name not in virtual_tables:
+                tables.append(name)
+
+        for table in tables:
+            table_report = {'table': table, 'rows': 0, 'rejected': 0, 'errors': 0, 'gaps': [],
+                            'missing': 0, 'missing_ranges': [], 'index_errors': 0, 'max_rowid': 0}
+            try:
+                _copy_table(source, target, table, table_report)
+                if _has_rowid_primary_key(target, table):
+                    _check_against_indexes(source, target, table, table_report)
+            except sqlite3.DatabaseError as e:
+                if target.in_transaction:
+                    target.execute('COMMIT')
+                table_report['errors'] += 1
+                table_report['gaps'].append((None, None))
+                table_report['failure'] = str(e)
+            report['tables'].append(table_report)
+            if progress:
+                progress(table, table_report)
+
+        # Indexes, views and triggers after the data: faster, and the full-text
+        # triggers do not fire for every copied row
+        for kind, name, _, sql in schema:
+            if kind == 'table' or name.startswith('sqlite_'):
+                continue
+            try:
+                target.execute(sql)
+            except sqlite3.DatabaseError as e:
+                report['skipped_objects'].append((kind, name, str(e)))
+
+        for name, sql in virtual_tables.items():
+            if 'fts5' in sql.lower() or 'fts4' in sql.lower():
+                target.execute(f"INSERT INTO {_quote(name)}({_quote(name)}) VALUES ('rebuild')")
+
+        # Never hand out an id that may still be referenced elsewhere
+        autoincrement = {name for kind, name, _, sql in schema
+                         if kind == 'table' and 'AUTOINCREMENT' in sql.upper()}
+        sequences = _old_sequences(source)
+        for table_report in report['tables']:
+            table = table_report['table']
+            if table in autoincrement:
+                gap_ends = [end for _, end in table_report['gaps'] if end]
+                _raise_sequence(target, table, max([table_report['max_rowid'], sequences.get(table, 0)] + gap_ends))
+
+        report['orphans'] = target.execute('PRAGMA foreign_key_check').fetchall()
+        problems = [row[0] for row in target.execute('PRAGMA quick_check').fetchall() if row[0] != 'ok']
+        if problems:
+            raise SalvageError(f'The salvaged database failed integrity_check: {problems[0]}')
+        target.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        target.close()
+        source.close()
+    os.replace(partial, output_path)
+    return report
@@ -0,0 +1,152 @@
+# cost_sharing/search.py
+"""
+Indexed student search.
+
+On SQLite, StudentData names, IDs, departments and faculties are mirrored into
+an FTS5 table (cost_sharing_studentdata_fts) that database triggers keep in
+sync on every insert, update and delete - including bulk_create() and
+queryset.update(). ensure_search_triggers() restores the triggers after
+migrations that rebuild the table. On PostgreSQL the same columns get pg_trgm
+GIN indexes, so the ILIKE filter is answered from the index. Both are created
+by migration 0008_student_search. Other databases fall back to a plain
+icontains filter.
+
+Every word of the query is matched as a prefix ("abe ke" finds
+"Abebe Kebede"), and results are ranked best match first.
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models import Q
+
+from .models import StudentData
+
+SEARCH_FIELDS = ['full_name', 'student_id', 'department', 'faculty']
+
+FTS_TABLE = 'cost_sharing_studentdata_fts'
+
+# bm25() column weights, in SEARCH_FIELDS order: an ID hit beats a name hit,
+# which beats a department/faculty hit
+FTS_WEIGHTS = '5.0, 10.0, 1.0, 1.0'
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def search_tokens(query):
+    """Split a user query into lowercase words ('UGR/1234' -> ['ugr', '1234'])."""
+    return [token.lower() for token in TOKEN_PATTERN.findall(query or '')]
+
+
+def fts_match_expression(tokens, fields=None):
+    """Build an FTS5 MATCH expression: every token as a prefix, all required."""
+    terms = ' '.join(f'"{token}"*' for token in tokens)
+    if fields:
+        return f"{{{' '.join(fields)}}} : ({terms})"
+    return terms
+
+
+def search_students(query, queryset=None, fields=None, ranked=True):
+    """
+    Filter a StudentData queryset down to students matching `query`.
+
+    `fields` limits the search to some of SEARCH_FIELDS (all by default).
+    With `ranked`, the result is ordered best match first and each row carries
+    a `search_rank` attribute (lower is better on SQLite, higher on
+    PostgreSQL); otherwise the queryset's own ordering is kept.
+    An empty query returns the queryset unchanged.
+    """
+    if queryset is None:
+        queryset = StudentData.objects.all()
+    fields = fields or SEARCH_FIELDS
+    tokens = search_tokens(query)
+    if not tokens:
+        return queryset
+
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        return _search_sqlite(queryset, tokens, fields, ranked)
+    if vendor == 'postgresql':
+        return _search_postgresql(queryset, tokens, fields, ranked)
+    return _search_fallback(queryset, tokens, fields)
+
+
+def _search_sqlite(queryset, tokens, fields, ranked):
+    table = StudentData._meta.db_table
+    queryset = queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[fts_match_expression(tokens, fields)],
+    )
+    if not ranked:
+        return queryset
+    return queryset.extra(
+        select={'search_rank': f'bm25({FTS_TABLE}, {FTS_WEIGHTS})'},
+    ).order_by('search_rank', 'id')
+
+
+def _search_postgresql(queryset, tokens, fields, ranked):
+    queryset = _search_fallback(queryset, tokens, fields)
+    if not ranked:
+        return queryset
+
+    from django.contrib.postgres.search import TrigramWordSimilarity
+    from django.db.models.functions import Greatest
+
+    query = ' '.join(tokens)
+    similarities = [TrigramWordSimilarity(query, field) for field in fields]
+    rank = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+    return queryset.annotate(search_rank=rank).order_by('-search_rank', 'id')
+
+
+def _search_fallback(queryset, tokens, fields):
+    # Every token must appear in at least one of the fields
+    for token in tokens:
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': token})
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+def rebuild_search_index(using='default'):
+    """Repopulate the SQLite FTS table from StudentData (no-op elsewhere)."""
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _sqlite_triggers():
+    table = StudentData._meta.db_table
+    columns = ', '.join(SEARCH_FIELDS)
+    new_values = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+    old_values = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+    delete_old = (f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+                  f"VALUES ('delete', old.id, {old_values});")
+    insert_new = f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});"
+    return {
+        f'{FTS_TABLE}_ai': f"AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f'{FTS_TABLE}_ad': f"AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f'{FTS_TABLE}_au': f"AFTER UPDATE OF {columns} ON {table} BEGIN {delete_old} {insert_new} END",
+    }
+
+
+def ensure_search_triggers(using='default', **kwargs):
+    """
+    post_migrate handler. SQLite migrations that alter StudentData rebuild the
+    table, which silently drops its triggers; put them back and reindex.
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE not in existing:
+            return
+        missing = {name: body for name, body in _sqlite_triggers().items() if name not in existing}
+        for name, body in missing.items():
+            cursor.execute(f"CREATE TRIGGER {name} {body}")
+    if missing:
+        rebuild_search_index(using)
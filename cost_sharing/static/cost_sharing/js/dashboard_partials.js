@@ -0,0 +1,58 @@
+// Progressive dashboard loading (views.dashboard_partial)
+//
+// The registrar and cost sharing officer dashboards are served as a shell;
+// every element with a data-partial-url is filled with the HTML of that
+// section, all sections loading in parallel. The browser revalidates a
+// section with the ETag of its last response, so an unchanged section comes
+// back as 304 Not Modified. Pagination links inside a section reload only
+// that section. A "partial:loaded" event bubbles up from each filled element.
+
+(function() {
+    function load(container, url) {
+        container.setAttribute('aria-busy', 'true');
+        return fetch(url, {credentials: 'same-origin', headers: {'X-Requested-With': 'XMLHttpRequest'}})
+            .then(response => {
+                // A redirect is the login page after the session expired
+                if (!response.ok || response.redirected) {
+                    throw new Error(`${url}: ${response.status}`);
+                }
+                return response.text();
+            })
+            .then(html => {
+                container.innerHTML = html;
+                container.dispatchEvent(new CustomEvent('partial:loaded', {bubbles: true}));
+                return true;
+            })
+            .catch(error => {
+                console.error('Error loading dashboard section:', error);
+                container.innerHTML = `
+                    <div class="alert alert-warning">
+                        <i class="fas fa-exclamation-triangle me-2"></i>
+                        This section could not be loaded. <a href="">Reload the page</a> to try again.
+                    </div>
+                `;
+                return false;
+            })
+            .finally(() => container.removeAttribute('aria-busy'));
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        document.querySelectorAll('[data-partial-url]').forEach(container => {
+            load(container, container.dataset.partialUrl);
+
+            container.addEventListener('click', function(e) {
+                const link = e.target.closest('a.page-link');
+                if (!link) return;
+                e.preventDefault();
+                const target = new URL(link.href, window.location.href);
+                const url = container.dataset.partialUrl.split('?')[0] + target.search;
+                load(container, url).then(loaded => {
+                    if (!loaded) return;
+                    container.dataset.partialUrl = url;
+                    // Keep the page in the address bar, so a reload shows the same page
+                    history.replaceState(null, '', target.search + target.hash);
+                });
+            });
+        });
+    });
+})();
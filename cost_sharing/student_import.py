@@ -0,0 +1,190 @@
+# cost_sharing/student_import.py
+"""
+Column-oriented validation for registrar student CSV uploads.
+
+The whole file is loaded into one list per column and every check runs over
+those arrays in a single pass, so a dry run reports every problem in the file
+at once without touching the database except for read-only lookups of the
+file's student IDs. The import itself (views.upload_student_data) reads the
+file through the same load_columns(), so both see the same header names and
+values.
+"""
+import csv
+import re
+from collections import Counter
+
+from django.utils import timezone
+
+from .models import User, StudentData
+
+REQUIRED_COLUMNS = ['Full Name', 'Student ID']
+EXPECTED_COLUMNS = [
+    'Full Name', 'Student ID', 'Sex', 'Region', 'Woreda', 'Phone Number',
+    'Faculty', 'Year of Entrance', 'Department', 'Academic Year',
+    'Mother Name', 'Mother Phone',
+]
+PHONE_COLUMNS = ['Phone Number', 'Mother Phone']
+VALID_SEX_VALUES = {'M', 'F', 'MALE', 'FEMALE'}
+PHONE_PATTERN = re.compile(r'^09[0-9]{8}$')
+MIN_YEAR = 1990
+
+# First data row in the file is row 2 (row 1 is the header), same numbering
+# as the error messages produced by the real import.
+FIRST_ROW_NUMBER = 2
+# Student IDs per `IN (...)` lookup, below every backend's parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+def load_columns(csv_file):
+    """
+    Read an uploaded CSV file into a dict of column name -> list of stripped
+    string values. Missing cells become ''.
+    """
+    lines = csv_file.read().decode('utf-8-sig').splitlines()
+    reader = csv.reader(lines)
+    header = [name.strip() for name in next(reader, [])]
+    columns = {name: [] for name in header}
+    width = len(header)
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        row = row[:width] + [''] * (width - len(row))
+        for name, cell in zip(header, row):
+            columns[name].append(cell.strip())
+
+    return columns
+
+
+def iter_rows(columns):
+    """Yield (row number, {column name: value}) for each row of load_columns() output."""
+    names = list(columns)
+    for index, values in enumerate(zip(*columns.values())):
+        yield index + FIRST_ROW_NUMBER, dict(zip(names, values))
+
+
+def existing_student_ids(student_ids):
+    """
+    Split `student_ids` into those already used as a StudentData.student_id
+    and those already taken as a username. Looks them up LOOKUP_CHUNK_SIZE
+    at a time instead of loading every existing ID.
+    """
+    student_ids = sorted(set(student_ids))
+    taken_student_ids = set()
+    taken_usernames = set()
+    for start in range(0, len(student_ids), LOOKUP_CHUNK_SIZE):
+        chunk = student_ids[start:start + LOOKUP_CHUNK_SIZE]
+        taken_student_ids.update(
+            StudentData.objects.filter(student_id__in=chunk).values_list('student_id', flat=True))
+        taken_usernames.update(User.objects.filter(username__in=chunk).values_list('username', flat=True))
+    return taken_student_ids, taken_usernames
+
+
+def _column(columns, name, row_count):
+    return columns.get(name) or [''] * row_count
+
+
+def _parse_years(values):
+    """Return a list of ints (or None where the value is blank or not a number)."""
+    parsed = []
+    for value in values:
+        try:
+            parsed.append(int(value))
+        except (TypeError, ValueError):
+            parsed.append(None)
+    return parsed
+
+
+def validate_student_columns(columns):
+    """
+    Validate column arrays produced by load_columns().
+
+    Returns a report dict with the row count, the list of errors
+    ({'row', 'column', 'value', 'message'}), per-column error counts and the
+    number of rows that would import cleanly.
+    """
+    row_count = max((len(values) for values in columns.values()), default=0)
+    errors = []
+
+    def add_error(index, column, value, message):
+        errors.append({
+            'row': index + FIRST_ROW_NUMBER,
+            'column': column,
+            'value': value,
+            'message': message,
+        })
+
+    missing_columns = [name for name in EXPECTED_COLUMNS if name not in columns]
+
+    # Required fields
+    for name in REQUIRED_COLUMNS:
+        for index, value in enumerate(_column(columns, name, row_count)):
+            if not value:
+                add_error(index, name, value, f"Missing '{name}'")
+
+    # Sex
+    for index, value in enumerate(_column(columns, 'Sex', row_count)):
+        if value.upper() not in VALID_SEX_VALUES:
+            add_error(index, 'Sex', value, "Sex must be M or F")
+
+    # Phone format (optional columns, validated only when filled in)
+    for name in PHONE_COLUMNS:
+        for index, value in enumerate(_column(columns, name, row_count)):
+            if value and not PHONE_PATTERN.match(''.join(filter(str.isdigit, value))):
+                add_error(index, name, value, 'Phone number must be 10 digits starting with 09')
+
+    # Year ranges
+    current_year = timezone.now().year
+    raw_entrance = _column(columns, 'Year of Entrance', row_count)
+    raw_academic = _column(columns, 'Academic Year', row_count)
+    entrance_years = _parse_years(raw_entrance)
+    academic_years = _parse_years(raw_academic)
+
+    for index, (entrance, academic) in enumerate(zip(entrance_years, academic_years)):
+        if entrance is None:
+            add_error(index, 'Year of Entrance', raw_entrance[index], 'Year of Entrance must be a number')
+        elif not MIN_YEAR <= entrance <= current_year:
+            add_error(index, 'Year of Entrance', raw_entrance[index],
+                      f'Year of Entrance must be between {MIN_YEAR} and {current_year}')
+
+        if academic is None:
+            add_error(index, 'Academic Year', raw_academic[index], 'Academic Year must be a number')
+        elif not MIN_YEAR <= academic <= current_year + 1:
+            add_error(index, 'Academic Year', raw_academic[index],
+                      f'Academic Year must be between {MIN_YEAR} and {current_year + 1}')
+        elif entrance is not None and academic < entrance:
+            add_error(index, 'Academic Year', raw_academic[index],
+                      'Academic Year cannot be before Year of Entrance')
+
+    # Duplicate IDs within the file
+    student_ids = _column(columns, 'Student ID', row_count)
+    id_counts = Counter(sid for sid in student_ids if sid)
+    for index, sid in enumerate(student_ids):
+        if sid and id_counts[sid] > 1:
+            add_error(index, 'Student ID', sid, f"Student ID '{sid}' appears {id_counts[sid]} times in this file")
+
+    # Duplicate IDs against the database
+    taken_student_ids, taken_usernames = existing_student_ids(id_counts)
+
+    for index, sid in enumerate(student_ids):
+        if sid in taken_student_ids:
+            add_error(index, 'Student ID', sid, f"Student ID '{sid}' already exists")
+        elif sid in taken_usernames:
+            add_error(index, 'Student ID', sid, f"Username '{sid}' already exists")
+
+    errors.sort(key=lambda error: error['row'])
+    rows_with_errors = {error['row'] for error in errors}
+
+    return {
+        'row_count': row_count,
+        'valid_count': row_count - len(rows_with_errors),
+        'invalid_count': len(rows_with_errors),
+        'missing_columns': missing_columns,
+        'errors': errors,
+        'errors_by_column': dict(Counter(error['column'] for error in errors).most_common()),
+    }
+
+
+def validate_student_csv(csv_file):
+    """Dry-run entry point: load an uploaded CSV into columns and validate it."""
+    return validate_student_columns(load_columns(csv_file))
@@ -0,0 +1,282 @@
+import hashlib
+import io
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import backup
+from .dataset import generate_dataset
+from .models import User, StudentData
+from .query_budget import assert_view_budget
+from .salvage import salvage_database
+from .student_import import validate_student_csv
+
+DASHBOARD_ROLES = ['student', 'registrar_officer', 'cost_sharing_officer', 'inland_revenue_officer', 'admin']
+DASHBOARD_PARTIALS = {
+    'registrar_officer': ['stats', 'students', 'notices'],
+    'cost_sharing_officer': ['stats', 'activity', 'students', 'notices'],
+}
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardQueryBudgetTests(TestCase):
+    """
+    The dashboards and their partials stay within their query budgets
+    (QUERY_BUDGET_DEFAULT / QUERY_BUDGETS) with a cold cache and a warm one,
+    on a generated dataset big enough for an N+1 loop to show.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset(students=200, seed=1, notifications_per_student=2, progress=lambda message: None)
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self, role):
+        self.client.force_login(User.objects.filter(role=role).order_by('pk').first())
+
+    def test_dashboards(self):
+        for role in DASHBOARD_ROLES:
+            with self.subTest(role=role):
+                self.login(role)
+                for _ in ('cold', 'warm'):
+                    response = assert_view_budget(self.client, 'dashboard')
+                    self.assertEqual(response.status_code, 200)
+
+    def test_dashboard_partials(self):
+        for role, sections in DASHBOARD_PARTIALS.items():
+            self.login(role)
+            for section in sections:
+                with self.subTest(role=role, section=section):
+                    for _ in ('cold', 'warm'):
+                        response = assert_view_budget(self.client, 'dashboard_partial', section=section)
+                        self.assertEqual(response.status_code, 200)
+
+
+class SQLiteFileTestCase(SimpleTestCase):
+    """Works on plain SQLite files in a temporary directory, not the test database."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def names(self, path):
+        connection = sqlite3.connect(path)
+        try:
+            return [row[0] for row in connection.execute('SELECT name FROM item ORDER BY id')]
+        finally:
+            connection.close()
+
+
+class BackupRestoreTests(SQLiteFileTestCase):
+    """
+    Snapshot, WAL shipping across a checkpoint and point-in-time restore, with
+    a clock that moves one minute per shipment so --until can fall between
+    commits.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.db_path = self.directory / 'db.sqlite3'
+        self.root = self.directory / 'backups'
+        self.clock = datetime(2026, 10, 19, 8, 0, tzinfo=timezone.utc)
+        clock = mock.patch.object(backup, 'now', lambda: self.clock)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+        # Like the application with the shipper running: only the shipper checkpoints
+        self.writer = sqlite3.connect(self.db_path, isolation_level=None)
+        self.addCleanup(self.writer.close)
+        self.writer.execute('PRAGMA journal_mode = WAL')
+        self.writer.execute('PRAGMA wal_autocheckpoint = 0')
+        self.writer.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT NOT NULL)')
+        self.shipper = backup.WalShipper(self.db_path, self.root).open()
+        self.addCleanup(self.shipper.close)
+
+    def commit(self, name):
+        self.writer.execute('INSERT INTO item (name) VALUES (?)', (name,))
+
+    def ship(self, **kwargs):
+        """Ship one minute later than the last shipment; return (summary, time shipped)."""
+        self.clock += timedelta(minutes=1)
+        return self.shipper.ship(**kwargs), self.clock
+
+    def test_restore_between_commits_across_epochs(self):
+        self.commit('a')
+        self.clock += timedelta(minutes=1)
+        self.shipper.start_generation()
+        self.commit('b')
+        self.ship()
+        # Second segment of the epoch: its checksums continue from the first one
+        self.commit('c')
+        summary, after_c = self.ship(checkpoint_bytes=1)
+        self.assertTrue(summary['checkpointed'])
+        self.commit('d')
+        summary, after_d = self.ship()
+        self.assertEqual((summary['epoch'], summary['new_generation']), (2, False))
+        self.commit('e')
+        self.ship()
+
+        [generation] = backup.list_generations(self.root)
+        self.assertEqual([len(epoch['segments']) for epoch in generation['epochs']], [3, 2])
+
+        cases = [
+            (None, ['a', 'b', 'c', 'd', 'e']),
+            (after_d, ['a', 'b', 'c', 'd']),
+            (after_d - timedelta(seconds=30), ['a', 'b', 'c']),
+            (after_c - timedelta(seconds=30), ['a', 'b']),
+        ]
+        for until, expected in cases:
+            with self.subTest(until=until):
+                target = self.directory / 'restored.sqlite3'
+                name, restored_to = backup.restore(target, until=until, root=self.root)
+                self.assertEqual(name, generation['name'])
+                self.assertEqual(self.names(target), expected)
+
+    def test_restore_command_until(self):
+        self.clock += timedelta(minutes=1)
+        self.shipper.start_generation()
+        self.commit('a')
+        _, after_a = self.ship()
+        self.commit('b')
+        self.ship()
+
+        target = self.directory / 'restored.sqlite3'
+        call_command('sqlite_backup', 'restore', '--dir', str(self.root), '--output', str(target),
+                     '--until', (after_a + timedelta(seconds=30)).isoformat(), stdout=io.StringIO())
+        self.assertEqual(self.names(target), ['a'])
+
+    def test_checkpoint_outside_the_shipper_starts_a_new_generation(self):
+        self.clock += timedelta(minutes=1)
+        self.shipper.start_generation()
+        self.commit('a')
+        self.ship()
+        # Frames reach the database file without being shipped
+        self.commit('b')
+        self.writer.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.commit('c')
+        summary, _ = self.ship()
+        self.assertTrue(summary['new_generation'])
+
+        self.assertEqual(len(backup.list_generations(self.root)), 2)
+        target = self.directory / 'restored.sqlite3'
+        backup.restore(target, root=self.root)
+        self.assertEqual(self.names(target), ['a', 'b', 'c'])
+
+
+class SalvageTests(SQLiteFileTestCase):
+    """salvage_database() keeps the readable rows of a file with a damaged page."""
+
+    PAGE_SIZE = 1024
+    ROWS = 1000
+
+    def setUp(self):
+        super().setUp()
+        self.damaged = self.directory / 'damaged.sqlite3'
+        connection = sqlite3.connect(self.damaged)
+        connection.execute(f'PRAGMA page_size = {self.PAGE_SIZE}')
+        connection.execute('CREATE TABLE item (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL)')
+        connection.executemany('INSERT INTO item (name) VALUES (?)',
+                               [(f'item {i:04d} ' + 'x' * 80,) for i in range(self.ROWS)])
+        # Created after the rows, so the table's pages come first in the file
+        connection.execute('CREATE INDEX item_name ON item (name)')
+        connection.commit()
+        connection.close()
+        # Overwrite the header of a leaf page in the middle of the table
+        with open(self.damaged, 'r+b') as fh:
+            fh.seek(40 * self.PAGE_SIZE)
+            fh.write(b'\xff' * 64)
+
+    def test_salvage_skips_the_damaged_page(self):
+        before = hashlib.sha256(self.damaged.read_bytes()).hexdigest()
+        output = self.directory / 'salvaged.sqlite3'
+        report = salvage_database(self.damaged, output)
+
+        self.assertTrue(report['integrity'])
+        [table] = report['tables']
+        self.assertEqual(table['errors'], 1)
+        [(first, last)] = table['gaps']
+        self.assertEqual(table['missing_ranges'], [(first, last)])
+        self.assertEqual(table['rows'] + table['missing'], self.ROWS)
+        self.assertEqual(hashlib.sha256(self.damaged.read_bytes()).hexdigest(), before)
+
+        connection = sqlite3.connect(output)
+        try:
+            self.assertEqual(connection.execute('PRAGMA integrity_check').fetchone()[0], 'ok')
+            ids = [row[0] for row in connection.execute('SELECT id FROM item ORDER BY id')]
+            self.assertEqual(ids, [i for i in range(1, self.ROWS + 1) if not first <= i <= last])
+            # The index was recreated, and lost ids are never handed out again
+            self.assertEqual(connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchone()[0],
+                             'item_name')
+            self.assertEqual(connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'item'").fetchone()[0],
+                             self.ROWS)
+        finally:
+            connection.close()
+
+
+class StudentImportDryRunTests(TestCase):
+    """validate_student_csv() reports every problem in an upload without writing anything."""
+
+    HEADER = ('Full Name,Student ID,Sex,Region,Woreda,Phone Number,Faculty,Year of Entrance,'
+              'Department,Academic Year,Mother Name,Mother Phone')
+
+    @classmethod
+    def setUpTestData(cls):
+        student = User.objects.create(username='taken-student', role='student')
+        StudentData.objects.create(
+            user=student, full_name='Existing Student', student_id='STU-1', sex='M', region='Amhara',
+            woreda='Bahir Dar', phone_number='0911000000', faculty='Engineering', year_of_entrance=2022,
+            department='Civil', academic_year=2024, mother_name='Mother', mother_phone='0911000001',
+        )
+        User.objects.create(username='STU-2', role='student')
+
+    def validate(self, *rows):
+        return validate_student_csv(io.BytesIO('\n'.join((self.HEADER,) + rows).encode('utf-8-sig')))
+
+    def test_reports_every_problem_by_row(self):
+        report = self.validate(
+            'Abebe Kebede,STU-10,M,Amhara,Gondar,0911223344,Engineering,2022,Civil,2024,Almaz,0911223345',
+            ',STU-11,X,Amhara,Gondar,12345,Engineering,2024,Civil,2023,Almaz,',
+            'Sara Tesfaye,STU-1,F,Oromia,Adama,,Health,2022,Nursing,2024,Hana,',
+            'Lulit Alemu,STU-2,F,Oromia,Adama,,Health,abc,Nursing,2024,Hana,',
+            'Dawit Girma,STU-12,M,Tigray,Mekelle,,Law,2023,Law,2024,Mulu,',
+            'Dawit Girma,STU-12,M,Tigray,Mekelle,,Law,2023,Law,2024,Mulu,',
+        )
+
+        self.assertEqual((report['row_count'], report['valid_count'], report['invalid_count']), (6, 1, 5))
+        self.assertEqual(report['missing_columns'], [])
+        messages = {(error['row'], error['column'], error['message']) for error in report['errors']}
+        self.assertEqual(messages, {
+            (3, 'Full Name', "Missing 'Full Name'"),
+            (3, 'Sex', 'Sex must be M or F'),
+            (3, 'Phone Number', 'Phone number must be 10 digits starting with 09'),
+            (3, 'Academic Year', 'Academic Year cannot be before Year of Entrance'),
+            (4, 'Student ID', "Student ID 'STU-1' already exists"),
+            (5, 'Year of Entrance', 'Year of Entrance must be a number'),
+            (5, 'Student ID', "Username 'STU-2' already exists"),
+            (6, 'Student ID', "Student ID 'STU-12' appears 2 times in this file"),
+            (7, 'Student ID', "Student ID 'STU-12' appears 2 times in this file"),
+        })
+        self.assertEqual(report['errors_by_column']['Student ID'], 4)
+
+    def test_reads_bom_padded_headers_and_missing_columns(self):
+        report = validate_student_csv(io.BytesIO(
+            ' Full Name , Student ID ,Sex\nAbebe Kebede,STU-10,M\n,,\n'.encode('utf-8-sig')))
+
+        self.assertEqual(report['row_count'], 1)
+        self.assertIn('Year of Entrance', report['missing_columns'])
+        self.assertNotIn('Full Name', report['missing_columns'])
+        self.assertEqual({error['column'] for error in report['errors']}, {'Year of Entrance', 'Academic Year'})
+
+    def test_writes_nothing(self):
+        with self.assertNumQueries(2):
+            self.validate('Abebe Kebede,STU-10,M,Amhara,Gondar,0911223344,Engineering,2022,Civil,2024,Almaz,')
+        self.assertFalse(StudentData.objects.filter(student_id='STU-10').exists())
@@ -10,6 +10,7 @@ urlpatterns = [
     path('reset-password/<str:uidb64>/<str:token>/', views.reset_password, name='reset_password'),
     path('logout/', views.logout_view, name='logout'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/partials/<slug:section>/', views.dashboard_partial, name='dashboard_partial'),
     
     # Admin URLs
     path('create-user/', views.create_user, name='create_user'),
@@ -64,6 +65,13 @@ urlpatterns = [
     
     # Report URLs
     path('generate-report/', views.generate_report, name='generate_report'),
+    path('exports/', views.export_jobs, name='export_jobs'),
+    path('exports/<int:pk>/download/', views.download_export, name='download_export'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('profiles/', views.profiles, name='profiles'),
+    path('profiles/<str:profile_id>.<str:kind>', views.download_profile, name='download_profile'),
+    path('api/students/search/', views.student_search_api, name='student_search_api'),
+    path('api/changes/<str:feed>/', views.changes_feed, name='changes_feed'),
     path('update-account/', views.update_account, name='update_account'),
     path('change-password/', views.change_password, name='change_password'),
     path('view-bank-accounts/', views.view_bank_accounts, name='view_bank_accounts'),
@@ -94,6 +102,7 @@ urlpatterns = [
     path('registrar/students/<str:student_id>/edit/', views.edit_student, name='edit_student'),
     path('agreement/<int:pk>/print/', views.print_agreement, name='print_agreement'),
     path('cost-officer/agreement/<int:pk>/', views.cost_officer_agreement_detail, name='cost_officer_agreement_detail'),
+    path('cost-officer/agreements/pending/', views.cost_officer_pending_agreements, name='cost_officer_pending_agreements'),
     path('upload-students-to-cost-officer/', views.upload_students_to_cost_officer, name='upload_students_to_cost_officer'),
     path('assign-students-to-cost-officer/', views.upload_students_to_cost_officer, name='upload_students_to_cost_officer'),
     path('cost-officer/assigned/', views.cost_officer_assigned_list, name='cost_officer_assigned_list'),
@@ -1,6 +1,8 @@
 import io
-import csv
+import os
+import hmac
 import json
+import logging
 import random
 import datetime
 import traceback
@@ -10,15 +12,15 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.utils import timezone
-from django.db import models 
-from django.contrib.auth import get_user_model
-from django.http import HttpResponse, JsonResponse, FileResponse
+from django.db import connection, models 
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404
 from django.core.paginator import Paginator
 from django.db.models import Q, Sum
 from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.contrib.auth.tokens import default_token_generator
 from django.core.mail import send_mail
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.http import url_has_allowed_host_and_scheme, urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -30,15 +32,25 @@ from reportlab.lib import colors
 
 from .models import (
     User, CostSharingAgreement, CostStructure, Payment, Notice, Feedback, 
-    StudentData, BankAccount, Notification
+    StudentData, BankAccount, Notification, ExportJob, Department, Faculty, with_total_cost, with_payment_totals, reference_key,
 )
 from django.conf import settings
+from . import changes, exports, metrics, profiling
+from . import dashboard as fragments
+from .cache import dashboard_counts_cache, dashboard_payments_cache, dashboard_students_cache, notice_cache
+from .db_router import replica_reads
+from .log import debug_enabled
+from .export_jobs import request_export
+from .search import search_students
+from .student_import import existing_student_ids, iter_rows, load_columns, validate_student_csv
 from .forms import (
     CustomUserCreationForm, UserUpdateForm, CostSharingForm, CostStructureForm, 
     PaymentForm, StudentPaymentForm, PaymentVerificationForm, NoticeForm, 
     FeedbackForm, StudentDataForm, BankAccountForm, AdminUserUpdateForm
 )
 
+logger = logging.getLogger(__name__)
+
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
@@ -458,303 +470,278 @@ def reset_password(request, uidb64, token):
 # =============================================================================
 # DASHBOARD & ACCOUNT MANAGEMENT
 # =============================================================================
-@login_required
-def dashboard(request):
-    user = request.user
-
-    # Ensure superusers have admin role
-    if user.is_superuser and not user.role:
-        user.role = 'admin'
-        user.save()
-
-    current_year = get_current_academic_year()
-
-    # Initialize variables for registrar officer
-    students_uploaded = 0
-    students_without_agreements_count = 0
-    students_with_agreements = 0
-    compliance_rate = 0
-    recent_students = []
-    all_students = StudentData.objects.none()
-    departments = []
-    selected_department = None
-
-    # Base querysets
-    agreements_qs = CostSharingAgreement.objects.none()
-    cost_structures_qs = CostStructure.objects.all()
-    
+def _dashboard_base_context(role):
+    """
+    Context every dashboard shares. Querysets are lazy already; values that
+    would query up front are wrapped in fragments.lazy(), so a dashboard
+    only runs the queries its template actually uses.
+    """
     # Handle feedback status field
     if _model_has_field(Feedback, 'status'):
-        pending_feedback_qs = Feedback.objects.filter(status__iexact='pending')
+        pending_feedback_qs = Feedback.objects.filter(status='pending')
     else:
         pending_feedback_qs = Feedback.objects.filter()
 
-    # Get user role and notices
-    role = getattr(user, 'role', None)
-    try:
-        active_notices = get_notices_for_role(role)
-    except NameError:
-        active_notices = list(Notice.objects.filter(is_active=True).order_by('-created_at')[:10])
-
     # Get accepted agreements
-    accepted_agreements_qs = CostSharingAgreement.objects.filter(status__iexact='accepted')
+    accepted_agreements_qs = CostSharingAgreement.objects.filter(status=CostSharingAgreement.Status.ACCEPTED)
     if _model_has_field(CostSharingAgreement, 'date_accepted'):
         accepted_agreements_qs = accepted_agreements_qs.order_by('-date_accepted')
-    accepted_agreements_qs = accepted_agreements_qs[:5]
-
-    # Base statistics
-    total_users = User.objects.count()
-    total_agreements = CostSharingAgreement.objects.count()
-    total_payments = Payment.objects.count()
-    total_bank_accounts = BankAccount.objects.count()
-    recent_users = User.objects.all().order_by('-date_joined')[:5]
-    recent_feedbacks = Feedback.objects.all().order_by('-date_submitted')[:5]
 
-    # Base context shared by all roles
-    base_context = {
-        'agreements': agreements_qs,
-        'cost_structures': cost_structures_qs,
+    return {
+        'agreements': CostSharingAgreement.objects.none(),
+        'cost_structures': CostStructure.objects.all(),
         'pending_feedback': pending_feedback_qs,
-        'active_notices': active_notices,
-        'accepted_agreements': accepted_agreements_qs,
-        'total_users': total_users,
-        'total_agreements': total_agreements,
-        'total_payments': total_payments,
-        'total_bank_accounts': total_bank_accounts,
-        'recent_users': recent_users,
-        'recent_feedbacks': recent_feedbacks,
-        'current_year': current_year,
+        'active_notices': fragments.lazy(lambda: get_notices_for_role(role)),
+        'accepted_agreements': accepted_agreements_qs[:5],
+        # Site-wide statistics, from the shared cache (cost_sharing/dashboard.py)
+        **fragments.lazy_fragment(
+            fragments.overview_counts, role,
+            'total_users', 'total_agreements', 'total_payments', 'total_bank_accounts',
+        ),
+        'current_year': get_current_academic_year(),
     }
 
-    # Admin role
-    if role == 'admin' or user.is_superuser:
-        return render(request, 'dashboard_admin.html', base_context)
 
-    # Cost sharing officer role
-    if role == 'cost_sharing_officer':
-        pending_qs = CostSharingAgreement.objects.filter(status__iexact='pending')
-        if _model_has_field(CostSharingAgreement, 'date_filled'):
-            pending_qs = pending_qs.order_by('-date_filled')
-        
-        # Get assigned students
-        assigned_students = StudentData.objects.all().order_by('-created_at')
-        
-        # Find students with agreements
-        all_agreements = CostSharingAgreement.objects.all()
-        students_with_agreements_from_relations = all_agreements.exclude(
-            student__isnull=True
-        ).values_list('student__student_id', flat=True).distinct()
-        
-        agreement_full_names = all_agreements.values_list('full_name', flat=True).distinct()
-        students_with_matching_names = StudentData.objects.filter(
-            full_name__in=agreement_full_names
-        ).values_list('student_id', flat=True)
-        
-        students_with_agreements_ids = list(students_with_agreements_from_relations) + list(students_with_matching_names)
-        students_with_agreements_ids = list(filter(None, students_with_agreements_ids))
-        students_with_agreements_ids = list(set(students_with_agreements_ids))
-        
-        # Mark students with agreements
-        for student in assigned_students:
-            student.has_agreement = student.student_id in students_with_agreements_ids
-        
-        context = {
-            **base_context,
-            'agreements': pending_qs,
-            'assigned_students': assigned_students,
-        }
-        return render(request, 'dashboard_cost_sharing_officer.html', context)
+def _admin_dashboard_context(request, role):
+    return {
+        **_dashboard_base_context(role),
+        **fragments.lazy_fragment(fragments.recent_activity, role, 'recent_users', 'recent_feedbacks'),
+    }
+
+
+def _pending_agreements():
+    pending_qs = CostSharingAgreement.objects.filter(status=CostSharingAgreement.Status.PENDING)
+    if _model_has_field(CostSharingAgreement, 'date_filled'):
+        pending_qs = pending_qs.order_by('-date_filled')
+    return pending_qs
+
+
+def _accepted_agreements():
+    accepted_qs = CostSharingAgreement.objects.filter(status=CostSharingAgreement.Status.ACCEPTED)
+    if _model_has_field(CostSharingAgreement, 'date_accepted'):
+        accepted_qs = accepted_qs.order_by('-date_accepted')
+    return accepted_qs
+
+
+def _cost_sharing_officer_dashboard_context(request, role):
+    # The shell: statistics, agreements, students and notices are partials
+    return _dashboard_base_context(role)
+
+
+def _cost_sharing_officer_stats_context(request, role):
+    return {
+        'agreements': _pending_agreements(),
+        'accepted_agreements': _accepted_agreements(),
+        'assigned_students': StudentData.objects.all(),
+        'active_notices': fragments.lazy(lambda: get_notices_for_role(role)),
+    }
+
+
+# Pending agreements on the dashboard; the rest are on cost_officer_pending_agreements
+DASHBOARD_PENDING_AGREEMENTS = 20
+
+
+def _cost_sharing_officer_activity_context(request, role):
+    return {
+        'agreements': with_total_cost(_pending_agreements().select_related('student'))[:DASHBOARD_PENDING_AGREEMENTS],
+        'accepted_agreements': with_total_cost(_accepted_agreements().select_related('student'))[:5],
+    }
+
+
+def _cost_sharing_officer_students_context(request, role):
+    paginator = Paginator(StudentData.objects.all().order_by('-created_at'), 25)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    # Mark students with agreements
+    students_with_agreements_ids = fragments.agreement_student_ids(role)
+    for student in page_obj:
+        student.has_agreement = student.student_id in students_with_agreements_ids
+
+    return {
+        'assigned_students': page_obj,
+        'page_range': paginator.get_elided_page_range(page_obj.number),
+    }
+
+
+def _registrar_officer_dashboard_context(request, role):
+    # The shell: statistics, notices and the student table are partials
+    return {
+        **_dashboard_base_context(role),
+        'departments': fragments.lazy(Department.cached_names),
+        'selected_department': request.GET.get('department'),
+        'cost_officers': User.objects.filter(role='cost_sharing_officer', is_active=True),
+    }
+
+
+def _registrar_officer_stats_context(request, role):
+    return fragments.lazy_fragment(
+        fragments.registrar_statistics, role,
+        'students_uploaded', 'students_with_agreements', 'students_without_agreements_count', 'compliance_rate',
+    )
+
+
+def _registrar_officer_students_context(request, role):
+    all_students = StudentData.objects.select_related('user', 'assigned_to').order_by('-created_at')
+
+    # Department filtering
+    department_filter = request.GET.get('department')
+    if department_filter:
+        all_students = all_students.filter(department_ref__name=department_filter)
+
+    # Pagination
+    paginator = Paginator(all_students, 10)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    return {
+        'all_students': page_obj,
+        'page_range': paginator.get_elided_page_range(page_obj.number),
+        'selected_department': department_filter,
+        'students_with_agreements_ids': fragments.lazy(lambda: fragments.agreement_student_ids(role)),
+    }
+
+
+def _notices_partial_context(request, role):
+    return {'notices': fragments.lazy(lambda: get_notices_for_role(role)[:5])}
+
+
+def _inland_revenue_officer_dashboard_context(request, role):
+    totals = fragments.lazy_fragment(fragments.graduate_payment_totals, role, 'student_totals', 'total_collected')
+    graduate_count = fragments.lazy(lambda: len(totals['student_totals']()))
+    return {
+        **_dashboard_base_context(role),
+        **totals,
+        'payments': Payment.objects.all(),
+        'total_students': graduate_count,
+        'graduate_students_count': graduate_count,
+    }
+
+
+def _student_dashboard_context(request, role):
+    user = request.user
+    current_year = get_current_academic_year()
+
+    agreements = CostSharingAgreement.objects.filter(student=user)
+    # Listed with their cost, total paid and balance: annotated, not one query per row
+    non_rejected_agreements = with_payment_totals(agreements.exclude(status=CostSharingAgreement.Status.REJECTED))
+    approved_agreements = agreements.filter(status=CostSharingAgreement.Status.ACCEPTED)
+    pending_agreements = agreements.filter(status=CostSharingAgreement.Status.PENDING)
+
+    payments = Payment.objects.filter(agreement__student=user)
+    bank_accounts = BankAccount.objects.all()
+
+    context = {
+        **_dashboard_base_context(role),
+        'agreements': agreements,
+        'non_rejected_agreements': non_rejected_agreements,
+        'approved_agreements': approved_agreements,
+        'pending_agreements': pending_agreements,
+        'active_agreement': fragments.lazy(lambda: non_rejected_agreements.filter(
+            status__in=[CostSharingAgreement.Status.ACCEPTED, CostSharingAgreement.Status.PENDING]
+        ).first()),
+        'recent_payments': payments.order_by('-date_paid')[:5],
+        'all_payments': payments.order_by('-date_paid'),
+        'payments': payments,
+        'feedbacks': Feedback.objects.filter(student=user),
+        'bank_accounts': bank_accounts,
+        'notices': Notice.objects.filter(is_active=True).order_by('-created_at')[:5],
+        'current_academic_year': f"{current_year}-{current_year + 1}",
+
+        'has_agreements': fragments.lazy(agreements.exists),
+        'has_approved_agreements': fragments.lazy(approved_agreements.exists),
+        'has_pending_agreements': fragments.lazy(pending_agreements.exists),
+        'has_payments': fragments.lazy(payments.exists),
+        'has_bank_accounts': fragments.lazy(bank_accounts.exists),
+    }
+
+    if debug_enabled(logger):
+        logger.debug('Student dashboard', extra={
+            'agreements': agreements.count(),
+            'approved': approved_agreements.count(),
+            'pending': pending_agreements.count(),
+            'payments': payments.count(),
+        })
+    return context
+
+
+# Template and context provider of each role's dashboard
+DASHBOARD_CONTEXTS = {
+    'admin': ('dashboard_admin.html', _admin_dashboard_context),
+    'cost_sharing_officer': ('dashboard_cost_sharing_officer.html', _cost_sharing_officer_dashboard_context),
+    'registrar_officer': ('dashboard_registrar_officer.html', _registrar_officer_dashboard_context),
+    'inland_revenue_officer': ('dashboard_inland_revenue_officer.html', _inland_revenue_officer_dashboard_context),
+    'student': ('dashboard_student.html', _student_dashboard_context),
+}
+
+
+# Sections of the progressively loaded dashboards, by role and name: template,
+# context provider, and the cache namespaces whose invalidation (a save to
+# one of their models) changes the section's ETag
+DASHBOARD_PARTIALS = {
+    ('registrar_officer', 'stats'): (
+        'dashboard/registrar_officer_stats.html', _registrar_officer_stats_context, (dashboard_students_cache,),
+    ),
+    ('registrar_officer', 'students'): (
+        'dashboard/registrar_officer_students.html', _registrar_officer_students_context,
+        (dashboard_students_cache, dashboard_counts_cache),
+    ),
+    ('registrar_officer', 'notices'): ('dashboard/notices.html', _notices_partial_context, (notice_cache,)),
+    ('cost_sharing_officer', 'stats'): (
+        'dashboard/cost_sharing_officer_stats.html', _cost_sharing_officer_stats_context,
+        (dashboard_students_cache, notice_cache),
+    ),
+    ('cost_sharing_officer', 'activity'): (
+        'dashboard/cost_sharing_officer_activity.html', _cost_sharing_officer_activity_context,
+        (dashboard_payments_cache, dashboard_counts_cache),
+    ),
+    ('cost_sharing_officer', 'students'): (
+        'dashboard/cost_sharing_officer_students.html', _cost_sharing_officer_students_context,
+        (dashboard_students_cache,),
+    ),
+    ('cost_sharing_officer', 'notices'): ('dashboard/notices.html', _notices_partial_context, (notice_cache,)),
+}
 
-    # Registrar officer role
-    if role == 'registrar_officer':
-        students_uploaded = StudentData.objects.count()
-        all_agreements = CostSharingAgreement.objects.all()
-        
-        # Find students with agreements
-        students_with_agreements_from_relations = all_agreements.exclude(
-            student__isnull=True
-        ).values_list('student__student_id', flat=True).distinct()
-        
-        agreement_full_names = all_agreements.values_list('full_name', flat=True).distinct()
-        students_with_matching_names = StudentData.objects.filter(
-            full_name__in=agreement_full_names
-        ).values_list('student_id', flat=True)
-        
-        students_with_agreements_ids = list(students_with_agreements_from_relations) + list(students_with_matching_names)
-        students_with_agreements_ids = list(filter(None, students_with_agreements_ids))
-        students_with_agreements_ids = list(set(students_with_agreements_ids))
-        
-        # Calculate statistics
-        students_without_agreements_count = StudentData.objects.exclude(
-            student_id__in=students_with_agreements_ids
-        ).count()
-        
-        students_with_agreements = students_uploaded - students_without_agreements_count
-        
-        if students_uploaded > 0:
-            compliance_rate = (students_with_agreements / students_uploaded) * 100
-        
-        recent_students = StudentData.objects.all().order_by('-created_at')[:5]
-        all_students = StudentData.objects.all().order_by('-created_at')
-        
-        # Mark students with agreements
-        for student in all_students:
-            student.has_agreement = student.student_id in students_with_agreements_ids
-        
-        # Department filtering
-        department_filter = request.GET.get('department')
-        if department_filter:
-            all_students = all_students.filter(department__icontains=department_filter)
-        
-        # Pagination
-        paginator = Paginator(all_students, 10)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
-        
-        departments = StudentData.objects.values_list('department', flat=True).distinct()
-        cost_officers = User.objects.filter(role='cost_sharing_officer', is_active=True)
-        
-        context = {
-            **base_context,
-            'students_uploaded': students_uploaded,
-            'students_without_agreements_count': students_without_agreements_count,
-            'students_with_agreements': students_with_agreements,
-            'compliance_rate': compliance_rate,
-            'recent_students': recent_students,
-            'all_students': page_obj,
-            'departments': departments,
-            'selected_department': department_filter,
-            'cost_officers': cost_officers,
-            'students_with_agreements_ids': students_with_agreements_ids,
-        }
-        return render(request, 'dashboard_registrar_officer.html', context)
 
-    # Inland revenue officer role
-    if role == 'inland_revenue_officer':
-        # Get graduate students
-        graduate_students = StudentData.objects.filter(is_graduate=True)
-        
-        # Calculate totals for each graduate student
-        student_totals = []
-        
-        for student_data in graduate_students:
-            # Find all agreements for this student
-            agreements = CostSharingAgreement.objects.filter(
-                Q(student__student_id=student_data.student_id) | 
-                Q(full_name=student_data.full_name)
-            )
-            
-            # Calculate totals across ALL agreements
-            total_cost_all = 0
-            total_paid_all = 0
-            
-            for agreement in agreements:
-                # Add agreement cost
-                if hasattr(agreement, 'total_cost') and agreement.total_cost:
-                    total_cost_all += float(agreement.total_cost)
-                
-                # Add payments for this agreement
-                payments = Payment.objects.filter(agreement=agreement)
-                agreement_paid = payments.aggregate(total=Sum('amount_paid'))['total'] or 0
-                total_paid_all += float(agreement_paid)
-            
-            # Calculate remaining balance
-            remaining_balance_all = total_cost_all - total_paid_all
-            
-            # Determine payment status
-            if total_cost_all > 0:
-                if remaining_balance_all <= 0:
-                    payment_status = 'Paid'
-                    status_class = 'bg-success'
-                elif total_paid_all > 0:
-                    payment_status = 'Partial'
-                    status_class = 'bg-warning'
-                else:
-                    payment_status = 'Unpaid'
-                    status_class = 'bg-danger'
-            else:
-                payment_status = 'No Agreement'
-                status_class = 'bg-secondary'
-            
-            student_totals.append({
-                'student_id': student_data.student_id,
-                'full_name': student_data.full_name,
-                'department': student_data.department,
-                'total_cost_all': total_cost_all,
-                'total_paid_all': total_paid_all,
-                'remaining_balance_all': remaining_balance_all,
-                'payment_status': payment_status,
-                'status_class': status_class,
-                'agreement_count': agreements.count(),
-                'has_agreement': agreements.exists(),
-                'is_graduate': student_data.is_graduate,
-            })
-        
-        # Get payment statistics
-        payments = Payment.objects.all()
-        total_collected = payments.filter(status__in=['partial','verified','completed']).aggregate(
-            total=Sum('amount_paid')
-        )['total'] or 0
-        
-        context = {
-            **base_context,
-            'student_totals': student_totals,
-            'payments': payments,
-            'total_collected': total_collected,
-            'total_students': len(student_totals),
-            'graduate_students_count': len(student_totals),
-        }
-        return render(request, 'dashboard_inland_revenue_officer.html', context)
-
-    # Student role
-    if role == 'student':
-        agreements = CostSharingAgreement.objects.filter(student=user)
-        
-        non_rejected_agreements = agreements.exclude(status='rejected')
-        approved_agreements = agreements.filter(status='approved')
-        pending_agreements = agreements.filter(status='pending')
-        active_agreement = non_rejected_agreements.filter(status__in=['approved', 'pending']).first()
-        
-        payments = Payment.objects.filter(agreement__student=user)
-        recent_payments = payments.order_by('-date_paid')[:5]
-        all_payments = payments.order_by('-date_paid')
-        bank_accounts = BankAccount.objects.all()
-        notices = Notice.objects.filter(is_active=True).order_by('-created_at')[:5]
-        
-        context = {
-            **base_context,
-            'agreements': agreements,
-            'non_rejected_agreements': non_rejected_agreements,
-            'approved_agreements': approved_agreements,
-            'pending_agreements': pending_agreements,
-            'active_agreement': active_agreement,
-            'recent_payments': recent_payments,
-            'all_payments': all_payments,
-            'payments': payments,
-            'feedbacks': Feedback.objects.filter(student=user),
-            'bank_accounts': bank_accounts,
-            'notices': notices,
-            'current_academic_year': f"{current_year}-{current_year + 1}",
-            
-            'has_agreements': agreements.exists(),
-            'has_approved_agreements': approved_agreements.exists(),
-            'has_pending_agreements': pending_agreements.exists(),
-            'has_payments': payments.exists(),
-            'has_bank_accounts': bank_accounts.exists(),
-        }
-        
-        # Debug logging
-        print(f"🎯 DEBUG for student {user.username}:")
-        print(f"   - Agreements: {agreements.count()}")
-        print(f"   - Approved: {approved_agreements.count()}")
-        print(f"   - Pending: {pending_agreements.count()}")
-        print(f"   - Payments: {payments.count()}")
-        print(f"   - Bank accounts: {bank_accounts.count()}")
-        
-        return render(request, 'dashboard_student.html', context)
-    
-    # Fallback for unrecognized roles
-    return render(request, 'dashboard_base.html', base_context)
+@login_required
+@replica_reads
+def dashboard(request):
+    user = request.user
+
+    # Ensure superusers have admin role
+    if user.is_superuser and not user.role:
+        user.role = 'admin'
+        user.save()
+
+    role = getattr(user, 'role', None)
+    provider = DASHBOARD_CONTEXTS.get('admin' if user.is_superuser else role)
+    if provider is None:
+        # Fallback for unrecognized roles
+        return render(request, 'dashboard_base.html', _dashboard_base_context(role))
+    template_name, context = provider
+    return render(request, template_name, context(request, role))
+
+
+@login_required
+@replica_reads
+def dashboard_partial(request, section):
+    """
+    One section of the registrar or cost sharing officer dashboard, fetched
+    by the dashboard page after it has loaded. The response carries an ETag
+    (dashboard.partial_etag()) and is revalidated on every load, so an
+    unchanged section costs a 304.
+    """
+    role = getattr(request.user, 'role', None)
+    partial = DASHBOARD_PARTIALS.get((role, section))
+    if partial is None:
+        raise Http404('No such dashboard section.')
+    template_name, context, namespaces = partial
+
+    etag = fragments.partial_etag(role, request.get_full_path(), *namespaces)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render(request, template_name, context(request, role))
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 @login_required
 def update_account(request):
     if request.method == 'POST':
@@ -907,10 +894,6 @@ def clear_all_data(request):
 def fill_cost_sharing(request):
     current_year = timezone.now().year
     
-    print(f"=== DEBUG: User: {request.user}, Year: {current_year} ===")
-    print(f"=== DEBUG: User Department: {getattr(request.user, 'department', 'None')} ===")
-    print(f"=== DEBUG: User Year of Study: {getattr(request.user, 'year_of_study', 'None')} ===")
-    
     # Check if student has required information from registrar
     student_department = getattr(request.user, 'department', None)
     student_year_of_study = getattr(request.user, 'year_of_study', None)
@@ -936,18 +919,17 @@ def fill_cost_sharing(request):
         year=student_year_of_study  # Changed from academic_year to year
     )
     
-    print(f"=== DEBUG: Found {existing_agreements.count()} existing agreements for Year {student_year_of_study} ===")
-    for agreement in existing_agreements:
-        print(f"  - Agreement {agreement.id}: Status={agreement.status}, Year={agreement.year}")
+    if debug_enabled(logger):
+        logger.debug(
+            'Existing agreements for year of study %s: %s', student_year_of_study,
+            list(existing_agreements.values_list('id', 'status')),
+        )
     
     # Find rejected agreement for resubmission
-    rejected_agreement = existing_agreements.filter(status='rejected').first()
+    rejected_agreement = existing_agreements.filter(status=CostSharingAgreement.Status.REJECTED).first()
     
     # Check for non-rejected agreements (pending or approved)
-    non_rejected_agreement = existing_agreements.exclude(status='rejected').first()
-    
-    print(f"=== DEBUG: Rejected agreement: {rejected_agreement} ===")
-    print(f"=== DEBUG: Non-rejected agreement: {non_rejected_agreement} ===")
+    non_rejected_agreement = existing_agreements.exclude(status=CostSharingAgreement.Status.REJECTED).first()
     
     # ✅ CHANGED: Block if there's a pending or approved agreement for THIS YEAR OF STUDY
     if non_rejected_agreement:
@@ -965,53 +947,45 @@ def fill_cost_sharing(request):
     
     # Check if there are any cost structures available for student's department and year
     cost_structures_exist = CostStructure.objects.filter(
-        department=student_department,
+        department_ref__key=reference_key(student_department),
         year=student_year_of_study
     ).exists()
     
-    print(f"=== DEBUG: Cost structures exist for {student_department} year {student_year_of_study}: {cost_structures_exist} ===")
+    logger.debug(
+        'Cost structures for %s year %s: %s', student_department, student_year_of_study, cost_structures_exist,
+        extra={'rejected_agreement': getattr(rejected_agreement, 'pk', None)},
+    )
     
     if request.method == 'POST':
-        print("=== DEBUG: POST REQUEST RECEIVED ===")
-        print("POST data keys:", list(request.POST.keys()))
-        print("FILES data:", dict(request.FILES))
-        
-        # Debug: Print phone numbers and dates for validation
-        print(f"=== DEBUG: Phone number: {request.POST.get('phone_number', 'Not provided')} ===")
-        print(f"=== DEBUG: Mother phone: {request.POST.get('mother_phone', 'Not provided')} ===")
-        print(f"=== DEBUG: Date of birth: {request.POST.get('date_of_birth', 'Not provided')} ===")
-        print(f"=== DEBUG: Year of entrance: {request.POST.get('year_of_entrance', 'Not provided')} ===")
+        # Field names only: the values are personal data
+        logger.debug(
+            '%s submitted', 'Resubmission' if rejected_agreement else 'New agreement',
+            extra={'fields': sorted(request.POST.keys()), 'files': sorted(request.FILES.keys())},
+        )
         
         # If editing a rejected agreement, pass the instance
         if rejected_agreement:
-            print("=== DEBUG: Processing RESUBMISSION ===")
             form = CostSharingForm(request.POST, request.FILES, instance=rejected_agreement, user=request.user)
         else:
-            print("=== DEBUG: Processing NEW SUBMISSION ===")
             form = CostSharingForm(request.POST, request.FILES, user=request.user)
             
         if form.is_valid():
-            print("=== DEBUG: FORM IS VALID ===")
             try:
                 agreement = form.save(commit=False)
                 
                 # Only set student for NEW submissions
                 if not rejected_agreement:
                     agreement.student = request.user
-                    print("=== DEBUG: Set student for new agreement ===")
-                else:
-                    print("=== DEBUG: Using existing student for resubmission ===")
                 
-                agreement.status = 'pending'  # Reset status to pending
+                agreement.status = CostSharingAgreement.Status.PENDING  # Reset status to pending
                 agreement.academic_year = current_year  # Current calendar year for reporting
                 agreement.year = student_year_of_study  # Student's year of study for restrictions
                 
-                print(f"=== DEBUG: Saving agreement - Student: {agreement.student}, Department: {agreement.department}, Year of Study: {agreement.year} ===")
-                print(f"=== DEBUG: Academic Year: {agreement.academic_year}, Status: {agreement.status} ===")
-                
                 agreement.save()
-                print("=== DEBUG: Agreement saved successfully! ===")
-                print(f"=== DEBUG: Agreement ID: {agreement.id} ===")
+                logger.info(
+                    'Agreement %s %s for year of study %s', agreement.id,
+                    'resubmitted' if rejected_agreement else 'submitted', student_year_of_study,
+                )
                 
                 # Create notification for cost sharing officers
                 officers = User.objects.filter(role='cost_sharing_officer')
@@ -1040,20 +1014,17 @@ def fill_cost_sharing(request):
                     f'Cost sharing agreement {action} successfully for Year {student_year_of_study}. '
                     'It will be reviewed by the Cost Sharing Officer.'
                 )
-                print("=== DEBUG: Redirecting to dashboard ===")
                 return redirect('dashboard')
                 
             except Exception as e:
-                print(f"=== DEBUG: Error saving agreement: {str(e)} ===")
-                import traceback
-                print(f"=== DEBUG: Traceback: {traceback.format_exc()} ===")
+                logger.exception('Error saving agreement')
+                if metrics.is_lock_error(e):
+                    metrics.record_lock_error(request)
                 messages.error(request, f'Error saving agreement: {str(e)}')
         else:
-            print("=== DEBUG: FORM INVALID ===")
-            print("Form errors:", form.errors.as_json())
+            logger.info('Agreement form invalid', extra={'fields': sorted(form.errors)})
             for field, errors in form.errors.items():
                 for error in errors:
-                    print(f"  - {field}: {error}")
                     messages.error(request, f'{field}: {error}')
             
             # Show specific guidance for common errors
@@ -1069,13 +1040,9 @@ def fill_cost_sharing(request):
     else:
         # If editing a rejected agreement, prefill the form
         if rejected_agreement:
-            print("=== DEBUG: Loading form with rejected agreement data ===")
             form = CostSharingForm(instance=rejected_agreement, user=request.user)
         else:
             form = CostSharingForm(user=request.user)
-        
-        # Debug initial form data
-        print(f"=== DEBUG: Form initial data: {form.initial} ===")
     
     context = {
         'form': form,
@@ -1086,9 +1053,6 @@ def fill_cost_sharing(request):
         'student_department': student_department,
         'student_year_of_study': student_year_of_study
     }
-    print(f"=== DEBUG: Context - is_resubmission: {context['is_resubmission']} ===")
-    print(f"=== DEBUG: Context - student_department: {context['student_department']} ===")
-    print(f"=== DEBUG: Context - student_year_of_study: {context['student_year_of_study']} ===")
     return render(request, 'fill_cost_sharing.html', context)
 
 @login_required
@@ -1114,7 +1078,7 @@ def agreement_set_status(request, pk, status):
 
     s = (status or '').lower()
     if s in ('accept', 'accepted'):
-        ag.status = 'accepted'
+        ag.status = CostSharingAgreement.Status.ACCEPTED
         ag.save()
         create_notification(
             recipient=ag.student,
@@ -1126,7 +1090,7 @@ def agreement_set_status(request, pk, status):
         )
         messages.success(request, 'Agreement accepted.')
     elif s in ('reject', 'rejected'):
-        ag.status = 'rejected'
+        ag.status = CostSharingAgreement.Status.REJECTED
         ag.date_accepted = timezone.now()  # Set current date/time
         ag.save()
         create_notification(
@@ -1170,7 +1134,7 @@ def get_cost_structure(request):
     
     try:
         cost_structure = CostStructure.objects.get(
-            department=department,
+            department_ref__key=reference_key(department),
             year=int(year)
         )
         
@@ -1204,9 +1168,10 @@ def create_or_update_cost_structure(request):
         
         # Get or create cost structure
         cost_structure, created = CostStructure.objects.get_or_create(
-            department=data['department'],
+            department_ref__key=reference_key(data['department']),
             year=int(data['year']),
             defaults={
+                'department': data['department'],
                 'education_cost': data['education_cost'],
                 'food_cost': data['food_cost'],
                 'dormitory_cost': data['dormitory_cost'],
@@ -1238,8 +1203,7 @@ def create_or_update_cost_structure(request):
 
 def get_available_departments(request):
     """Get available departments for cost structure"""
-    departments = CostStructure.objects.values_list('department', flat=True).distinct()
-    return JsonResponse({'departments': list(departments)})
+    return JsonResponse({'departments': Department.cached_names()})
 
 def manage_cost_structure(request):
     """View to manage cost structures"""
@@ -1307,7 +1271,7 @@ def get_cost_data(request):
         # Convert year to integer and get cost structure
         year_int = int(year)
         cost_structure = CostStructure.objects.filter(
-            department=department,
+            department_ref__key=reference_key(department),
             year=year_int
         ).first()
         
@@ -1346,17 +1310,12 @@ def make_payment(request):
     Virtual payment: only if the student's latest accepted cost sharing agreement
     has is_graduate=True. Uses StudentData.virtual_balance as the available balance.
     """
-    print("🔍 DEBUG: Starting make_payment view")
-    print(f"🔍 User: {request.user.username}, Role: {request.user.role}")
-    
     # Get active agreement
     active_agreement = CostSharingAgreement.objects.filter(
         student=request.user,
-        status__iexact='accepted'
+        status=CostSharingAgreement.Status.ACCEPTED
     ).order_by('-date_filled', '-id').first()
 
-    print(f"🔍 Active agreement found: {active_agreement}")
-    
     if not active_agreement:
         messages.error(request, 'No accepted cost sharing agreement found.')
         return redirect('dashboard')
@@ -1376,7 +1335,6 @@ def make_payment(request):
         return redirect('dashboard')
 
     virtual_balance = Decimal(getattr(student_data, 'virtual_balance') or 0)
-    print(f"🔍 Virtual balance: {virtual_balance}")
 
     # Calculate payment summary for active agreement
     total_paid = Payment.objects.filter(
@@ -1385,7 +1343,10 @@ def make_payment(request):
     ).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0')
     
     remaining_balance = Decimal(active_agreement.total_cost) - Decimal(total_paid)
-    print(f"🔍 Agreement {active_agreement.id}: Total cost={active_agreement.total_cost}, Paid={total_paid}, Remaining={remaining_balance}")
+    logger.debug(
+        'Agreement %s: total cost %s, paid %s, remaining %s, virtual balance %s',
+        active_agreement.id, active_agreement.total_cost, total_paid, remaining_balance, virtual_balance,
+    )
 
     # Calculate ALL agreements summary
     all_agreements = CostSharingAgreement.objects.filter(student=request.user)
@@ -1410,23 +1371,14 @@ def make_payment(request):
     all_agreements_count = all_agreements.count()
     total_payments_count = Payment.objects.filter(agreement__student=request.user).count()
 
-    print(f"🔍 POST request: {request.method == 'POST'}")
-    
     if request.method == 'POST':
-        print(f"🔍 POST data: {dict(request.POST)}")
-        
         # Get amount from form
         amount_raw = request.POST.get('amount_paid')
-        agreement_id = request.POST.get('agreement')
-        description = request.POST.get('description', '')
-        
-        print(f"🔍 Amount from form: {amount_raw}")
-        print(f"🔍 Agreement ID from form: {agreement_id}")
-        
+
         try:
             amount = Decimal(amount_raw or 0)
-        except Exception as e:
-            print(f"❌ Error converting amount: {e}")
+        except Exception:
+            logger.info('Invalid payment amount %r', amount_raw)
             messages.error(request, f'Invalid payment amount: {amount_raw}')
             return redirect('make_payment')
 
@@ -1443,12 +1395,8 @@ def make_payment(request):
             messages.error(request, f'Payment exceeds remaining agreement balance (ETB {remaining_balance}).')
             return redirect('make_payment')
 
-        print(f"🔍 Validation passed. Processing payment of ETB {amount}")
-
         try:
             with transaction.atomic():
-                print("🔍 Starting transaction...")
-                
                 # ✅ FIXED: Create Payment record with payer field
                 payment = Payment.objects.create(
                     agreement=active_agreement,
@@ -1459,13 +1407,13 @@ def make_payment(request):
                     date_paid=timezone.now(),
                 )
                 
-                print(f"✅ Payment saved with ID: {payment.id}")
-
                 # Deduct virtual balance
-                print(f"🔍 Deducting from virtual balance: {virtual_balance} - {amount}")
                 student_data.virtual_balance = virtual_balance - amount
                 student_data.save()
-                print(f"✅ Virtual balance updated: {student_data.virtual_balance}")
+                logger.info(
+                    'Payment %s of ETB %s recorded for agreement %s; virtual balance now %s',
+                    payment.id, amount, active_agreement.id, student_data.virtual_balance,
+                )
 
                 # Create notification
                 create_notification(
@@ -1476,28 +1424,25 @@ def make_payment(request):
                     related_object_id=payment.id,
                     related_object_type='payment'
                 )
-                print("✅ Notification created")
                 
                 messages.success(request, f'Payment of ETB {amount} recorded successfully!')
-                print("✅ Success message set")
                 
                 return redirect('payment_history')
                 
         except Exception as exc:
-            print(f"❌ Error processing payment: {str(exc)}")
-            import traceback
-            print(f"❌ Traceback: {traceback.format_exc()}")
+            logger.exception('Error processing payment for agreement %s', active_agreement.id)
+            if metrics.is_lock_error(exc):
+                metrics.record_lock_error(request)
             messages.error(request, f'Failed to process payment: {str(exc)}')
             return redirect('make_payment')
 
     # GET request - prepare context
-    print("🔍 Preparing GET request context")
     
     context = {
         'active_agreement': active_agreement,
         'active_agreements': CostSharingAgreement.objects.filter(
             student=request.user,
-            status__iexact='accepted'
+            status=CostSharingAgreement.Status.ACCEPTED
         ).order_by('-date_filled'),
         'total_paid': total_paid,
         'remaining_balance': remaining_balance,
@@ -1517,8 +1462,6 @@ def make_payment(request):
         'all_agreements_count': all_agreements_count,
         'total_payments_count': total_payments_count,
     }
-    
-    print(f"🔍 Context prepared. Rendering template...")
     return render(request, 'make_payment.html', context)
 @login_required
 @user_passes_test(is_inland_revenue_officer)
@@ -1659,6 +1602,8 @@ def verify_payment(request, pk):
 
             except Exception as exc:
                 print(f"❌ Error while verifying payment: {exc}")
+                if metrics.is_lock_error(exc):
+                    metrics.record_lock_error(request)
                 messages.error(request, f'Failed to update payment: {exc}')
                 return redirect('manage_payments')
 
@@ -1679,21 +1624,13 @@ def payment_history(request):
     # Get ALL agreements for this student
     all_agreements = CostSharingAgreement.objects.filter(student=request.user)
     
-    # DEBUG: Show all agreements
-    print(f"🔍 DEBUG for student {request.user.username}:")
-    print(f"   - Total agreements found: {all_agreements.count()}")
-    
     # Calculate total cost from ALL agreements
     total_cost = Decimal('0')
     for agreement in all_agreements:
         if hasattr(agreement, 'total_cost') and agreement.total_cost:
             total_cost += Decimal(str(agreement.total_cost))
-            print(f"   - Agreement {agreement.id}: total_cost = {agreement.total_cost}")
         elif hasattr(agreement, 'total') and agreement.total:
             total_cost += Decimal(str(agreement.total))
-            print(f"   - Agreement {agreement.id}: total = {agreement.total}")
-    
-    print(f"   - SUM of all agreements: {total_cost}")
     
     # Calculate total paid from ALL agreements
     total_paid = Decimal('0')
@@ -1712,16 +1649,14 @@ def payment_history(request):
         
         # Total = completed + verified + partial
         total_paid = completed_total + verified_total + partial_total
-        
-        print(f"   - Completed payments: {completed_total}")
-        print(f"   - Verified payments: {verified_total}")
-        print(f"   - Partial payments: {partial_total}")
-        print(f"   - TOTAL PAID: {total_paid}")
-    else:
-        print("   - No payments found")
+        logger.debug(
+            'Paid: completed %s, verified %s, partial %s, total %s',
+            completed_total, verified_total, partial_total, total_paid,
+        )
     
     # Calculate remaining balance
     remaining_balance = total_cost - total_paid
+    logger.debug('Total cost %s, remaining %s', total_cost, remaining_balance)
     
     # Create agreement summaries for template
     agreement_summaries = []
@@ -1861,6 +1796,7 @@ def generate_payment_receipt(payment):
 
 @login_required
 @user_passes_test(is_inland_revenue_officer)
+@replica_reads
 def view_payment_status(request):
     """Show ONLY GRADUATE students with their TOTAL payment status"""
     # Get only graduate students from StudentData
@@ -1989,7 +1925,6 @@ def bank_account_transactions(request, account_id):
         'transactions': page_obj,
     })
 
-import csv
 @login_required
 @user_passes_test(is_cost_sharing_officer)
 def cost_officer_assigned_list(request):
@@ -2055,6 +1990,7 @@ def cost_officer_forward_graduates(request, pk):
     return render(request, 'cost_forward_confirm.html', {'student_data': sd})
 @login_required
 @user_passes_test(is_cost_sharing_officer)
+@replica_reads
 def cost_officer_dashboard(request):
     """
     Dedicated dashboard for cost sharing officers.
@@ -2062,12 +1998,12 @@ def cost_officer_dashboard(request):
     """
     # Get pending agreements for review
     pending_agreements = CostSharingAgreement.objects.filter(
-        status__iexact='pending'
+        status=CostSharingAgreement.Status.PENDING
     ).order_by('-date_filled' if _model_has_field(CostSharingAgreement, 'date_filled') else '-id')[:10]
     
     # Get accepted agreements
     accepted_agreements = CostSharingAgreement.objects.filter(
-        status__iexact='accepted'
+        status=CostSharingAgreement.Status.ACCEPTED
     ).order_by('-date_accepted' if _model_has_field(CostSharingAgreement, 'date_accepted') else '-id')[:10]
     
     # Get assigned student data
@@ -2079,9 +2015,9 @@ def cost_officer_dashboard(request):
     cost_structures = CostStructure.objects.all()
     
     # Calculate statistics
-    total_pending = CostSharingAgreement.objects.filter(status__iexact='pending').count()
-    total_accepted = CostSharingAgreement.objects.filter(status__iexact='accepted').count()
-    total_rejected = CostSharingAgreement.objects.filter(status__iexact='rejected').count()
+    total_pending = CostSharingAgreement.objects.filter(status=CostSharingAgreement.Status.PENDING).count()
+    total_accepted = CostSharingAgreement.objects.filter(status=CostSharingAgreement.Status.ACCEPTED).count()
+    total_rejected = CostSharingAgreement.objects.filter(status=CostSharingAgreement.Status.REJECTED).count()
     total_assigned_students = StudentData.objects.filter(assigned_to=request.user).count()
     
     # Get active notices for cost sharing officers
@@ -2109,11 +2045,12 @@ def cost_officer_dashboard(request):
 
 @login_required
 @user_passes_test(is_inland_revenue_officer)
+@replica_reads
 def inland_dashboard(request):
     """
     Inland revenue officer dashboard — show payments only for accepted agreements.
     """
-    payments = Payment.objects.filter(agreement__status__iexact='accepted').select_related('agreement', getattr(Payment, 'payer', None))
+    payments = Payment.objects.filter(agreement__status=CostSharingAgreement.Status.ACCEPTED).select_related('agreement', 'payer')
     # optional: paginate
     paginator = Paginator(payments.order_by('-id'), 25)
     page_number = request.GET.get('page')
@@ -2194,21 +2131,44 @@ def upload_student_data(request):
             messages.error(request, 'Please upload a CSV file.')
             return redirect('upload_student_data')
         
+        # Dry run: validate the whole file at once and report, no writes
+        if request.POST.get('dry_run'):
+            try:
+                report = validate_student_csv(csv_file)
+            except Exception as e:
+                messages.error(request, f'Error processing CSV file: {str(e)}')
+                return redirect('upload_student_data')
+            
+            if report['invalid_count'] or report['missing_columns']:
+                messages.warning(request, f"Dry run: {report['invalid_count']} of {report['row_count']} rows have errors. Nothing was saved.")
+            else:
+                messages.success(request, f"Dry run: all {report['row_count']} rows are valid. Nothing was saved.")
+            return render(request, 'upload_student_data.html', {
+                'validation_report': report,
+                'file_name': csv_file.name,
+            })
+        
         try:
-            decoded_file = csv_file.read().decode('utf-8').splitlines()
-            csv_reader = csv.DictReader(decoded_file)
+            # Same parsing as the dry run: BOM-tolerant, stripped headers and cells
+            columns = load_columns(csv_file)
             
             success_count = 0
             error_count = 0
             detailed_errors = []
             
-            print("CSV Columns found:", csv_reader.fieldnames)
+            logger.debug('Student upload columns: %s', list(columns))
+            
+            # IDs already in the database, looked up in chunks; IDs created
+            # below are added so repeats within the file are caught too
+            taken_student_ids, taken_usernames = existing_student_ids(
+                filter(None, columns.get('Student ID', []))
+            )
             
-            for row_num, row in enumerate(csv_reader, start=2):
+            for row_num, row in iter_rows(columns):
                 try:
                     # Validate required fields
-                    full_name = row.get('Full Name', '').strip()
-                    student_id = row.get('Student ID', '').strip()
+                    full_name = row.get('Full Name', '')
+                    student_id = row.get('Student ID', '')
                     
                     if not full_name:
                         detailed_errors.append(f"Row {row_num}: Missing 'Full Name'")
@@ -2221,13 +2181,13 @@ def upload_student_data(request):
                         continue
                     
                     # Check if student ID already exists
-                    if StudentData.objects.filter(student_id=student_id).exists():
+                    if student_id in taken_student_ids:
                         detailed_errors.append(f"Row {row_num}: Student ID '{student_id}' already exists")
                         error_count += 1
                         continue
                     
                     # Check if user already exists
-                    if User.objects.filter(username=student_id).exists():
+                    if student_id in taken_usernames:
                         detailed_errors.append(f"Row {row_num}: Username '{student_id}' already exists")
                         error_count += 1
                         continue
@@ -2248,28 +2208,30 @@ def upload_student_data(request):
                         user=user,
                         full_name=full_name,
                         student_id=student_id,  # This is a separate field in your model
-                        sex=row.get('Sex', '').strip().upper()[:1],  # Just M or F
-                        region=row.get('Region', '').strip(),
-                        woreda=row.get('Woreda', '').strip(),
-                        phone_number=row.get('Phone Number', '').strip(),
-                        faculty=row.get('Faculty', '').strip(),
+                        sex=row.get('Sex', '').upper()[:1],  # Just M or F
+                        region=row.get('Region', ''),
+                        woreda=row.get('Woreda', ''),
+                        phone_number=row.get('Phone Number', ''),
+                        faculty=row.get('Faculty', ''),
                         year_of_entrance=int(row.get('Year of Entrance', 2024)),  # Your model has year_of_entrance, not year
-                        department=row.get('Department', '').strip(),
+                        department=row.get('Department', ''),
                         academic_year=int(row.get('Academic Year', 2024)),  # Your model has academic_year as IntegerField
-                        mother_name=row.get('Mother Name', '').strip(),
-                        mother_phone=row.get('Mother Phone', '').strip(),
+                        mother_name=row.get('Mother Name', ''),
+                        mother_phone=row.get('Mother Phone', ''),
                         uploaded_by=request.user,  # Set the user who uploaded
                         status=StudentData.STATUS_UPLOADED,
                     )
                     
                     student_data.save()
+                    taken_student_ids.add(student_id)
+                    taken_usernames.add(student_id)
                     success_count += 1
-                    print(f"✅ Successfully created: {full_name} ({student_id})")
+                    logger.debug('Created student %s (%s)', full_name, student_id)
                     
                 except Exception as e:
                     error_count += 1
                     detailed_errors.append(f"Row {row_num}: {str(e)}")
-                    print(f"❌ Error in row {row_num}: {e}")
+                    logger.warning('Student upload row %s failed: %s', row_num, e)
                     
                     # Clean up user if created
                     if 'user' in locals():
@@ -2291,16 +2253,14 @@ def upload_student_data(request):
                 
                 messages.error(request, error_message)
                 
-                # Print all errors to console
-                print("\n=== ALL UPLOAD ERRORS ===")
-                for error in detailed_errors:
-                    print(f"  - {error}")
+                if debug_enabled(logger):
+                    logger.debug('Student upload errors:\n%s', '\n'.join(f'  - {error}' for error in detailed_errors))
             
             return redirect('upload_student_data')
             
         except Exception as e:
             messages.error(request, f'Error processing CSV file: {str(e)}')
-            print(f"CSV processing error: {e}")
+            logger.exception('Student upload failed')
             return redirect('upload_student_data')
     
     return render(request, 'upload_student_data.html')
@@ -2404,46 +2364,43 @@ def post_notice(request):
         'form': form,
         'title': 'Post New Notice'
     })
+def _active_notices_for_role(role):
+    now = timezone.now()
+    
+    # Get all active notices that haven't expired
+    notices = Notice.objects.filter(
+        is_active=True
+    ).filter(
+        Q(expiry_date__isnull=True) | Q(expiry_date__gte=now)
+    )
+    # Match the audience in the database where it can look inside JSON
+    # (PostgreSQL, served by the audience GIN index); SQLite cannot
+    if role and connection.features.supports_json_field_contains:
+        notices = notices.filter(audience__contains=[role])
+    
+    # Filter notices that include the user's role in their audience
+    filtered_notices = [notice for notice in notices if role in notice.audience]
+    
+    # Sort by creation date (newest first)
+    filtered_notices.sort(key=lambda x: x.created_at, reverse=True)
+    return filtered_notices
+
 def get_notices_for_role(role):
     """
-    Get notices for a specific role - FIXED VERSION
+    Get notices for a specific role, from the shared cache (cleared whenever
+    a notice is saved or deleted)
     """
     try:
-        from django.utils import timezone
+        notices = notice_cache.get_or_set(('role', role), lambda: _active_notices_for_role(role))
+        # A cached list can outlive a notice's expiry date
         now = timezone.now()
+        filtered_notices = [notice for notice in notices if notice.expiry_date is None or notice.expiry_date >= now]
         
-        # Get all active notices that haven't expired
-        notices = Notice.objects.filter(
-            is_active=True
-        ).filter(
-            Q(expiry_date__isnull=True) | Q(expiry_date__gte=now)
-        )
-        
-        # DEBUG: Print all notices and their audiences
-        print(f"🔍 DEBUG: Checking notices for role: {role}")
-        for notice in notices:
-            print(f"  - Notice '{notice.title}': audience={notice.audience}")
-        
-        # Filter notices that include the user's role in their audience
-        filtered_notices = []
-        for notice in notices:
-            # Check if the notice's audience list contains the user's role
-            if role in notice.audience:
-                filtered_notices.append(notice)
-                print(f"  ✅ Notice '{notice.title}' is visible to {role}")
-            else:
-                print(f"  ❌ Notice '{notice.title}' is NOT visible to {role}")
-        
-        # Sort by creation date (newest first)
-        filtered_notices.sort(key=lambda x: x.created_at, reverse=True)
-        
-        print(f"🔍 DEBUG: Found {len(filtered_notices)} notices for {role}")
+        logger.debug('%d notices visible to %s', len(filtered_notices), role)
         return filtered_notices
         
-    except Exception as e:
-        print(f"❌ Error in get_notices_for_role: {e}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception('Error loading notices for role %s', role)
         # Fallback: return empty queryset
         return Notice.objects.none()
     
@@ -2451,20 +2408,6 @@ def get_notices_for_role(role):
 def view_notices(request):
     role = getattr(request.user, 'role', None)
     notices = get_notices_for_role(role)
-    
-    # DEBUG: Print notice details
-    print(f"🔔 User role: {role}")
-    print(f"🔔 Notices count: {notices.count()}")
-    
-    for i, notice in enumerate(notices):
-        print(f"🔔 Notice {i+1}:")
-        print(f"   Title: {notice.title}")
-        print(f"   Created by: {getattr(notice, 'created_by', 'No created_by')}")
-        print(f"   Posted by: {getattr(notice, 'posted_by', 'No posted_by')}")
-        print(f"   Audience: {getattr(notice, 'audience', 'No audience')}")
-        print(f"   Target roles: {getattr(notice, 'target_roles', 'No target_roles')}")
-        print(f"   Is active: {getattr(notice, 'is_active', 'No is_active')}")
-    
     return render(request, 'view_notices.html', {'notices': notices})
 @login_required
 def view_notices(request):
@@ -2599,6 +2542,8 @@ def mark_notification_read(request, pk):
                 return redirect('view_cost_sharing', pk=related_id)
             elif related_type == 'feedback':
                 return redirect('submit_feedback')
+            elif related_type == 'export_job':
+                return redirect('download_export', pk=related_id)
         except Exception:
             # If reverse fails, fall back to dashboard
             pass
@@ -2636,239 +2581,232 @@ def check_new_notifications(request):
 # REPORT GENERATION & DATA EXPORT
 # =============================================================================
 
+def _export_download(request, export_type, **kwargs):
+    """exports.export_response(), sending the user back with a message when the format cannot be produced."""
+    try:
+        return exports.export_response(request, export_type, **kwargs)
+    except ValueError as e:
+        messages.error(request, str(e))
+        referer = request.META.get('HTTP_REFERER')
+        if referer and url_has_allowed_host_and_scheme(referer, {request.get_host()}, request.is_secure()):
+            return redirect(referer)
+        return redirect('dashboard')
+
 @login_required
 @user_passes_test(is_inland_revenue_officer)
+@replica_reads
 def download_payment_data(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="payment_data.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Student ID', 'Student Name', 'Agreement ID', 'Amount Paid', 'Date Paid', 'Payment Method', 'Status', 'Transaction Code'])
-    
-    payments = Payment.objects.all()
-    for payment in payments:
-        writer.writerow([
-            payment.agreement.student.student_id or '',
-            payment.agreement.student.get_full_name() or payment.agreement.student.username,
-            payment.agreement.id,
-            payment.amount_paid,
-            payment.date_paid.strftime('%Y-%m-%d') if payment.date_paid else '',
-            payment.get_payment_method_display() or payment.payment_method,
-            payment.status,
-            payment.transaction_code or '',
-        ])
-    
-    return response
+    return _export_download(request, 'payment_data')
 
 @login_required
 @user_passes_test(is_registrar_officer)
+@replica_reads
 def download_student_data(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="student_data.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Student ID', 'Full Name', 'Sex', 'Region', 'Woreda', 'Phone Number', 'Faculty', 'Department', 'Year of Entrance', 'Academic Year'])
-    
-    students = StudentData.objects.all()
-    for student in students:
-        writer.writerow([
-            student.student_id or '',
-            student.full_name,
-            student.sex,
-            student.region,
-            student.woreda,
-            student.phone_number,
-            student.faculty,
-            student.department,
-            student.year_of_entrance,
-            student.academic_year,
-        ])
-    
-    return response
+    return _export_download(request, 'student_data')
 
 @login_required
 @user_passes_test(is_cost_sharing_officer)
 def generate_student_report(request):
-    # Get all accepted agreements
-    agreements = CostSharingAgreement.objects.filter(status='accepted')
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="student_cost_sharing_report.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Student ID', 'Student Name', 'Department', 'Academic Year', 'Total Cost', 'Service Type', 'Date Accepted'])
-    
-    for agreement in agreements:
-        writer.writerow([
-            agreement.student.student_id or '',
-            agreement.student.get_full_name() or agreement.student.username,
-            agreement.department,
-            agreement.academic_year,
-            agreement.total_cost,
-            agreement.get_service_type_display() or agreement.service_type,
-            agreement.date_accepted.strftime('%Y-%m-%d') if agreement.date_accepted else '',
-        ])
-    
-    return response
+    # All accepted agreements
+    return _export_download(request, 'student_report')
 
 @login_required
 @user_passes_test(is_cost_sharing_officer)
+@replica_reads
 def download_student_data_after_payment(request):
     """
     New view: Allow cost officers to download student data after payment completion
     Only shows students who have completed cost sharing payments
     """
-    # Get all agreements that are completed
-    completed_agreements = CostSharingAgreement.objects.filter(
-        status__iexact='completed'
-    )
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="completed_student_data.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Student ID', 'Full Name', 'Sex', 'Region', 'Woreda', 'Phone Number',
-        'Faculty', 'Department', 'Year of Entrance', 'Academic Year', 
-        'Total Cost', 'Amount Paid', 'Status'
-    ])
-    
-    for agreement in completed_agreements:
-        student = agreement.student
-        student_data = StudentData.objects.filter(student_id=student.student_id).first()
-        
-        if student_data:
-            total_paid = Payment.objects.filter(
-                agreement=agreement,
-                status__in=['partial', 'completed']
-            ).aggregate(total=Sum('amount_paid'))['total'] or 0
-            
-            writer.writerow([
-                student.student_id or '',
-                student_data.full_name,
-                student_data.sex,
-                student_data.region,
-                student_data.woreda,
-                student_data.phone_number,
-                student_data.faculty,
-                student_data.department,
-                student_data.year_of_entrance,
-                student_data.academic_year,
-                agreement.total_cost,
-                total_paid,
-                agreement.status,
-            ])
-    
-    return response
+    return _export_download(request, 'completed_student_data')
 
 @login_required
 @user_passes_test(is_inland_revenue_officer)
+@replica_reads
 def download_student_information(request):
-    # Create the HttpResponse object with CSV content-type
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="student_information.csv"'
-    writer = csv.writer(response)
-    # Write the header
-    writer.writerow(['Student ID', 'Full Name', 'Department', 'Academic Year', 'Total Cost', 'Service Type', 'Agreement Status'])
-    # Get the student agreements
-    agreements = CostSharingAgreement.objects.all()
-    for agreement in agreements:
-        writer.writerow([
-            agreement.student.student_id if agreement.student.student_id else '',
-            agreement.full_name,
-            agreement.department,
-            agreement.academic_year,
-            agreement.total_cost,
-            agreement.get_service_type_display(),
-            agreement.status,
-        ])
-    return response
+    return _export_download(request, 'student_information')
 
 @login_required
+@replica_reads
 def export_students_csv(request):
     """
-    Export all students as CSV. Restricted to staff users.
+    Export all students as CSV (or ?format=xlsx/parquet). Restricted to staff users.
     """
     if not request.user.is_staff:
         return HttpResponse("Forbidden", status=403)
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="students.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['username', 'full_name', 'email', 'role'])
-    UserModel = get_user_model()
-    for u in UserModel.objects.filter(role='student'):
-        writer.writerow([u.username, getattr(u, 'get_full_name', lambda: '')(), u.email, getattr(u, 'role', '')])
-    return response
+    return _export_download(request, 'students')
 
 @login_required
+@replica_reads
 def export_paid_students_csv(request):
     """
-    Export students who made payments as CSV. Restricted to staff users.
+    Export students who made payments as CSV (or ?format=xlsx/parquet). Restricted to staff users.
     """
     if not request.user.is_staff:
         return HttpResponse("Forbidden", status=403)
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="paid_students.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['username', 'full_name', 'email', 'amount', 'tin', 'paid_at'])
-    qs = Payment.objects.select_related('payer').all()
-    for p in qs:
-        payer = getattr(p, 'payer', None) or getattr(p, 'student', None) or None
-        username = getattr(payer, 'username', '') if payer else ''
-        fullname = getattr(payer, 'get_full_name', lambda: '')() if payer else ''
-        email = getattr(payer, 'email', '') if payer else ''
-        writer.writerow([username, fullname, email, getattr(p, 'amount', ''), getattr(p, 'tin', ''), getattr(p, 'created_at', '')])
-    return response
+    return _export_download(request, 'paid_students')
+
+@login_required
+@user_passes_test(lambda u: u.role in ['admin', 'cost_sharing_officer', 'inland_revenue_officer', 'registrar_officer'])
+def export_jobs(request):
+    """
+    Request full exports to be generated in the background and list recent
+    export jobs for the exports this role can see.
+    """
+    available_exports = exports.exports_for_role(request.user.role)
+    
+    if request.method == 'POST':
+        export_type = request.POST.get('export_type')
+        fmt = request.POST.get('format', 'csv')
+        try:
+            job, reused = request_export(request.user, export_type, fmt)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('export_jobs')
+        
+        label = f"{exports.EXPORTS[export_type]['label']} ({exports.FORMATS[fmt]['label']})"
+        if reused and job.status == ExportJob.STATUS_COMPLETED:
+            messages.success(request, f'A recent "{label}" export is already available - download it below.')
+        elif reused:
+            messages.info(request, f'"{label}" is already being generated. It will appear below when ready.')
+        else:
+            messages.success(request, f'"{label}" export queued. You will get a notification with the download link.')
+        return redirect('export_jobs')
+    
+    jobs = ExportJob.objects.filter(
+        export_type__in=[key for key, _ in available_exports]
+    ).select_related('requested_by')[:25]
+    for job in jobs:
+        job.label = exports.EXPORTS[job.export_type]['label']
+        job.format_label = exports.FORMATS[job.format]['label']
+    
+    return render(request, 'export_jobs.html', {
+        'available_exports': available_exports,
+        'formats': exports.FORMATS.items(),
+        'jobs': jobs,
+    })
+
+@login_required
+def download_export(request, pk):
+    """Download the stored artifact of a completed export job."""
+    job = get_object_or_404(ExportJob, pk=pk, status=ExportJob.STATUS_COMPLETED)
+    export = exports.EXPORTS.get(job.export_type)
+    
+    if job.requested_by_id != request.user.id and (not export or request.user.role not in export['roles']):
+        messages.error(request, "You don't have permission to download this export.")
+        return redirect('dashboard')
+    
+    try:
+        fh = job.file.open('rb')
+    except (ValueError, FileNotFoundError):
+        messages.error(request, 'The export file is no longer available. Please request it again.')
+        return redirect('export_jobs')
+    
+    return FileResponse(fh, as_attachment=True, filename=os.path.basename(job.file.name))
+
+@login_required
+@user_passes_test(is_admin)
+def profiles(request):
+    """Recent request profiles taken with ?_profile=1, with their slowest functions."""
+    return render(request, 'profiles.html', {
+        'profiles': profiling.list_profiles(limit=50),
+    })
+
+@login_required
+@user_passes_test(is_admin)
+def download_profile(request, profile_id, kind):
+    """Download a stored profile: the cProfile dump (.prof) or the details and SQL log (.json)."""
+    path = profiling.profile_file(profile_id, kind)
+    if path is None:
+        messages.error(request, 'That profile is no longer available.')
+        return redirect('profiles')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
+
+def metrics_view(request):
+    """
+    Prometheus-text metrics: request latency histograms per view and role,
+    request counters and the export job queue. Scrapers send
+    "Authorization: Bearer <METRICS_TOKEN>"; otherwise only logged-in admins
+    may read it. The client address is not trusted: behind a reverse proxy on
+    the same host every request would come from localhost.
+    """
+    if not getattr(settings, 'METRICS_ENABLED', True):
+        raise Http404('Metrics are disabled')
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    allowed = bool(token) and hmac.compare_digest(supplied, token)
+    if not allowed and not (request.user.is_authenticated and request.user.role == 'admin'):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(metrics.render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@login_required
+@user_passes_test(lambda u: u.role in ['admin', 'registrar_officer', 'cost_sharing_officer', 'inland_revenue_officer'])
+def student_search_api(request):
+    """
+    Ranked student search: ?q=<words>&limit=20. Every word matches as a prefix
+    of a name, student ID, department or faculty. Cost sharing officers only
+    search the students assigned to them.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 20)), 100))
+    except ValueError:
+        return JsonResponse({'error': "'limit' must be an integer"}, status=400)
+    
+    if not query:
+        return JsonResponse({'query': query, 'results': []})
+    
+    students = StudentData.objects.all()
+    if request.user.role == 'cost_sharing_officer':
+        students = students.filter(assigned_to=request.user)
+    
+    results = search_students(query, students).values(
+        'id', 'student_id', 'full_name', 'department', 'faculty', 'academic_year', 'status'
+    )[:limit]
+    
+    return JsonResponse({'query': query, 'results': list(results)})
+
+@login_required
+def changes_feed(request, feed):
+    """
+    Incremental export: rows of `feed` (payments, agreements or students)
+    changed since the ?since=<ISO datetime>&after_id=<id> watermark, oldest
+    first. Pass the returned 'next' watermark on the following call until
+    'has_more' is false. Without a watermark the feed starts at the beginning.
+    """
+    feed_config = changes.FEEDS.get(feed)
+    if feed_config is None:
+        return JsonResponse({'error': f"Unknown feed '{feed}'"}, status=404)
+    if request.user.role not in feed_config['roles']:
+        return JsonResponse({'error': "You don't have permission to read this feed"}, status=403)
+    
+    try:
+        since, after_id = changes.parse_watermark(request.GET.get('since'), request.GET.get('after_id'))
+        limit = int(request.GET.get('limit', changes.DEFAULT_PAGE_SIZE))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse(changes.changes_since(feed, since, after_id, limit))
 
 @login_required
 @user_passes_test(lambda u: u.role in ['admin', 'cost_sharing_officer', 'inland_revenue_officer'])
+@replica_reads
 def generate_report(request):
+    """
+    Download the cost sharing (?type=cost_sharing) or payments (?type=payments)
+    report as CSV, or typed XLSX/Parquet with ?format=xlsx|parquet.
+    """
     report_type = request.GET.get('type', 'cost_sharing')
     
-    if report_type == 'cost_sharing':
-        agreements = CostSharingAgreement.objects.all()
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="cost_sharing_report.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Student ID', 'Name', 'Department', 'Year', 'Total Cost', 'Status'])
-        
-        for agreement in agreements:
-            writer.writerow([
-                agreement.student.student_id,
-                agreement.student.get_full_name(),
-                agreement.student.department,
-                agreement.academic_year,
-                agreement.total_cost,
-                agreement.status,
-            ])
-        
-        return response
-    
-    elif report_type == 'payments':
-        payments = Payment.objects.all()
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="payments_report.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Student ID', 'Name', 'Amount Paid', 'Date Paid', 'Status'])
-        
-        for payment in payments:
-            writer.writerow([
-                payment.agreement.student.student_id,
-                payment.agreement.student.get_full_name(),
-                payment.amount_paid,
-                payment.date_paid,
-                payment.status,
-            ])
-        
-        return response
+    if report_type in ('cost_sharing', 'payments'):
+        return _export_download(request, report_type)
     
     return redirect('dashboard')
 @login_required
 @user_passes_test(is_inland_revenue_officer)
+@replica_reads
 def payment_diagnostic(request):
     """
     Diagnostic view for payment system - helps troubleshoot payment issues
@@ -2937,12 +2875,12 @@ def students_without_agreements(request):
     
     if department_filter:
         students_without_agreements = students_without_agreements.filter(
-            department__icontains=department_filter
+            department_ref__name=department_filter
         )
     
     if faculty_filter:
         students_without_agreements = students_without_agreements.filter(
-            faculty__icontains=faculty_filter
+            faculty_ref__name=faculty_filter
         )
     
     if year_filter and year_filter.strip():
@@ -2955,8 +2893,8 @@ def students_without_agreements(request):
             pass
     
     # Get unique values for filters
-    departments = StudentData.objects.values_list('department', flat=True).distinct()
-    faculties = StudentData.objects.values_list('faculty', flat=True).distinct()
+    departments = Department.cached_names()
+    faculties = Faculty.cached_names()
     years = StudentData.objects.values_list('academic_year', flat=True).distinct()
     
     context = {
@@ -2973,6 +2911,7 @@ def students_without_agreements(request):
     
     return render(request, 'students_without_agreements.html', context)
 @user_passes_test(is_registrar_officer)
+@replica_reads
 def download_students_without_agreements(request):
     """
     Download CSV of students without cost sharing agreements
@@ -2996,12 +2935,12 @@ def download_students_without_agreements(request):
     
     if department_filter:
         students_without_agreements = students_without_agreements.filter(
-            department__icontains=department_filter
+            department_ref__name=department_filter
         )
     
     if faculty_filter:
         students_without_agreements = students_without_agreements.filter(
-            faculty__icontains=faculty_filter
+            faculty_ref__name=faculty_filter
         )
     
     # FIX: Convert year_filter to integer if provided
@@ -3015,29 +2954,12 @@ def download_students_without_agreements(request):
             # If conversion fails, ignore the year filter
             pass
     
-    # Create CSV response
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="students_without_agreements_{current_year}.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Student ID', 'Full Name', 'Department', 'Faculty', 
-        'Academic Year', 'Phone Number', 'Region', 'Woreda'
-    ])
-    
-    for student in students_without_agreements:
-        writer.writerow([
-            student.student_id,
-            student.full_name,
-            student.department,
-            student.faculty,
-            student.academic_year,
-            student.phone_number,
-            student.region,
-            student.woreda,
-        ])
-    
-    return response
+    return _export_download(
+        request,
+        'students_without_agreements',
+        rows=exports.students_without_agreements_rows(students_without_agreements),
+        filename=f'students_without_agreements_{current_year}.csv',
+    )
 @login_required
 @user_passes_test(is_registrar_officer)
 def send_reminder_notifications(request):
@@ -3045,11 +2967,6 @@ def send_reminder_notifications(request):
     Send reminder notifications to students without cost sharing agreements
     """
     if request.method == 'POST':
-        current_year = get_current_academic_year()
-        
-        print("🎯 DEBUG: send_reminder_notifications POST request received")
-        print(f"🎯 DEBUG: Current academic year: {current_year}")
-        
         # Get base queryset - we need to check for EACH student's academic year
         all_students = StudentData.objects.all()
         
@@ -3065,14 +2982,11 @@ def send_reminder_notifications(request):
             
             if not has_agreement:
                 students_to_notify.append(student)
-                print(f"🎯 Student {student.student_id} ({student.academic_year}) needs agreement")
         
         students_without_agreements = StudentData.objects.filter(
             id__in=[s.id for s in students_to_notify]
         )
         
-        print(f"🎯 DEBUG: Found {students_without_agreements.count()} students needing agreements")
-        
         # Apply filters if not force_all
         force_all = request.POST.get('force_all') == 'true'
         
@@ -3082,9 +2996,9 @@ def send_reminder_notifications(request):
             year_filter = request.POST.get('year', '')
             
             if department_filter:
-                students_without_agreements = students_without_agreements.filter(department__icontains=department_filter)
+                students_without_agreements = students_without_agreements.filter(department_ref__name=department_filter)
             if faculty_filter:
-                students_without_agreements = students_without_agreements.filter(faculty__icontains=faculty_filter)
+                students_without_agreements = students_without_agreements.filter(faculty_ref__name=faculty_filter)
             if year_filter and year_filter.strip():
                 try:
                     year_int = int(year_filter)
@@ -3092,7 +3006,11 @@ def send_reminder_notifications(request):
                 except (ValueError, TypeError):
                     pass
         
-        print(f"🎯 DEBUG: After filters: {students_without_agreements.count()} students")
+        if debug_enabled(logger):
+            logger.debug(
+                '%d students without agreements, %d after filters',
+                len(students_to_notify), students_without_agreements.count(),
+            )
         
         # Send notifications
         notification_count = 0
@@ -3101,7 +3019,6 @@ def send_reminder_notifications(request):
         for student_data in students_without_agreements:
             try:
                 student_year = student_data.academic_year
-                print(f"🎯 Processing: {student_data.student_id} - {student_data.full_name} (Year: {student_year})")
                 
                 # Find or create user
                 user = User.objects.filter(
@@ -3122,9 +3039,9 @@ def send_reminder_notifications(request):
                             department=student_data.department,
                             is_active=True
                         )
-                        print(f"🎯 Created user: {user.username}")
-                    except Exception as e:
-                        print(f"🎯 Error creating user: {e}")
+                        logger.info('Created user %s for reminder', user.username)
+                    except Exception:
+                        logger.warning('Could not create a user for student %s', student_data.student_id, exc_info=True)
                         continue
                 
                 # Create notification with correct academic year
@@ -3148,14 +3065,15 @@ def send_reminder_notifications(request):
                             fail_silently=True,
                         )
                         email_count += 1
-                        print(f"✅ Email sent to {user.email} for year {academic_year_display}")
-                    except Exception as e:
-                        print(f"❌ Email failed for {user.email}: {e}")
+                    except Exception:
+                        logger.warning('Reminder email to user %s failed', user.pk, exc_info=True)
                 
-            except Exception as e:
-                print(f"❌ Error with student {student_data.student_id}: {e}")
+            except Exception:
+                logger.exception('Reminder failed for student %s', student_data.student_id)
                 continue
         
+        logger.info('Sent %d reminder notifications and %d emails', notification_count, email_count)
+        
         if notification_count > 0:
             if email_count > 0:
                 messages.success(request, f"✅ Successfully sent {notification_count} notifications and {email_count} emails")
@@ -3360,6 +3278,19 @@ def cost_officer_agreement_detail(request, pk):
     }
     
     return render(request, 'cost_officer_agreement_detail.html', context)
+
+
+@login_required
+@user_passes_test(is_cost_sharing_officer)
+def cost_officer_pending_agreements(request):
+    """All pending agreements, newest first, paginated (the dashboard shows only the newest)."""
+    paginator = Paginator(with_total_cost(_pending_agreements().select_related('student')), 25)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    return render(request, 'cost_officer_pending_agreements.html', {
+        'agreements': page_obj,
+        'page_range': paginator.get_elided_page_range(page_obj.number),
+    })
+
 @login_required
 @user_passes_test(is_registrar_officer)
 def upload_students_to_cost_officer(request):
@@ -3426,20 +3357,16 @@ def cost_officer_assigned_list(request):
     # Get students assigned to this cost officer
     qs = StudentData.objects.filter(assigned_to=request.user).order_by('-created_at')
     
-    # Apply search filter
+    # Apply search filter (indexed, best matches first)
     search_query = request.GET.get('search', '')
     if search_query:
-        qs = qs.filter(
-            Q(full_name__icontains=search_query) |
-            Q(student_id__icontains=search_query) |
-            Q(department__icontains=search_query)
-        )
+        qs = search_students(search_query, qs, fields=['full_name', 'student_id', 'department'])
     
     # Add agreement status to each student
     for student in qs:
         student.has_agreement = CostSharingAgreement.objects.filter(
             student__student_id=student.student_id,
-            status__in=['accepted', 'completed']
+            status=CostSharingAgreement.Status.ACCEPTED
         ).exists()
     
     # Calculate statistics
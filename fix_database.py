@@ -6,7 +6,6 @@ Handles corrupted SQLite database and recreates it with proper schema
 import os
 import sys
 import django
-import shutil
 from pathlib import Path
 
 # Setup Django
@@ -19,12 +18,14 @@ django.setup()
 from django.core.management import call_command
 from django.db import connection
 
+from cost_sharing.backup import copy_database
+
 def backup_corrupted_db():
     """Create a backup of the corrupted database"""
     db_path = Path('db.sqlite3')
     if db_path.exists():
         backup_path = Path(f'db.sqlite3.backup.{os.urandom(4).hex()}')
-        shutil.copy2(db_path, backup_path)
+        copy_database(db_path, backup_path)
         print(f"✓ Corrupted database backed up to: {backup_path}")
         return True
     return False
@@ -35,6 +36,9 @@ def delete_database():
     if db_path.exists():
         try:
             db_path.unlink()
+            # A leftover WAL would be replayed into the new database
+            for sidecar in ('db.sqlite3-wal', 'db.sqlite3-shm'):
+                Path(sidecar).unlink(missing_ok=True)
             print("✓ Corrupted database file deleted")
             return True
         except Exception as e:
@@ -0,0 +1,67 @@
+"""
+Cache settings from the environment.
+
+CACHE_URL picks the backend shared by every worker (cost_sharing/cache.py):
+
+    file:///cache                      files under the project directory (one node)
+    file:////var/cache/ocsms           absolute path
+    db://ocsms_cache                   a table in the default database (several nodes)
+    redis://localhost:6379/0           Redis or a compatible server (needs the redis package)
+    locmem://                          per-process memory, not shared (tests)
+    dummy://                           no caching
+
+Query parameters become OPTIONS, e.g. file:///cache?max_entries=50000.
+"""
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+BACKENDS = {
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+# Django culls file and database caches at 300 entries by default
+DEFAULT_MAX_ENTRIES = 10000
+# OPTIONS Django reads in upper case; anything else is passed to the backend as is
+CULL_OPTIONS = ('max_entries', 'cull_frequency')
+
+
+def parse_cache_url(url, base_dir):
+    """Turn a CACHE_URL into a Django CACHES entry."""
+    parts = urlsplit(url)
+    if parts.scheme not in BACKENDS:
+        raise ValueError(f"Unsupported CACHE_URL scheme '{parts.scheme}'; use one of {', '.join(sorted(BACKENDS))}.")
+    backend = BACKENDS[parts.scheme]
+    options = {}
+    for name, value in parse_qsl(parts.query):
+        if name.lower() in CULL_OPTIONS:
+            options[name.upper()] = int(value)
+        else:
+            options[name] = value
+
+    if parts.scheme == 'file':
+        # file:///name -> relative to the project, file:////abs -> absolute (as for sqlite:)
+        path = parts.path[1:]
+        location = str(Path(path) if path.startswith('/') else Path(base_dir) / path)
+    elif parts.scheme == 'db':
+        location = parts.netloc or parts.path.lstrip('/') or 'ocsms_cache'
+    elif parts.scheme in ('redis', 'rediss'):
+        location = url.split('?', 1)[0]
+    else:
+        location = parts.netloc
+
+    if parts.scheme in ('file', 'db'):
+        options.setdefault('MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+    return {'BACKEND': backend, 'LOCATION': location, 'OPTIONS': options}
+
+
+def cache_config(url, base_dir, timeout=300, key_prefix='ocsms'):
+    """CACHES['default'] for `url`."""
+    cache = parse_cache_url(url, base_dir)
+    cache['TIMEOUT'] = timeout
+    cache['KEY_PREFIX'] = key_prefix
+    return cache
@@ -15,6 +15,8 @@ from datetime import datetime
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ocsms.settings')
 
+from cost_sharing.backup import copy_database
+
 def print_header(text):
     """Print formatted header"""
     print("\n" + "="*70)
@@ -40,7 +42,7 @@ def backup_corrupted_db():
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         backup_path = Path(f'db.sqlite3.backup.{timestamp}')
         try:
-            shutil.copy2(db_path, backup_path)
+            copy_database(db_path, backup_path)
             print_success(f"Corrupted database backed up to: {backup_path}")
             return True
         except Exception as e:
@@ -54,6 +56,9 @@ def delete_database():
     if db_path.exists():
         try:
             db_path.unlink()
+            # A leftover WAL would be replayed into the new database
+            for sidecar in ('db.sqlite3-wal', 'db.sqlite3-shm'):
+                Path(sidecar).unlink(missing_ok=True)
             print_success("Corrupted database file deleted")
             return True
         except Exception as e: